@@ -1,20 +1,30 @@
+import io
+import csv
 import jwt
+import json
 import os
+import base64
+import binascii
 import sys
 import types
 import datetime
 
 from functools import wraps
-from flask import jsonify, request, redirect
+from sqlalchemy import exc as sa_exc
+from flask import jsonify, request, redirect, Response, stream_with_context, g
 from datetime import datetime as dt, timedelta
 
 from settings import app
 from settings import mail
 from parser.csvparser import Parser
+from parser.userparser import read_users_csv
 import database.mock_db as mock_db
-from database.dbmodel import Pool, db, Software, OperatingSystem, User, Reservation, Issue
+from database import timeline
+from database.hashing import HashingBusyError
+from database.dbmodel import Pool, db, Software, OperatingSystem, User, Reservation, Issue, OccupancyDelta, \
+    timeline_cache, auth_cache, hashing_service
 from statistics.statistics import get_most_reserved_pools, top_bottlenecked_pools, get_users_reservation_time, \
-    maximum_usage
+    maximum_usage, get_dashboard, utilisation_series, weekly_heatmap, cached, statistics_cache
 
 from flask_mail import Message
 import random
@@ -23,17 +33,33 @@ import string
 date_conversion_format = "%Y-%m-%dT%H:%M:%S.%fZ"
 
 
+# returns AuthenticatedUser the token was issued for, token is verified and user is read only when the
+# token isn't in auth_cache
+def authenticate(token):
+    user = auth_cache.get(token)
+    if user is None:
+        data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+        user = User.get_authenticated(data['email'])
+        auth_cache.put(token, user, data['exp'])
+    return user
+
+
+# user of the request is available in handlers as g.user
 def login_required(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
         token = request.headers['Auth-Token']
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithm='HS256')
-            if datetime.datetime.fromtimestamp(data['exp']) < datetime.datetime.utcnow():
-                return "Token expired", 401
-            if User.get_user_by_email(data['email']) is None:
-                return "Token invalid", 401
+            g.user = authenticate(token)
+        except jwt.ExpiredSignatureError:
+            return "Token expired", 401
+        except (jwt.InvalidTokenError, ValueError):
+            return "Token invalid", 401
+
+        try:
             return f(*args, **kwargs)
+        except HashingBusyError as e:
+            return str(e), 503
         except Exception as e:
             print(e)
             return "Oops... Something went wrong", 500
@@ -41,12 +67,26 @@ def login_required(f):
     return wrapper
 
 
-def validate_user_rights(token, email=None):
-    data = jwt.decode(token, app.config['SECRET_KEY'], algorithm='HS256')
-    if User.get_user_by_email(data['email']).IsAdmin:
+def validate_user_rights(email=None):
+    if g.user.IsAdmin:
         return True
     else:
-        return email and (email == data['email'] or User.get_user_by_email(email).IsAdmin)
+        return email and (email == g.user.Email or User.get_user_by_email(email).IsAdmin)
+
+
+# cursor of /reservations pagination is opaque for the client, it holds (StartDate, ID) of the last row
+def encode_cursor(key):
+    start_date, reservation_id = key
+    cursor = "{}|{}".format(start_date.strftime("%Y-%m-%dT%H:%M:%S.%f"), reservation_id)
+    return base64.urlsafe_b64encode(cursor.encode("utf-8")).decode("utf-8")
+
+
+def decode_cursor(cursor):
+    try:
+        start_date, reservation_id = base64.urlsafe_b64decode(cursor.encode("utf-8")).decode("utf-8").split("|")
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    return dt.strptime(start_date, "%Y-%m-%dT%H:%M:%S.%f"), int(reservation_id)
 
 
 @app.route("/")
@@ -65,7 +105,10 @@ def get_token():
     except Exception as e:
         return str(e), 404
 
-    match = user.check_password(password)
+    try:
+        match = user.check_password(password)
+    except HashingBusyError as e:
+        return str(e), 503
 
     if match:
         expiration_date = datetime.datetime.utcnow() + datetime.timedelta(hours=5)
@@ -87,6 +130,8 @@ def register():
     password = data['password']
     try:
         User.add_user(email, password, firstname, lastname)
+    except HashingBusyError as e:
+        return str(e), 503
     except Exception as e:
         return str(e), 404
 
@@ -100,6 +145,33 @@ def register():
     return jsonify({'test': result})
 
 
+@app.route("/users/import", methods=["POST"])
+@login_required
+def import_users():
+    if not validate_user_rights():
+        return "Unauthorized to import users", 403
+
+    if "users_csv" in request.files:
+        users_data = read_users_csv(request.files["users_csv"])
+    elif request.is_json and isinstance(request.json, dict) and isinstance(request.json.get("users"), list):
+        users_data = request.json["users"]
+    else:
+        return "Users not provided in 'users_csv' file or 'users' list", 400
+
+    # CSV file is read while users are added, so its errors are raised here
+    try:
+        report = User.add_users(users_data)
+    except (UnicodeDecodeError, csv.Error):
+        return "File of users is not a correct UTF-8 CSV file", 400
+    except ValueError as e:
+        return str(e), 409
+
+    # some of users were not added, status of every one is in the report
+    if any(row["status"] != "created" for row in report):
+        return jsonify({"users": report}), 207
+    return jsonify({"users": report}), 200
+
+
 @app.route("/users/edit_user", methods=["POST"])
 @login_required
 def edit_user():
@@ -107,8 +179,7 @@ def edit_user():
         return "User ID not provided in request", 400
 
     email = request.args.get('email')
-    token = request.headers['Auth-Token']
-    if not validate_user_rights(token, email):
+    if not validate_user_rights(email):
         return "Unauthorized to edit user {}".format(email), 403
 
     if not request.json:
@@ -120,16 +191,15 @@ def edit_user():
         except Exception as e:
             return str(e), 404
 
-        user.set_name(request.json.get('new_name', user.Name))
-        user.set_surname(request.json.get('new_surname', user.Surname))
-        password = request.json.get('new_password', user.Password)
-        user.set_password(user.Password if not password else password)
-
-        logged_user_email = jwt.decode(token, app.config['SECRET_KEY'],
-                                       algorithm='HS256')['email']
-        if User.get_user_by_email(logged_user_email).IsAdmin:
-            user.set_email(request.json.get('new_email', user.Email))
-            user.set_admin_permissions(request.json.get('is_admin', user.IsAdmin))
+        fields = {
+            "name": request.json.get('new_name'),
+            "surname": request.json.get('new_surname'),
+            "password": request.json.get('new_password'),
+        }
+        if g.user.IsAdmin:
+            fields["email"] = request.json.get('new_email')
+            fields["is_admin"] = request.json.get('is_admin')
+        user.update(**fields)
         return "User successfully edited", 200
     except ValueError:
         return "User of given e-mail already exists", 422
@@ -146,9 +216,8 @@ def remove_user():
 
     user_email = request.json['email']
     password = request.json['password']
-    token = request.headers['Auth-Token']
 
-    if not validate_user_rights(token, user_email):
+    if not validate_user_rights(user_email):
         return "Unauthorized to delete user {}".format(user_email), 403
 
     try:
@@ -159,13 +228,13 @@ def remove_user():
             else:
                 return "Wrong password for user with email: {}".format(user_email), 402
         else:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithm='HS256')
-            user = User.get_user_by_email(data['email'])
-            if user.IsAdmin:
+            if g.user.IsAdmin:
                 User.get_user_by_email(user_email).remove()
             else:
                 return "No admin privileges", 403
 
+    except HashingBusyError as e:
+        return str(e), 503
     except Exception as e:
         print(e)
         return "User with email: {} doesn't exist!".format(user_email), 404
@@ -230,11 +299,74 @@ def get_pool_availability():
         return "Pool of ID {} doesn't exist".format(pool_id), 404
 
 
+@app.route("/pool_availability/batch", methods=["POST"])
+@login_required
+def get_pools_availability():
+    if not request.json:
+        return "Availability data not provided", 400
+
+    try:
+        pool_ids = [str(pool_id) for pool_id in request.json['PoolIDs']]
+        windows = [
+            (dt.strptime(window["StartDate"], date_conversion_format),
+             dt.strptime(window["EndDate"], date_conversion_format))
+            for window in request.json['Windows']
+        ]
+    except KeyError as e:
+        return "Value of {} missing in given JSON".format(e), 400
+    except (ValueError, TypeError):
+        return 'Inappropriate value in json', 400
+
+    if not pool_ids or any(end_date <= start_date for start_date, end_date in windows):
+        return "Invalid data provided", 400
+
+    try:
+        matrix = Pool.get_availability_matrix(pool_ids, windows)
+    except ValueError as e:
+        return str(e), 404
+
+    return jsonify({"PoolIDs": pool_ids, "availability": matrix})
+
+
+@app.route("/pool_availability/timeline", methods=["GET"])
+@login_required
+def get_pools_availability_timeline():
+    if "startDate" not in request.args:
+        return '"Start Date" not provided in request', 400
+    if "endDate" not in request.args:
+        return '"End Date" not provided in request', 400
+
+    try:
+        start_date = dt.strptime(request.args.get("startDate"), date_conversion_format)
+        end_date = dt.strptime(request.args.get("endDate"), date_conversion_format)
+    except ValueError:
+        return 'Inappropriate date value', 400
+
+    if start_date >= end_date:
+        return "Invalid data provided", 400
+
+    # without "id" parameters timeline of every pool is returned
+    pool_ids = request.args.getlist("id") or [pool.ID for pool in Pool.get_all_pools()]
+
+    try:
+        steps = Pool.get_availability_steps(pool_ids, start_date, end_date)
+    except ValueError as e:
+        return str(e), 404
+
+    conversion_format = "%Y-%m-%dT%H:%M:%S.%f"
+    return jsonify({
+        "timeline": [{
+            "PoolID": pool_id,
+            "Steps": [[(date.strftime(conversion_format))[0:23]+'Z', free_machines]
+                      for date, free_machines in steps[pool_id]]
+        } for pool_id in pool_ids]
+    })
+
+
 @app.route("/add_pool", methods=["POST"])
 @login_required
 def add_pool():
-    token = request.headers['Auth-Token']
-    if not validate_user_rights(token):
+    if not validate_user_rights():
         return "Unauthorized to add pools", 403
 
     if not request.json:
@@ -266,8 +398,7 @@ def add_pool():
 @app.route("/edit_pool", methods=["POST"])
 @login_required
 def edit_pool():
-    token = request.headers['Auth-Token']
-    if not validate_user_rights(token):
+    if not validate_user_rights():
         return "Unauthorized to edit pool", 403
 
     if "id" not in request.args:
@@ -303,8 +434,7 @@ def edit_pool():
 @app.route("/remove_pool", methods=["GET"])
 @login_required
 def remove_pool():
-    token = request.headers['Auth-Token']
-    if not validate_user_rights(token):
+    if not validate_user_rights():
         return "Unauthorized to remove pool", 403
 
     if "id" not in request.args:
@@ -322,8 +452,7 @@ def remove_pool():
 @app.route("/import", methods=["POST"])
 @login_required
 def import_pools():
-    token = request.headers['Auth-Token']
-    if not validate_user_rights(token):
+    if not validate_user_rights():
         return "Unauthorized to import pools", 403
 
     if "pools_csv" not in request.files or "force" not in request.args:
@@ -370,9 +499,114 @@ def show_reservations():
     except ValueError:
         return 'Inappropriate date value', 400
 
-    reservation_list = Reservation.get_reservations(start_date, end_date, show_cancelled)
-    reservation_json_list = ([Reservation.json(reservation) for reservation in reservation_list])
-    return jsonify({"reservation": reservation_json_list})
+    # optional filters
+    filters = {}
+    try:
+        if "poolId" in request.args:
+            filters["pool_id"] = request.args.get("poolId")
+        if "email" in request.args:
+            filters["email"] = request.args.get("email")
+        if "minCount" in request.args:
+            filters["min_count"] = int(request.args.get("minCount"))
+        if "maxCount" in request.args:
+            filters["max_count"] = int(request.args.get("maxCount"))
+        if "cancelled" in request.args:
+            filters["cancelled"] = request.args.get("cancelled") == "true"
+    except ValueError:
+        return 'Inappropriate filter value', 400
+
+    # without "limit" and "cursor" all reservations are returned at once
+    if "limit" not in request.args and "cursor" not in request.args:
+        reservation_json_list = Reservation.get_reservations_json(start_date, end_date, show_cancelled, **filters)
+        return jsonify({"reservation": reservation_json_list})
+
+    try:
+        limit = int(request.args.get("limit", app.config["RESERVATIONS_PAGE_LIMIT"]))
+        after_key = decode_cursor(request.args["cursor"]) if "cursor" in request.args else None
+    except ValueError:
+        return 'Inappropriate pagination value', 400
+
+    if not 0 < limit <= app.config["RESERVATIONS_PAGE_LIMIT"]:
+        return '"Limit" must be between 1 and {}'.format(app.config["RESERVATIONS_PAGE_LIMIT"]), 400
+
+    reservation_json_list, next_key = Reservation.get_reservations_page(limit, after_key, start_date, end_date,
+                                                                        show_cancelled, **filters)
+    return jsonify({
+        "reservation": reservation_json_list,
+        "cursor": encode_cursor(next_key) if next_key else None
+    })
+
+
+# turns dicts into NDJSON or CSV lines, so the whole export never has to be kept in memory
+def stream_export(rows, export_format):
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        header_written = False
+
+        for row in rows:
+            if not header_written:
+                writer.writerow(row.keys())
+                header_written = True
+            writer.writerow([
+                ",".join("{} ({})".format(*item) for item in value) if isinstance(value, list) else value
+                for value in row.values()
+            ])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    else:
+        for row in rows:
+            yield json.dumps(row) + "\n"
+
+
+def export_response(rows, export_format, name):
+    if export_format == "csv":
+        mimetype = "text/csv"
+    else:
+        mimetype = "application/x-ndjson"
+
+    return Response(stream_with_context(stream_export(rows, export_format)), mimetype=mimetype,
+                    headers={"Content-Disposition": "attachment; filename={}.{}".format(name, export_format)})
+
+
+@app.route("/export/reservations", methods=["GET"])
+@login_required
+def export_reservations():
+    if not validate_user_rights():
+        return "Unauthorized to export reservations", 403
+
+    if "startDate" not in request.args:
+        return '"Start Date" not provided in request', 400
+    if "endDate" not in request.args:
+        return '"End Date" not provided in request', 400
+
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in ("ndjson", "csv"):
+        return 'Format must be "ndjson" or "csv"', 400
+
+    try:
+        start_date = dt.strptime(request.args.get("startDate"), date_conversion_format)
+        end_date = dt.strptime(request.args.get("endDate"), date_conversion_format)
+    except ValueError:
+        return 'Inappropriate date value', 400
+
+    show_cancelled = request.args.get("showCancelled") == "true"
+    rows = Reservation.iter_json(start_date, end_date, show_cancelled, app.config["EXPORT_CHUNK_SIZE"])
+    return export_response(rows, export_format, "reservations")
+
+
+@app.route("/export/pools", methods=["GET"])
+@login_required
+def export_pools():
+    if not validate_user_rights():
+        return "Unauthorized to export pools", 403
+
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in ("ndjson", "csv"):
+        return 'Format must be "ndjson" or "csv"', 400
+
+    return export_response(Pool.iter_json(app.config["EXPORT_CHUNK_SIZE"]), export_format, "pools")
 
 
 @app.route("/reservations/cancel", methods=["POST"])
@@ -387,12 +621,25 @@ def cancel_reservation():
     except KeyError as e:
         return "Value of {} missing in given JSON".format(e), 400
 
-    token = request.headers['Auth-Token']
+    # IDs are compared with the ones read from the database, so "12" has to become 12
+    try:
+        if isinstance(request_res_id, list):
+            request_res_id = [int(reservation_id) for reservation_id in request_res_id]
+            if not request_res_id:
+                raise ValueError("No reservation IDs given")
+        else:
+            request_res_id = int(request_res_id)
+    except (TypeError, ValueError):
+        return 'Inappropriate "ReservationID" value received', 400
+
+    if isinstance(request_res_id, list) and len(request_res_id) > app.config["CANCEL_IDS_LIMIT"]:
+        return "At most {} reservations can be cancelled at once".format(app.config["CANCEL_IDS_LIMIT"]), 400
+
     if isinstance(request_res_id, list):
         user_email = Reservation.get_reservation(request_res_id[0]).User.Email
     else:
         user_email = Reservation.get_reservation(request_res_id).User.Email
-    if not validate_user_rights(token, user_email):
+    if not validate_user_rights(user_email):
         return "Unauthorized to cancel reservation", 403
 
     if cancellation_type == 'one':
@@ -411,12 +658,20 @@ def cancel_reservation():
 
     else:
         if isinstance(request_res_id, list):
-            for reservation_id in request_res_id:
-                reservation = Reservation.get_reservation(reservation_id)
-                try:
-                    reservation.cancel()
-                except AttributeError:
-                    return "Reservation of ID {} was already cancelled".format(str(reservation_id)), 202
+            owners_emails = Reservation.query.filter(
+                Reservation.ID.in_(request_res_id)
+            ).join(User).with_entities(User.Email).distinct().all()
+            for owner_email, in owners_emails:
+                if owner_email != user_email and not validate_user_rights(owner_email):
+                    return "Unauthorized to cancel reservation", 403
+
+            try:
+                cancelled_ids = Reservation.cancel_reservations(request_res_id)
+            except ValueError as e:
+                return str(e), 404
+
+            if cancelled_ids:
+                return "Reservations of ID {} were already cancelled".format(str(cancelled_ids)), 202
 
             return "Reservations of ID {} successfully cancelled".format(str(request_res_id)), 200
         else:
@@ -457,37 +712,31 @@ def create_reservation():
         if request.json['CycleEndDate'] is not None and request.json['Step'] is not None:
             step = int(request.json['Step'])
             cycle_end_date = dt.strptime(request.json["CycleEndDate"], date_conversion_format)
-            failed_dates = []
-
-            if request.json['Force']:
-                while start_date < cycle_end_date:
-                    try:
-                        pool.add_reservation(user, machine_count, start_date, end_date)
-                    except Exception as e:
-                        failed_dates.append("{} to {}: {}".format(start_date, end_date, e))
-                    start_date += timedelta(weeks=step)
-                    end_date += timedelta(weeks=step)
-                if failed_dates:
-                    return "Regular reservation failed on following dates:\n{}".format("\n".join(failed_dates)), 409
-            else:
-                new_start_date = start_date
-                new_end_date = end_date
-                while new_start_date < cycle_end_date:
-                    if pool.available_machines(new_start_date, new_end_date) < machine_count:
-                        failed_dates.append(
-                            "{} to {}: not enogh machines available.".format(new_start_date, new_end_date))
-                    new_start_date += timedelta(weeks=step)
-                    new_end_date += timedelta(weeks=step)
-                if not failed_dates:
-                    while start_date < cycle_end_date:
-                        pool.add_reservation(user, machine_count, start_date, end_date)
-                        start_date += timedelta(weeks=step)
-                        end_date += timedelta(weeks=step)
-
-            if failed_dates:
-                return "Regular reservation failed on following dates:\n{}".format("\n".join(failed_dates)), 409
-
-            return "Regular reservation added succesfully", 200
+
+            if step <= 0:
+                raise ValueError("Step has to be greater than 0")
+
+            dates = []
+            while start_date < cycle_end_date:
+                dates.append((start_date, end_date))
+                start_date += timedelta(weeks=step)
+                end_date += timedelta(weeks=step)
+
+            force = bool(request.json['Force'])
+            results = pool.add_reservations(user, machine_count, dates, force=force)
+            failed = any(error for _, _, error in results)
+            # without force a single failed occurrence stops the whole series
+            added_status = "Added" if force or not failed else "NotAdded"
+
+            conversion_format = "%Y-%m-%dT%H:%M:%S.%f"
+            occurrences = [{
+                "StartDate": (_start_date.strftime(conversion_format))[0:23]+'Z',
+                "EndDate": (_end_date.strftime(conversion_format))[0:23]+'Z',
+                "Status": "Failed" if error else added_status,
+                "Error": error,
+            } for _start_date, _end_date, error in results]
+
+            return jsonify({"Occurrences": occurrences}), 409 if failed else 200
 
         elif pool and user:
             reservation = pool.add_reservation(user, machine_count, start_date, end_date)
@@ -497,6 +746,8 @@ def create_reservation():
         return "Value of {} missing in given JSON".format(e), 400
     except ValueError:
         return 'Inappropriate value in json', 400
+    except sa_exc.OperationalError:
+        return "Pool is busy, try again later", 503
     except Exception as e:
         return str(e), 404
 
@@ -517,9 +768,8 @@ def edit_reservation():
     except ValueError:
         return 'Inappropriate value in json', 400
 
-    token = request.headers['Auth-Token']
     user_email = Reservation.get_reservation(reservation_id).User.Email
-    if not validate_user_rights(token, user_email):
+    if not validate_user_rights(user_email):
         return "Unauthorized to cancel reservation", 403
 
     try:
@@ -528,6 +778,8 @@ def edit_reservation():
         return str(e), 404
     try:
         reservation.edit(start_date, end_date, machine_count)
+    except sa_exc.OperationalError:
+        return "Pool is busy, try again later", 503
     except Exception as e:
         return str(e), 400
 
@@ -550,8 +802,7 @@ def create_issue():
     except ValueError:
         return 'Inappropriate value in json', 400
 
-    token = request.headers['Auth-Token']
-    validate_user_rights(token, email)
+    validate_user_rights(email)
 
     try:
         user = User.get_user_by_email(email)
@@ -566,8 +817,7 @@ def create_issue():
 @app.route("/issues/list", methods=["GET"])
 @login_required
 def list_issues():
-    token = request.headers['Auth-Token']
-    is_admin = validate_user_rights(token)
+    is_admin = validate_user_rights()
 
     if not is_admin:
         if "email" not in request.args:
@@ -600,8 +850,7 @@ def reject_issue():
     if issue.Resolved:
         return "Could not reject issue in Resolved state", 406
 
-    token = request.headers['Auth-Token']
-    if not validate_user_rights(token, issue.User.Email):
+    if not validate_user_rights(issue.User.Email):
         return "Unauthorized to reject issue", 403
 
     issue.reject_issue()
@@ -612,8 +861,7 @@ def reject_issue():
 @app.route("/issues/resolve", methods=["POST"])
 @login_required
 def resolve_issue():
-    token = request.headers['Auth-Token']
-    if not validate_user_rights(token):
+    if not validate_user_rights():
         return "Unauthorized to resolve issue", 403
 
     if "id" not in request.args:
@@ -637,8 +885,7 @@ def resolve_issue():
 @app.route("/issues/reopen", methods=["POST"])
 @login_required
 def reopen_issue():
-    token = request.headers['Auth-Token']
-    if not validate_user_rights(token):
+    if not validate_user_rights():
         return "Unauthorized to reopen issue", 403
 
     if "id" not in request.args:
@@ -656,6 +903,31 @@ def reopen_issue():
     return "Issue reopened successfully", 200
 
   
+# statistics of pools are [("pool id", value, "pool name")]
+def pools_chart(pools):
+    return {
+        "data": [p[1] for p in pools],
+        "labels": [({
+            "display": p[2],
+            "name": p[2],
+            "id": p[0]})
+            for p in pools]
+    }
+
+
+# statistics of users are [("email", value, "name", "surname")]
+def users_chart(users):
+    return {
+        "data": [u[1] for u in users],
+        "labels": [({
+            "display": u[2] + ' ' + u[3],
+            "email": u[0],
+            "name": u[2],
+            "surname": u[3]})
+            for u in users]
+    }
+
+
 @app.route("/statistics/popular_pools", methods=["GET"])
 @login_required
 def get_popular_pools():
@@ -676,16 +948,11 @@ def get_popular_pools():
     if start_date > end_date or pools_to_view <= 0:
         return "Invalid data provided", 400
 
-    pools = sorted(get_most_reserved_pools(start_date, end_date), key=lambda x: x[1], reverse=True)[:pools_to_view]
+    def compute():
+        return pools_chart(sorted(get_most_reserved_pools(start_date, end_date), key=lambda x: x[1], reverse=True)[
+                           :pools_to_view])
 
-    return jsonify({
-        "data": [p[1] for p in pools],
-        "labels": [({
-            "display": Pool.get_pool(p[0]).Name,
-            "name": Pool.get_pool(p[0]).Name,
-            "id": p[0]})
-            for p in pools]
-    })
+    return jsonify(cached(("popular_pools", start_date, end_date, pools_to_view), compute))
 
 
 @app.route("/statistics/bottlenecked_pools", methods=["GET"])
@@ -711,17 +978,11 @@ def get_bottlenecked_pools():
     if start_date > end_date or pools_to_view <= 0 or not 0 < threshold < 1:
         return "Invalid data provided", 400
 
-    pools = sorted(top_bottlenecked_pools(start_date, end_date, threshold), key=lambda x: x[1], reverse=True)[
-            :pools_to_view]
+    def compute():
+        return pools_chart(sorted(top_bottlenecked_pools(start_date, end_date, threshold), key=lambda x: x[1],
+                                  reverse=True)[:pools_to_view])
 
-    return jsonify({
-        "data": [p[1] for p in pools],
-        "labels": [({
-            "display": Pool.get_pool(p[0]).Name,
-            "name": Pool.get_pool(p[0]).Name,
-            "id": p[0]})
-            for p in pools]
-    })
+    return jsonify(cached(("bottlenecked_pools", start_date, end_date, pools_to_view, threshold), compute))
 
 
 @app.route("/statistics/popular_users", methods=["GET"])
@@ -744,19 +1005,11 @@ def get_popular_users():
     if start_date > end_date or users_to_view <= 0:
         return "Invalid data provided", 400
 
-    users = sorted(get_users_reservation_time(start_date, end_date), key=lambda x: x[1], reverse=True)[
-            :users_to_view]
+    def compute():
+        return users_chart(sorted(get_users_reservation_time(start_date, end_date), key=lambda x: x[1],
+                                  reverse=True)[:users_to_view])
 
-    return jsonify({
-        "data": [u[1] for u in users],
-        "labels": [({
-            "display": User.get_user_by_email(u[0]).Name + ' ' +
-                       User.get_user_by_email(u[0]).Surname,
-            "email": u[0],
-            "name": User.get_user_by_email(u[0]).Name,
-            "surname": User.get_user_by_email(u[0]).Surname})
-            for u in users]
-    })
+    return jsonify(cached(("popular_users", start_date, end_date, users_to_view), compute))
 
 
 @app.route("/statistics/unused_pools", methods=["GET"])
@@ -779,17 +1032,121 @@ def get_unused_pools():
     if start_date > end_date or pools_to_view <= 0:
         return "Invalid data provided", 400
 
-    pools = sorted(maximum_usage(start_date, end_date), key=lambda x: x[1])[
-            :pools_to_view]
+    def compute():
+        return pools_chart(sorted(maximum_usage(start_date, end_date), key=lambda x: x[1])[:pools_to_view])
+
+    return jsonify(cached(("unused_pools", start_date, end_date, pools_to_view), compute))
 
-    return jsonify({
-        "data": [p[1] for p in pools],
-        "labels": [({
-            "display": Pool.get_pool(p[0]).Name,
-            "name": Pool.get_pool(p[0]).Name,
-            "id": p[0]})
-            for p in pools]
-    })
+
+@app.route("/statistics/dashboard", methods=["GET"])
+@login_required
+def get_dashboard_statistics():
+    for name, label in (("startDate", "Start Date"), ("endDate", "End Date"), ("poolsToView", "Pools to view"),
+                        ("usersToView", "Users to view"), ("threshold", "Threshold")):
+        if name not in request.args:
+            return '"{}" not provided in request'.format(label), 400
+
+    try:
+        pools_to_view = int(request.args.get("poolsToView"))
+        users_to_view = int(request.args.get("usersToView"))
+        threshold = float(request.args.get("threshold"))
+        start_date = dt.strptime(request.args.get("startDate"), date_conversion_format)
+        end_date = dt.strptime(request.args.get("endDate"), date_conversion_format)
+    except ValueError:
+        return 'Inappropriate value', 400
+
+    if start_date > end_date or pools_to_view <= 0 or users_to_view <= 0 or not 0 < threshold < 1:
+        return "Invalid data provided", 400
+
+    def compute():
+        dashboard = get_dashboard(start_date, end_date, pools_to_view, users_to_view, threshold)
+        return {
+            "popular_pools": pools_chart(dashboard["popular_pools"]),
+            "popular_users": users_chart(dashboard["popular_users"]),
+            "bottlenecked_pools": pools_chart(dashboard["bottlenecked_pools"]),
+            "unused_pools": pools_chart(dashboard["unused_pools"]),
+        }
+
+    return jsonify(cached(("dashboard", start_date, end_date, pools_to_view, users_to_view, threshold), compute))
+
+
+@app.route("/statistics/utilisation", methods=["GET"])
+@login_required
+def get_utilisation():
+    if "startDate" not in request.args:
+        return '"Start Date" not provided in request', 400
+    if "endDate" not in request.args:
+        return '"End Date" not provided in request', 400
+
+    granularity = request.args.get("granularity", "day")
+    if granularity not in timeline.GRANULARITIES:
+        return 'Granularity must be one of: ' + ", ".join(timeline.GRANULARITIES), 400
+
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in ("ndjson", "csv"):
+        return 'Format must be "ndjson" or "csv"', 400
+
+    try:
+        start_date = dt.strptime(request.args.get("startDate"), date_conversion_format)
+        end_date = dt.strptime(request.args.get("endDate"), date_conversion_format)
+    except ValueError:
+        return 'Inappropriate date value', 400
+
+    if start_date >= end_date:
+        return "Invalid data provided", 400
+
+    # without "id" parameters series of every pool is returned
+    pool_ids = set(request.args.getlist("id")) or None
+    if pool_ids is not None:
+        existing_ids = {pool.ID for pool in Pool.query.filter(Pool.ID.in_(pool_ids)).all()}
+        missing_ids = pool_ids - existing_ids
+        if missing_ids:
+            return 'Pool of ID "{}" does not exist'.format(str(min(missing_ids))), 404
+
+    rows = utilisation_series(pool_ids, start_date, end_date, granularity, app.config["EXPORT_CHUNK_SIZE"])
+    return export_response(rows, export_format, "utilisation")
+
+
+@app.route("/statistics/heatmap", methods=["GET"])
+@login_required
+def get_heatmap():
+    if "startDate" not in request.args:
+        return '"Start Date" not provided in request', 400
+    if "endDate" not in request.args:
+        return '"End Date" not provided in request', 400
+
+    try:
+        start_date = dt.strptime(request.args.get("startDate"), date_conversion_format)
+        end_date = dt.strptime(request.args.get("endDate"), date_conversion_format)
+    except ValueError:
+        return 'Inappropriate date value', 400
+
+    if start_date >= end_date:
+        return "Invalid data provided", 400
+
+    # without "id" parameters heatmap of every pool is returned
+    pool_ids = sorted(set(request.args.getlist("id")))
+    pool_list = Pool.query.filter(Pool.ID.in_(pool_ids)).all() if pool_ids else Pool.get_all_pools()
+    missing_ids = set(pool_ids) - {pool.ID for pool in pool_list}
+    if missing_ids:
+        return 'Pool of ID "{}" does not exist'.format(str(min(missing_ids))), 404
+
+    def compute():
+        # every pool is selected with a subquery instead of binding all of their IDs
+        all_ids = None if pool_ids else Pool.ids_query()
+        return {"heatmap": weekly_heatmap(pool_list, start_date, end_date, all_ids)}
+
+    return jsonify(cached(("heatmap", start_date, end_date, tuple(pool_ids)), compute))
+
+
+@app.route("/statistics/cache", methods=["GET"])
+@login_required
+def get_statistics_cache():
+    if not validate_user_rights():
+        return "Unauthorized to view statistics cache", 403
+
+    return jsonify({"statistics": statistics_cache.stats(), "timeline": timeline_cache.stats(),
+                    "auth": auth_cache.stats(), "hashing": hashing_service.stats()})
 
 
 @app.route("/init_db")
@@ -800,6 +1157,9 @@ def init_db():
     db.drop_all()
     db.session.commit()
     db.create_all()
+    timeline_cache.invalidate()
+    statistics_cache.invalidate()
+    auth_cache.invalidate()
     User.add_user("admin@admin.example", "ala123456", "Admin", "Admin", True)
     db.session.commit()
     if bool(int(os.environ.get('MOCK', 0))) or '--mock' in sys.argv:
@@ -807,6 +1167,24 @@ def init_db():
     return "Database reseted"
 
 
+@app.cli.command("rebuild-ledger")
+def rebuild_ledger():
+    # Recomputes OccupancyDelta from Reservation, also compacts it to one row per pool and date
+    OccupancyDelta.rebuild()
+    print("Ledger rebuilt")
+
+
+@app.cli.command("check-ledger")
+def check_ledger():
+    # Compares OccupancyDelta with Reservation, exits with 1 if they disagree
+    inconsistencies = OccupancyDelta.find_inconsistencies()
+    for pool_id, date, expected, recorded in inconsistencies:
+        print("Pool '{}' at {}: expected delta {}, recorded {}".format(pool_id, date, expected, recorded))
+    if inconsistencies:
+        sys.exit(1)
+    print("Ledger is consistent")
+
+
 def send_reset_email(user, password):
     msg = Message('Password Reset Request',
                   sender='iisg.vmmanager@gmail.com',
@@ -837,6 +1215,8 @@ def reset_request():
         password = random_string()
         try:
             user.set_password(password)
+        except HashingBusyError as e:
+            return str(e), 503
         except Exception:
             return "error during changing password in DB", 403
         try:
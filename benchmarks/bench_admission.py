@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import timedelta, datetime as dt
+
+from settings import app
+
+# Booking throughput of processes competing for the same pool, as gunicorn workers do. Every process tries
+# to book every window, so most attempts wait for the pool's lock and are rejected:
+#
+#   python -m benchmarks.bench_admission
+
+WORKERS = (1, 2, 4, 8)
+WINDOWS = 50
+MAXIMUM_COUNT = 3
+
+
+# Run in a spawned process, also by tests/test_admission.py. Puts number of windows it managed to book into
+# results.
+def book_every_window(database_uri, pool_id, user_id, windows, start, results):
+    from database.dbmodel import Pool, User, db
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_uri
+    start.wait()
+
+    added = 0
+    for start_date, end_date in windows:
+        try:
+            Pool.get_pool(pool_id).add_reservation(User.get_user(user_id), 1, start_date, end_date)
+            added += 1
+        except ValueError:
+            pass
+        finally:
+            db.session.remove()
+    results.put(added)
+
+
+def attempts_per_second(database_uri, pool_id, user_id, workers):
+    context = multiprocessing.get_context("spawn")
+    start_date = dt.now().replace(microsecond=0) + timedelta(weeks=workers)
+    windows = [(start_date + timedelta(hours=2 * i), start_date + timedelta(hours=2 * i + 1))
+               for i in range(WINDOWS)]
+    results = context.Queue()
+    start = context.Barrier(workers + 1)
+    processes = [context.Process(target=book_every_window,
+                                 args=(database_uri, pool_id, user_id, windows, start, results))
+                 for _ in range(workers)]
+
+    for process in processes:
+        process.start()
+    start.wait()
+    started = time.perf_counter()
+    added = sum(results.get(timeout=300) for _ in processes)
+    seconds = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    assert added == WINDOWS * min(workers, MAXIMUM_COUNT)
+    return workers * WINDOWS / seconds
+
+
+def main():
+    database_file = os.path.join(tempfile.mkdtemp(), "bench.db")
+    database_uri = "sqlite:///" + database_file
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_uri
+
+    from database.dbmodel import Pool, User, db
+
+    db.create_all()
+    pool_id = Pool.add_pool("bench", "Bench", MAXIMUM_COUNT, "", True).ID
+    user_id = User.add_user("bench@example.ex", "bench", "Bench", "Bench").ID
+    db.session.remove()
+
+    print("%d windows, %d machines, %d CPUs" % (WINDOWS, MAXIMUM_COUNT, multiprocessing.cpu_count()))
+    for workers in WORKERS:
+        print("%2d processes  %7.1f booking attempts/s" % (
+            workers, attempts_per_second(database_uri, pool_id, user_id, workers)))
+
+    db.get_engine(app).dispose()
+    os.remove(database_file)
+
+
+if __name__ == "__main__":
+    main()
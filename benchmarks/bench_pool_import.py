@@ -0,0 +1,55 @@
+import io
+import os
+import tempfile
+import time
+
+from settings import app
+
+# Imports a CSV file of 10k pools with a dozen software each into an empty database file, once with the
+# streaming import and once with a pool, operating system and software at a time for a part of the pools:
+#
+#   python -m benchmarks.bench_pool_import
+
+POOLS = 10000
+SOFTWARE_PER_POOL = 12
+ROW_BY_ROW_POOLS = 500
+
+database_file = os.path.join(tempfile.mkdtemp(), "bench.db")
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + database_file
+
+from database.dbmodel import db, Pool, OperatingSystem, Software  # noqa: E402
+from parser.csvparser import Parser  # noqa: E402
+
+
+def pool_rows(first, count):
+    for i in range(first, first + count):
+        software = ",".join("Software {} ({}.{})".format((i + j) % 150, j, i % 7) for j in range(SOFTWARE_PER_POOL))
+        yield "pool-{},Pool {} (OS {}),{},true,\"{}\"\n".format(i, i, i % 20, 10 + i % 50, software)
+
+
+def main():
+    db.create_all()
+    pools_csv = ("ID,Name,MaximumCount,Enabled,Software\n" + "".join(pool_rows(0, POOLS))).encode("utf-8")
+
+    started = time.perf_counter()
+    Parser(io.BytesIO(pools_csv)).parse_file(True)
+    seconds = time.perf_counter() - started
+    print("streaming import  %d pools  %.2f s  %.0f pools/s" % (POOLS, seconds, POOLS / seconds))
+    assert len(Pool.get_existing_ids(["pool-{}".format(i) for i in range(POOLS)])) == POOLS
+
+    started = time.perf_counter()
+    for i in range(POOLS, POOLS + ROW_BY_ROW_POOLS):
+        pool = Pool.add_pool("pool-{}".format(i), "Pool {}".format(i), 10, "", True)
+        pool.set_operating_system(OperatingSystem.add_operating_system("OS {}".format(i % 20)))
+        for j in range(SOFTWARE_PER_POOL):
+            pool.add_software(Software.add_software("Software {}".format((i + j) % 150)), "{}.{}".format(j, i % 7))
+    seconds = time.perf_counter() - started
+    print("row by row        %d pools  %.2f s  %.0f pools/s" % (ROW_BY_ROW_POOLS, seconds,
+                                                                 ROW_BY_ROW_POOLS / seconds))
+
+    db.session.remove()
+    os.remove(database_file)
+
+
+if __name__ == "__main__":
+    main()
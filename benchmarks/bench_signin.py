@@ -0,0 +1,40 @@
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database import hashing
+
+# Sign-in throughput of the password hashing service for 0 (hashing in request threads) to N worker
+# processes. Request threads of gunicorn are simulated by a thread pool, every sign-in verifies a password:
+#
+#   python -m benchmarks.bench_signin
+
+REQUEST_THREADS = 16
+SIGN_INS = 400
+ROUNDS = 29000
+
+
+def sign_ins_per_second(service, pass_hash):
+    # the first call starts worker processes, it is not timed
+    assert service.verify("ala123456", pass_hash)[0]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(REQUEST_THREADS) as threads:
+        assert all(match for match, _ in threads.map(lambda _: service.verify("ala123456", pass_hash),
+                                                     range(SIGN_INS)))
+    return SIGN_INS / (time.perf_counter() - started)
+
+
+def main():
+    pass_hash = hashing.hash_password("ala123456", ROUNDS)
+    print("%d sign-ins from %d threads, %d rounds, %d CPUs" % (
+        SIGN_INS, REQUEST_THREADS, ROUNDS, multiprocessing.cpu_count()))
+
+    for workers in sorted({0, 1, 2, 4, multiprocessing.cpu_count()}):
+        service = hashing.HashingService(workers, SIGN_INS, ROUNDS)
+        print("%2d workers  %7.1f sign-ins/s" % (workers, sign_ins_per_second(service, pass_hash)))
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
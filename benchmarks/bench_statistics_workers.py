@@ -0,0 +1,63 @@
+import multiprocessing
+import time
+from datetime import timedelta, datetime as dt
+
+import numpy as np
+
+from statistics import grid, parallel
+
+# Times peak grid of bottleneck statistic computed in the request's process and partitioned between 1 to N
+# worker processes. Reservations are synthetic, so the database is not needed:
+#
+#   python -m benchmarks.bench_statistics_workers
+
+POOLS = 200
+RESERVATIONS = 400000
+START_DATE = dt(2019, 1, 1)
+END_DATE = dt(2022, 1, 1)
+INTERVAL = timedelta(minutes=30)
+REPEATS = 3
+
+
+def synthetic_reservations(seed=2019):
+    rng = np.random.RandomState(seed)
+    first = grid.to_microseconds([START_DATE])[0]
+    window = grid.to_microseconds([END_DATE])[0] - first
+    hour = 3600 * 10 ** 6
+
+    pool_indices = rng.randint(0, POOLS, RESERVATIONS)
+    starts = first + rng.randint(0, window // hour, RESERVATIONS) * hour
+    ends = starts + rng.randint(1, 72, RESERVATIONS) * hour
+    counts = rng.randint(1, 5, RESERVATIONS)
+    return pool_indices, starts, ends, counts
+
+
+def best_time(compute):
+    times = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        compute()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main():
+    arrays = synthetic_reservations() + (START_DATE, END_DATE, INTERVAL)
+    expected = grid.peak_grid(POOLS, *arrays)
+
+    serial = best_time(lambda: grid.peak_grid(POOLS, *arrays))
+    print("%d pools, %d reservations, %d intervals, %d CPUs" % (
+        POOLS, RESERVATIONS, expected.shape[1], multiprocessing.cpu_count()))
+    print("serial      %.3f s" % serial)
+
+    for workers in sorted({1, 2, 4, multiprocessing.cpu_count()}):
+        # the first call starts worker processes, it is not timed
+        assert (parallel.partitioned_grid(grid.peak_grid, workers, POOLS, *arrays) == expected).all()
+        seconds = best_time(lambda: parallel.partitioned_grid(grid.peak_grid, workers, POOLS, *arrays))
+        print("%2d workers  %.3f s  x%.2f" % (workers, seconds, serial / seconds))
+
+    parallel.shutdown()
+
+
+if __name__ == "__main__":
+    main()
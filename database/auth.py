@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# Row of the user a request is made by, kept on flask.g for the whole request
+AuthenticatedUser = namedtuple("AuthenticatedUser", ["ID", "Email", "IsAdmin"])
+
+
+# Process-local LRU cache of verified tokens and users they were issued for. Token is kept for at most ttl
+# seconds and never after it expires, tokens of a user are dropped when the user's email, admin permissions
+# change or the user is removed in this process, other processes notice it after ttl.
+class TokenCache:
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    # returns AuthenticatedUser of given token or None if token wasn't verified recently
+    def get(self, token):
+        with self._lock:
+            entry = self._tokens.get(token)
+            if entry is None or entry[0] <= time.monotonic() or entry[1] <= time.time():
+                if entry is not None:
+                    del self._tokens[token]
+                self.misses += 1
+                return None
+
+            self._tokens.move_to_end(token)
+            self.hits += 1
+            return entry[2]
+
+    # token_expires is the "exp" claim of the token, a unix timestamp
+    def put(self, token, user, token_expires):
+        with self._lock:
+            self._tokens[token] = (time.monotonic() + self.ttl, token_expires, user)
+            self._tokens.move_to_end(token)
+            while len(self._tokens) > self.max_entries:
+                self._tokens.popitem(last=False)
+                self.evictions += 1
+
+    # drops tokens of user of given email, or all tokens
+    def invalidate(self, email=None):
+        with self._lock:
+            if email is None:
+                self._tokens.clear()
+            else:
+                for token in [token for token, entry in self._tokens.items() if entry[2].Email == email]:
+                    del self._tokens[token]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._tokens),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }
@@ -1,18 +1,67 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import orm, exc as sa_exc
+from flask_migrate import Migrate
+from sqlalchemy import orm, func, and_, or_, exc as sa_exc
 import json
+import time
+import random
+from functools import wraps
 from settings import app
-from datetime import datetime as date
-from passlib.hash import pbkdf2_sha256
+from datetime import datetime as date, timedelta
+from database import timeline, auth, hashing
 
 db = SQLAlchemy(app)
+migrate = Migrate(app, db, render_as_batch=True)
+timeline_cache = timeline.TimelineCache(app.config["TIMELINE_CACHE_MAX_EVENTS"])
+auth_cache = auth.TokenCache(app.config["AUTH_CACHE_MAX_ENTRIES"], app.config["AUTH_CACHE_TTL"])
+hashing_service = hashing.HashingService(app.config["HASHING_WORKERS"], app.config["HASHING_QUEUE_LIMIT"],
+                                         app.config["PASSWORD_HASH_ROUNDS"])
+
+
+# Writers of the same pool are serialized by lock_timeline. When the database stays locked for longer than
+# sqlite timeout, the whole operation is retried with exponential backoff a limited number of times.
+def retry_on_lock(function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        attempts = app.config["LOCK_RETRY_ATTEMPTS"]
+        for attempt in range(attempts):
+            try:
+                return function(*args, **kwargs)
+            except sa_exc.OperationalError as e:
+                db.session.rollback()
+                if "locked" not in str(e) or attempt + 1 == attempts:
+                    raise
+                time.sleep(app.config["LOCK_RETRY_BACKOFF"] * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    return wrapper
+
+
+# Single row counting writes of reservations and pools, bumped in the same transaction as them. Results
+# computed from reservations, e.g. statistics, stay valid in any worker as long as it doesn't change.
+class WriteVersion(db.Model):
+    __tablename__ = "WriteVersion"
+
+    ID = db.Column(db.Integer, primary_key=True)
+    Version = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def bump():
+        updated = WriteVersion.query.filter(WriteVersion.ID == 1).update(
+            {WriteVersion.Version: WriteVersion.Version + 1}, synchronize_session=False
+        )
+        if not updated:
+            db.session.add(WriteVersion(ID=1, Version=1))
+            db.session.flush()
+
+    @staticmethod
+    def get():
+        return db.session.query(WriteVersion.Version).filter(WriteVersion.ID == 1).scalar() or 0
 
 
 class SoftwareList(db.Model):
     __tablename__ = "SoftwareList"
 
-    PoolID = db.Column(db.Integer, db.ForeignKey("Pool.ID"), primary_key=True)
-    SoftwareID = db.Column(db.Integer, db.ForeignKey("Software.ID"), primary_key=True)
+    PoolID = db.Column(db.String(80), db.ForeignKey("Pool.ID"), primary_key=True)
+    SoftwareID = db.Column(db.Integer, db.ForeignKey("Software.ID"), primary_key=True, index=True)
     Version = db.Column(db.String(80), primary_key=True)
     Software = db.relationship("Software")
 
@@ -26,6 +75,8 @@ class Pool(db.Model):
     Description = db.Column(db.String(200))
     Enabled = db.Column(db.Boolean)
     OSID = db.Column(db.Integer, db.ForeignKey("OperatingSystem.ID"))
+    # bumped with every change of pool's reservations, tells if cached timeline is up to date
+    TimelineVersion = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     Software = db.relationship("SoftwareList")
 
     @staticmethod
@@ -47,6 +98,7 @@ class Pool(db.Model):
                 Enabled=enabled,
             )
             db.session.add(pool)
+            WriteVersion.bump()
             db.session.commit()
         except sa_exc.IntegrityError:
             print("Pool with ID:'" + pool_id + "' already exists")
@@ -54,12 +106,66 @@ class Pool(db.Model):
 
         return pool
 
+    # returns set of given pool IDs that already exist, with a single query
+    @staticmethod
+    def get_existing_ids(pool_ids):
+        if not pool_ids:
+            return set()
+        return {pool_id for pool_id, in db.session.query(Pool.ID).filter(Pool.ID.in_(set(pool_ids)))}
+
+    # Adds pools given in chunks [(ID, Name, MaximumCount, Description, Enabled, "os name" or None,
+    # [("software name", version)])] with a few bulk inserts per chunk, missing operating systems and
+    # software are added as well. All chunks are added in a single transaction.
+    @staticmethod
+    def add_pools(pool_chunks):
+        try:
+            for pools_data in pool_chunks:
+                if not pools_data:
+                    continue
+
+                os_ids = OperatingSystem.get_or_add_ids({os_name for _, _, _, _, _, os_name, _ in pools_data
+                                                         if os_name})
+                software_ids = Software.get_or_add_ids({name for pool_data in pools_data
+                                                        for name, _ in pool_data[6]})
+
+                db.session.execute(Pool.__table__.insert(), [{
+                    "ID": pool_id,
+                    "Name": name,
+                    "MaximumCount": maximum_count,
+                    "Description": description,
+                    "Enabled": enabled,
+                    "OSID": os_ids.get(os_name),
+                } for pool_id, name, maximum_count, description, enabled, os_name, _ in pools_data])
+
+                software_list = {(pool_data[0], software_ids[name], version)
+                                 for pool_data in pools_data for name, version in pool_data[6]}
+                if software_list:
+                    db.session.execute(SoftwareList.__table__.insert(), [
+                        {"PoolID": pool_id, "SoftwareID": software_id, "Version": version}
+                        for pool_id, software_id, version in software_list
+                    ])
+
+            WriteVersion.bump()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
     @staticmethod
     def get_all_pools(only_enabled=False):
         if only_enabled:
             return Pool.query.filter(Pool.Enabled == True).all()
         return Pool.query.all()
 
+    # query of IDs of all pools, used as IN (subquery) where a list of every ID could exceed SQLite's limit
+    # of bound variables
+    @staticmethod
+    def ids_query(only_enabled=False):
+        query = db.session.query(Pool.ID)
+        if only_enabled:
+            query = query.filter(Pool.Enabled == True)
+        return query
+
     def remove(self):
         try:
             software_list = SoftwareList.query.filter(SoftwareList.PoolID == self.ID).all()
@@ -76,6 +182,10 @@ class Pool(db.Model):
                 db.session.commit()
         except orm.exc.UnmappedInstanceError:
             print("Pool of ID:'" + self.ID + "' has no future reservations")
+        OccupancyDelta.query.filter(OccupancyDelta.PoolID == self.ID).delete()
+        OccupancyCheckpoint.query.filter(OccupancyCheckpoint.PoolID == self.ID).delete()
+        db.session.commit()
+        timeline_cache.invalidate(self.ID)
 
         try:
             reservation_list = Reservation.query.filter(Reservation.PoolID == self.ID).all()
@@ -86,6 +196,7 @@ class Pool(db.Model):
             print("Pool of ID:'" + self.ID + "' has no reservations")
 
         db.session.delete(self)
+        WriteVersion.bump()
         db.session.commit()
 
     def edit_pool(self, new_id=None, name=None, max_count=None, description=None, enabled=None):
@@ -116,6 +227,15 @@ class Pool(db.Model):
         for reservation in reservation_list:
             reservation.PoolID = new_id
             db.session.commit()
+        OccupancyDelta.query.filter(OccupancyDelta.PoolID == old_id).update(
+            {OccupancyDelta.PoolID: new_id}, synchronize_session=False
+        )
+        OccupancyCheckpoint.query.filter(OccupancyCheckpoint.PoolID == old_id).update(
+            {OccupancyCheckpoint.PoolID: new_id}, synchronize_session=False
+        )
+        WriteVersion.bump()
+        db.session.commit()
+        timeline_cache.invalidate(old_id)
 
     def edit_software(self, new_software_list):
         pool = Pool.query.filter(Pool.ID == self.ID).first()
@@ -182,6 +302,7 @@ class Pool(db.Model):
         self.OSID = operating_system.ID
         db.session.commit()
 
+    @retry_on_lock
     def add_reservation(self, user, machine_count, start_date, end_date):
         if machine_count <= 0:
             raise ValueError("Machine count have to greater than 0")
@@ -189,17 +310,19 @@ class Pool(db.Model):
         if self.Enabled is False:
             raise AttributeError("Disabled Pool cannot be reserved")
 
-        free_machines = self.available_machines(start_date, end_date)
-
-        if free_machines-machine_count < 0:
-            raise ValueError("There are not enough available machines in given time frame")
-
         if start_date > end_date:
             raise ValueError("Reservation cannot end before it starts!")
 
         if start_date < date.now():
             raise ValueError("Reservation must be set in future")
 
+        # other workers can't add reservations to this pool until commit, so the check stays valid
+        pool_timeline = self.lock_timeline()
+
+        if self.MaximumCount - pool_timeline.maximum_taken(start_date, end_date) < machine_count:
+            db.session.rollback()
+            raise ValueError("There are not enough available machines in given time frame")
+
         try:
             reservation = Reservation(
                 PoolID=self.ID,
@@ -211,12 +334,72 @@ class Pool(db.Model):
             )
 
             db.session.add(reservation)
+            OccupancyDelta.record(self.ID, start_date, end_date, machine_count)
+            pool_timeline.add(start_date, end_date, machine_count)
+            WriteVersion.bump()
             db.session.commit()
-
-            return reservation
         except sa_exc.IntegrityError:
+            db.session.rollback()
             raise ValueError("Reservation of pool nr: " + self.ID + " cannot be added")
 
+        timeline_cache.put(self.ID, pool_timeline)
+
+        return reservation
+
+    # Adds reservation for every (start_date, end_date) in one transaction. All of them are checked
+    # against the same timeline, so they have to fit together with each other. Without force nothing is
+    # added if any of them fails. Returns [(start_date, end_date, error)], error is None for added ones.
+    @retry_on_lock
+    def add_reservations(self, user, machine_count, dates, force=False):
+        if machine_count <= 0:
+            raise ValueError("Machine count have to greater than 0")
+
+        if self.Enabled is False:
+            raise AttributeError("Disabled Pool cannot be reserved")
+
+        pool_timeline = self.lock_timeline()
+        results = []
+        rows = []
+
+        for start_date, end_date in dates:
+            if start_date > end_date:
+                error = "Reservation cannot end before it starts!"
+            elif start_date < date.now():
+                error = "Reservation must be set in future"
+            elif self.MaximumCount - pool_timeline.maximum_taken(start_date, end_date) < machine_count:
+                error = "There are not enough available machines in given time frame"
+            else:
+                error = None
+                pool_timeline.add(start_date, end_date, machine_count)
+                rows.append({
+                    "PoolID": self.ID,
+                    "UserID": user.ID,
+                    "StartDate": start_date,
+                    "EndDate": end_date,
+                    "MachineCount": machine_count,
+                    "Cancelled": False
+                })
+
+            results.append((start_date, end_date, error))
+
+        if not rows or (not force and len(rows) < len(results)):
+            db.session.rollback()
+            return results
+
+        try:
+            db.session.execute(Reservation.__table__.insert(), rows)
+            OccupancyDelta.record_many(
+                (self.ID, row["StartDate"], row["EndDate"], row["MachineCount"]) for row in rows
+            )
+            WriteVersion.bump()
+            db.session.commit()
+        except sa_exc.IntegrityError:
+            db.session.rollback()
+            raise ValueError("Reservations of pool nr: " + self.ID + " cannot be added")
+
+        timeline_cache.put(self.ID, pool_timeline)
+        return results
+
     def get_reservations(self, start_date=date(2019, 1, 1), end_date=date(2099, 12, 31), show_cancelled=False):
         if show_cancelled is True:
             return Reservation.query.filter(
@@ -232,38 +415,201 @@ class Pool(db.Model):
                 Reservation.Cancelled != True
             ).all()
 
-    def available_machines(self, start_date, end_date):
+    # returns [(StartDate, EndDate, MachineCount)] of active reservations overlapping given time frame
+    def get_timeline(self, start_date=date(2019, 1, 1), end_date=date(2099, 12, 31), excluded_id=None):
+        query = Reservation.query.filter(
+            Reservation.PoolID == self.ID,
+            Reservation.StartDate < end_date,
+            Reservation.EndDate > start_date,
+            Reservation.Cancelled != True
+        )
+        if excluded_id is not None:
+            query = query.filter(Reservation.ID != excluded_id)
+
+        return query.with_entities(Reservation.StartDate, Reservation.EndDate, Reservation.MachineCount).all()
+
+    def get_cached_timeline(self):
+        pool_timeline = timeline_cache.get(self.ID, self.TimelineVersion)
+
+        if pool_timeline is None:
+            pool_timeline = OccupancyDelta.get_pool_timeline(self.ID, self.TimelineVersion)
+            timeline_cache.put(self.ID, pool_timeline)
+
+        return pool_timeline
+
+    # has to be called in the same transaction as the change of pool's reservations
+    def bump_timeline_version(self):
+        self.TimelineVersion = Pool.TimelineVersion + 1
+        WriteVersion.bump()
+
+    # Bumps TimelineVersion as the first statement of a transaction, so concurrent writers to this pool
+    # wait until it's finished. Returns copy of pool's timeline, which stays valid until commit.
+    def lock_timeline(self):
+        return Pool.lock_timelines([self.ID])[self.ID]
+
+    # lock_timeline of many pools with a single UPDATE, returns {pool id: copy of timeline}, pools which
+    # don't exist are skipped. Ledgers with many old deltas are folded into checkpoints on the way.
+    @staticmethod
+    def lock_timelines(pool_ids):
+        pool_ids = set(pool_ids)
+        if not pool_ids:
+            return {}
+        horizon = date.now() - timedelta(days=app.config["LEDGER_CHECKPOINT_DAYS"])
+
+        Pool.query.filter(Pool.ID.in_(pool_ids)).update(
+            {Pool.TimelineVersion: Pool.TimelineVersion + 1}, synchronize_session=False
+        )
+
+        timelines = {}
+        for pool_id, version in db.session.query(Pool.ID, Pool.TimelineVersion).filter(Pool.ID.in_(pool_ids)):
+            pool_timeline = timeline_cache.get(pool_id, version - 1)
+            if pool_timeline is None:
+                pool_timeline = OccupancyDelta.get_pool_timeline(pool_id, version - 1)
+
+            pool_timeline = pool_timeline.copy()
+            pool_timeline.version = version
+            if pool_timeline.count_before(horizon) > app.config["LEDGER_CHECKPOINT_EVENTS"]:
+                OccupancyDelta.fold(pool_id, horizon)
+                pool_timeline.truncate(horizon)
+            timelines[pool_id] = pool_timeline
+        return timelines
+
+    # excluded_id allows to check if reservation of given ID can be moved without counting it twice
+    def available_machines(self, start_date, end_date, excluded_id=None):
         if self.Enabled is False:
             raise AttributeError("Disabled Pool has no available machines")
 
+        if excluded_id is None and start_date < end_date:
+            pool_timeline = self.get_cached_timeline()
+            # history folded into a checkpoint is read from reservations below
+            if pool_timeline.covers(start_date):
+                return self.MaximumCount - pool_timeline.maximum_taken(start_date, end_date)
+
+        reservations = self.get_timeline(start_date, end_date, excluded_id)
+        return timeline.minimum_free(self.MaximumCount, reservations, start_date, end_date)
+
+    # returns matrix of available machines, row for every pool and column for every (start_date, end_date)
+    @staticmethod
+    def get_availability_matrix(pool_ids, windows):
+        if any(end_date <= start_date for start_date, end_date in windows):
+            raise ValueError("Every time frame must end after it starts")
+
+        pools = {pool.ID: pool for pool in Pool.query.filter(Pool.ID.in_(pool_ids)).all()}
+        for pool_id in pool_ids:
+            if pool_id not in pools:
+                raise ValueError('Pool of ID "{}" does not exist'.format(str(pool_id)))
+
+        timelines = {}
+        for pool in pools.values():
+            if pool.Enabled is not False:
+                timelines[pool.ID] = timeline_cache.get(pool.ID, pool.TimelineVersion)
+
+        # timelines missing in cache, or starting after some time frame, are built from one query limited to
+        # requested time frames
+        uncached_ids = [
+            pool_id for pool_id, pool_timeline in timelines.items()
+            if pool_timeline is None or not all(pool_timeline.covers(start_date) for start_date, _ in windows)
+        ]
+        if uncached_ids and windows:
+            reservations = {pool_id: [] for pool_id in uncached_ids}
+            reservations_array = Reservation.query.filter(
+                Reservation.PoolID.in_(uncached_ids),
+                Reservation.StartDate < max(end_date for _, end_date in windows),
+                Reservation.EndDate > min(start_date for start_date, _ in windows),
+                Reservation.Cancelled != True
+            ).with_entities(Reservation.PoolID, Reservation.StartDate, Reservation.EndDate,
+                            Reservation.MachineCount).all()
+
+            for pool_id, start_date, end_date, machine_count in reservations_array:
+                reservations[pool_id].append((start_date, end_date, machine_count))
+            for pool_id in uncached_ids:
+                timelines[pool_id] = timeline.PoolTimeline(reservations[pool_id], None)
+
+        matrix = []
+        for pool_id in pool_ids:
+            pool = pools[pool_id]
+            if pool_id not in timelines:
+                # disabled pool has no available machines
+                matrix.append([0 for _ in windows])
+            else:
+                matrix.append([
+                    pool.MaximumCount - timelines[pool_id].maximum_taken(start_date, end_date)
+                    for start_date, end_date in windows
+                ])
+
+        return matrix
+
+    # returns {pool_id: [(date, free_machines)]}, see timeline.free_machines_steps
+    @staticmethod
+    def get_availability_steps(pool_ids, start_date, end_date):
+        pools = {pool.ID: pool for pool in Pool.query.filter(Pool.ID.in_(pool_ids)).all()}
+        for pool_id in pool_ids:
+            if pool_id not in pools:
+                raise ValueError('Pool of ID "{}" does not exist'.format(str(pool_id)))
+
+        reservations = {pool_id: [] for pool_id in pool_ids}
         reservations_array = Reservation.query.filter(
-            Reservation.PoolID == self.ID,
+            Reservation.PoolID.in_(pool_ids),
             Reservation.StartDate < end_date,
             Reservation.EndDate > start_date,
             Reservation.Cancelled != True
+        ).with_entities(
+            Reservation.PoolID, Reservation.StartDate, Reservation.EndDate, Reservation.MachineCount
         ).all()
 
-        divide_date = None
-        taken_machines = 0
-        for reservation in reservations_array:
-            taken_machines += reservation.MachineCount
-            if start_date < reservation.StartDate < end_date:
-                divide_date = reservation.StartDate
-                break
-            elif start_date < reservation.EndDate < end_date:
-                divide_date = reservation.EndDate
-                break
-
-        if divide_date:
-            left = self.available_machines(start_date, divide_date)
-            right = self.available_machines(divide_date, end_date)
-
-            if left >= right:
-                return right
+        # order doesn't matter, free_machines_steps sorts events itself
+        for pool_id, _start_date, _end_date, machine_count in reservations_array:
+            reservations[pool_id].append((_start_date, _end_date, machine_count))
+
+        steps = {}
+        for pool_id, pool in pools.items():
+            if pool.Enabled is False:
+                # disabled pool has no available machines
+                steps[pool_id] = [(start_date, 0)]
             else:
-                return left
-        else:
-            return self.MaximumCount - taken_machines
+                steps[pool_id] = timeline.free_machines_steps(pool.MaximumCount, reservations[pool_id],
+                                                              start_date, end_date)
+
+        return steps
+
+    # returns [(ID, Name, machine_hours)] of all pools with a single query, machine hours of reservations
+    # are clipped to [start_date, end_date)
+    @staticmethod
+    def get_all_machines_hours(start_date=date(2019, 1, 1), end_date=date(2099, 12, 31)):
+        machine_hours = func.coalesce(func.sum(Reservation.clipped_machine_seconds(start_date, end_date)), 0) / 3600.0
+
+        return db.session.query(Pool.ID, Pool.Name, machine_hours).outerjoin(Reservation, and_(
+            Reservation.PoolID == Pool.ID,
+            Reservation.StartDate < end_date,
+            Reservation.EndDate > start_date,
+            Reservation.Cancelled != True
+        )).group_by(Pool.ID, Pool.Name).all()
+
+    # returns [(PoolID, StartDate, EndDate, MachineCount)] of active reservations of given pools
+    # overlapping given time frame, pool_ids is a list or a query of IDs, e.g. Pool.ids_query()
+    @staticmethod
+    def get_timelines(pool_ids, start_date, end_date):
+        return Reservation.query.filter(
+            Reservation.PoolID.in_(pool_ids),
+            Reservation.StartDate < end_date,
+            Reservation.EndDate > start_date,
+            Reservation.Cancelled != True
+        ).with_entities(
+            Reservation.PoolID, Reservation.StartDate, Reservation.EndDate, Reservation.MachineCount
+        ).all()
+
+    # yields (PoolID, StartDate, EndDate, MachineCount) like get_timelines, ordered by pool and start date and
+    # fetched in chunks of given size
+    @staticmethod
+    def iter_timelines(pool_ids, start_date, end_date, chunk_size=1000):
+        return Reservation.query.filter(
+            Reservation.PoolID.in_(pool_ids),
+            Reservation.StartDate < end_date,
+            Reservation.EndDate > start_date,
+            Reservation.Cancelled != True
+        ).order_by(Reservation.PoolID, Reservation.StartDate).with_entities(
+            Reservation.PoolID, Reservation.StartDate, Reservation.EndDate, Reservation.MachineCount
+        ).yield_per(chunk_size)
 
     def get_machines_hours(self, start_date=date(2019, 1, 1), end_date=date(2099, 12, 31)):
         machine_hours = 0
@@ -279,7 +625,7 @@ class Pool(db.Model):
             _start_date = reservation.StartDate
             _end_date = reservation.EndDate
             _machine_count = reservation.MachineCount
-            machine_hours = machine_hours + (_end_date - _start_date).seconds/3600 * _machine_count
+            machine_hours = machine_hours + (_end_date - _start_date).total_seconds()/3600 * _machine_count
 
         return int(machine_hours)
 
@@ -287,6 +633,43 @@ class Pool(db.Model):
     def get_table():
         return [Pool.json(pool) for pool in Pool.query.all()]
 
+    # yields Pool.json() of every pool, reading pools and their software in chunks of given size
+    @staticmethod
+    def iter_json(chunk_size=1000):
+        query = db.session.query(
+            Pool.ID, Pool.Name, Pool.MaximumCount, Pool.Enabled, OperatingSystem.Name.label("OSName")
+        ).outerjoin(OperatingSystem, Pool.OSID == OperatingSystem.ID).order_by(Pool.ID)
+
+        chunk = []
+        for row in query.yield_per(chunk_size):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield from Pool._chunk_json(chunk)
+                chunk = []
+        yield from Pool._chunk_json(chunk)
+
+    @staticmethod
+    def _chunk_json(chunk):
+        if not chunk:
+            return
+
+        software_lists = {row.ID: [] for row in chunk}
+        software_array = SoftwareList.query.filter(
+            SoftwareList.PoolID.in_(software_lists.keys())
+        ).with_entities(SoftwareList.PoolID, Software.Name, SoftwareList.Version).join(Software).all()
+        for pool_id, name, version in software_array:
+            software_lists[pool_id].append((name, version))
+
+        for row in chunk:
+            yield {
+                "ID": row.ID,
+                "Name": row.Name,
+                "MaximumCount": row.MaximumCount,
+                "Enabled": row.Enabled,
+                "OSName": row.OSName if row.OSName is not None else "",
+                "InstalledSoftware": software_lists[row.ID],
+            }
+
     def get_issues(self, show_resolved_issues=True, show_rejected_issues=True):
         return Issue.query.filter(
             Issue.PoolID == self.ID,
@@ -350,6 +733,15 @@ class User(db.Model):
         else:
             raise ValueError('User of email "{}" does not exist'.format(str(email)))
 
+    # returns AuthenticatedUser(ID, Email, IsAdmin) of given email, without loading the whole user
+    @staticmethod
+    def get_authenticated(email):
+        user = db.session.query(User.ID, User.Email, User.IsAdmin).filter(User.Email == email).first()
+        if user:
+            return auth.AuthenticatedUser(*user)
+        else:
+            raise ValueError('User of email "{}" does not exist'.format(str(email)))
+
     @staticmethod
     def get_all_users():
         return User.query.all()
@@ -357,7 +749,7 @@ class User(db.Model):
     @staticmethod
     def add_user(email, password, name, surname, is_admin=False):
         try:
-            pass_hash = pbkdf2_sha256.hash(password)
+            pass_hash = hashing_service.hash(password)
             user = User(
                 Email=email,
                 Password=pass_hash,
@@ -366,18 +758,73 @@ class User(db.Model):
                 IsAdmin=is_admin,
             )
             db.session.add(user)
+            WriteVersion.bump()
             db.session.commit()
 
             return user
         except sa_exc.IntegrityError:
             raise ValueError("User with email '{}' already exist".format(email))
 
+    # Adds users [{"Email", "Password", "Name", "Surname", "IsAdmin"}] with a single insert. Returns report
+    # [{"line", "email", "status", "info"}] with status "created" or "error" for every given user, users
+    # with errors are skipped, the others are added anyway.
+    @staticmethod
+    def add_users(users_data):
+        report = []
+        valid_users = []
+        emails = set()
+        for line, user_data in enumerate(users_data, 1):
+            if not isinstance(user_data, dict):
+                user_data = {}
+            email = str(user_data.get("Email") or "").strip()
+            if not email or not user_data.get("Password"):
+                info = "Email and password are required"
+            elif not isinstance(user_data.get("IsAdmin", False), bool):
+                info = "IsAdmin should be true or false"
+            elif email in emails:
+                info = "Email is repeated in given users"
+            else:
+                info = None
+                emails.add(email)
+                valid_users.append((line, email, user_data))
+            report.append({"line": line, "email": email, "status": "error" if info else "created", "info": info})
+
+        # emails are checked in chunks, so their number isn't limited by SQLite's limit of bound variables
+        emails = sorted(emails)
+        chunk_size = app.config["IMPORT_CHUNK_SIZE"]
+        existing_emails = set()
+        for first in range(0, len(emails), chunk_size):
+            existing_emails.update(email for email, in db.session.query(User.Email).filter(
+                User.Email.in_(emails[first:first + chunk_size])
+            ))
+        for line, email, _ in valid_users:
+            if email in existing_emails:
+                report[line - 1].update(status="error", info="User with this email already exists")
+        valid_users = [user for user in valid_users if user[1] not in existing_emails]
+
+        pass_hashes = hashing_service.hash_many([str(user_data["Password"]) for _, _, user_data in valid_users])
+        if valid_users:
+            try:
+                db.session.execute(User.__table__.insert(), [{
+                    "Email": email,
+                    "Password": pass_hash,
+                    "Name": user_data.get("Name"),
+                    "Surname": user_data.get("Surname"),
+                    "IsAdmin": user_data.get("IsAdmin", False),
+                } for (_, email, user_data), pass_hash in zip(valid_users, pass_hashes)])
+                WriteVersion.bump()
+                db.session.commit()
+            except sa_exc.IntegrityError:
+                db.session.rollback()
+                raise ValueError("Some of given users were added at the same time")
+
+        return report
+
     def remove(self):
         try:
             reservation_list = self.get_reservations(start_date=date.now())
             for reservation in reservation_list:
-                reservation.Cancelled = True
-                db.session.commit()
+                reservation.cancel()
         except orm.exc.UnmappedInstanceError:
             print("User of ID:'" + self.ID + "' has no future reservations")
 
@@ -391,35 +838,79 @@ class User(db.Model):
             raise ValueError
 
         db.session.delete(self)
+        WriteVersion.bump()
         db.session.commit()
+        auth_cache.invalidate(self.Email)
+
+    # Changes given fields of name, surname, email, password and is_admin with a single commit, fields of
+    # None value and empty password are left as they are. Returns set of names of fields that changed.
+    def update(self, **fields):
+        columns = {"name": "Name", "surname": "Surname", "email": "Email", "is_admin": "IsAdmin"}
+        unknown_fields = set(fields) - set(columns) - {"password"}
+        if unknown_fields:
+            raise TypeError("Unknown user fields: {}".format(", ".join(sorted(unknown_fields))))
+
+        changed = {field for field, column in columns.items()
+                   if fields.get(field) is not None and fields[field] != getattr(self, column)}
+        # only a new password is hashed, the old hash is never hashed again
+        pass_hash = hashing_service.hash(fields["password"]) if fields.get("password") else None
+        if pass_hash:
+            changed.add("password")
+        if not changed:
+            return changed
+
+        old_email = self.Email
+        for field in changed - {"password"}:
+            setattr(self, columns[field], fields[field])
+        if pass_hash:
+            self.Password = pass_hash
+
+        try:
+            # statistics show names and emails of users
+            if changed & {"name", "surname", "email"}:
+                WriteVersion.bump()
+            db.session.commit()
+        except sa_exc.IntegrityError:
+            db.session.rollback()
+            raise ValueError("User with email '{}' already exist".format(fields["email"]))
+
+        if changed & {"email", "is_admin"}:
+            auth_cache.invalidate(old_email)
+        return changed
 
     def set_email(self, email):
         if email != self.Email:
+            old_email = self.Email
             try:
                 self.Email = email
+                WriteVersion.bump()
                 db.session.commit()
             except sa_exc.IntegrityError:
                 print("Email: '" + self.Email + "' already exists in database")
+            auth_cache.invalidate(old_email)
 
     def set_password(self, password):
-        pass_hash = pbkdf2_sha256.hash(password)
+        pass_hash = hashing_service.hash(password)
         self.Password = pass_hash
         db.session.commit()
 
     def set_name(self, name):
         if name != self.Name:
             self.Name = name
+            WriteVersion.bump()
             db.session.commit()
 
     def set_surname(self, surname):
         if surname != self.Surname:
             self.Surname = surname
+            WriteVersion.bump()
             db.session.commit()
 
     def set_admin_permissions(self, is_admin):
         if self.IsAdmin != is_admin:
             self.IsAdmin = is_admin
             db.session.commit()
+            auth_cache.invalidate(self.Email)
 
     def give_admin_permissions(self):
         if self.IsAdmin is True:
@@ -427,6 +918,7 @@ class User(db.Model):
         else:
             self.IsAdmin = True
             db.session.commit()
+            auth_cache.invalidate(self.Email)
 
     def remove_admin_permissions(self):
         if self.IsAdmin is False:
@@ -434,9 +926,15 @@ class User(db.Model):
         else:
             self.IsAdmin = False
             db.session.commit()
+            auth_cache.invalidate(self.Email)
 
+    # hash of outdated parameters is replaced after successful check
     def check_password(self, password):
-        return pbkdf2_sha256.verify(password, self.Password)
+        match, new_hash = hashing_service.verify(password, self.Password)
+        if match and new_hash:
+            self.Password = new_hash
+            db.session.commit()
+        return match
 
     def get_reservations(self, start_date=date(2019, 1, 1), end_date=date(2099, 12, 31), show_cancelled=False):
         if show_cancelled is True:
@@ -453,6 +951,19 @@ class User(db.Model):
                 Reservation.Cancelled != True
             ).all()
 
+    # returns [(Email, Name, Surname, machine_hours)] of all users with a single query, machine hours of
+    # reservations are clipped to [start_date, end_date)
+    @staticmethod
+    def get_all_machines_hours(start_date=date(2019, 1, 1), end_date=date(2099, 12, 31)):
+        machine_hours = func.coalesce(func.sum(Reservation.clipped_machine_seconds(start_date, end_date)), 0) / 3600.0
+
+        return db.session.query(User.Email, User.Name, User.Surname, machine_hours).outerjoin(Reservation, and_(
+            Reservation.UserID == User.ID,
+            Reservation.StartDate < end_date,
+            Reservation.EndDate > start_date,
+            Reservation.Cancelled != True
+        )).group_by(User.ID, User.Email, User.Name, User.Surname).all()
+
     def get_machines_hours(self, start_date=date(2019, 1, 1), end_date=date(2099, 12, 31)):
         machine_hours = 0
 
@@ -467,7 +978,7 @@ class User(db.Model):
             _start_date = reservation.StartDate
             _end_date = reservation.EndDate
             _machine_count = reservation.MachineCount
-            machine_hours = machine_hours + (_end_date - _start_date).seconds/3600 * _machine_count
+            machine_hours = machine_hours + (_end_date - _start_date).total_seconds()/3600 * _machine_count
 
         return int(machine_hours)
 
@@ -499,9 +1010,15 @@ class User(db.Model):
 
 class Reservation(db.Model):
     __tablename__ = "Reservation"
+    # indexes cover filters used by availability, statistics and listing queries
+    __table_args__ = (
+        db.Index("ix_Reservation_PoolID_StartDate", "PoolID", "StartDate", "EndDate", "Cancelled"),
+        db.Index("ix_Reservation_UserID_StartDate", "UserID", "StartDate", "EndDate", "Cancelled"),
+        db.Index("ix_Reservation_StartDate", "StartDate"),
+    )
 
     ID = db.Column(db.Integer, primary_key=True)
-    PoolID = db.Column(db.Integer, db.ForeignKey("Pool.ID"))
+    PoolID = db.Column(db.String(80), db.ForeignKey("Pool.ID"))
     UserID = db.Column(db.Integer, db.ForeignKey("User.ID"))
     StartDate = db.Column(db.DateTime)
     EndDate = db.Column(db.DateTime)
@@ -521,53 +1038,225 @@ class Reservation(db.Model):
 
     @staticmethod
     def get_reservations(start_date=date(2019, 1, 1), end_date=date(2099, 12, 31), show_cancelled=False):
-        reservation_list = []
+        return Reservation.filter_listing(Reservation.query, start_date, end_date, show_cancelled).options(
+            orm.joinedload(Reservation.User), orm.joinedload(Reservation.Pool)
+        ).all()
 
-        if show_cancelled is True:
-            query = Reservation.query.filter(
-                Reservation.StartDate > start_date,
-                Reservation.EndDate < end_date
-            ).with_entities(Reservation.ID).all()
-        else:
-            query = Reservation.query.filter(
-                Reservation.Cancelled != True,
-                Reservation.StartDate > start_date,
-                Reservation.EndDate < end_date
-            ).with_entities(Reservation.ID).all()
+    # yields Reservation.json() of reservations in given time frame, fetching rows in chunks of given size
+    @staticmethod
+    def iter_json(start_date=date(2019, 1, 1), end_date=date(2099, 12, 31), show_cancelled=False,
+                  chunk_size=1000):
+        query = Reservation.filter_listing(Reservation.listing_query(), start_date, end_date, show_cancelled)
 
-        for reservation_id in query:
-            reservation = Reservation.get_reservation(reservation_id[0])
-            reservation_list.append(reservation)
+        for row in query.order_by(Reservation.StartDate, Reservation.ID).yield_per(chunk_size):
+            yield Reservation.row_json(row)
 
-        return reservation_list
+    # returns [Reservation.json()] of reservations in given time frame using a single query
+    @staticmethod
+    def get_reservations_json(start_date=date(2019, 1, 1), end_date=date(2099, 12, 31), show_cancelled=False,
+                              **filters):
+        query = Reservation.filter_listing(Reservation.listing_query(), start_date, end_date, show_cancelled,
+                                           **filters)
+        return [Reservation.row_json(row) for row in query.all()]
+
+    # Returns one page of reservations ordered by (StartDate, ID) and key of the last one, which should be
+    # passed as after_key to get the next page (None if there are no more). Pages are found by index
+    # instead of OFFSET, so every page costs the same.
+    @staticmethod
+    def get_reservations_page(limit, after_key=None, start_date=date(2019, 1, 1), end_date=date(2099, 12, 31),
+                              show_cancelled=False, **filters):
+        query = Reservation.listing_query()
+
+        # SQLite bounds the index range by a single lower bound of StartDate, so the key replaces start_date.
+        # Key not later than start_date excludes nothing more than start_date does and is skipped.
+        if after_key is not None and after_key[0] > start_date:
+            after_date, after_id = after_key
+            query = query.filter(Reservation.StartDate >= after_date, or_(
+                Reservation.StartDate > after_date,
+                and_(Reservation.StartDate == after_date, Reservation.ID > after_id)
+            ))
+            start_date = None
+
+        query = Reservation.filter_listing(query, start_date, end_date, show_cancelled, **filters)
+        rows = query.order_by(Reservation.StartDate, Reservation.ID).limit(limit + 1).all()
+
+        next_key = (rows[limit - 1].StartDate, rows[limit - 1].ID) if len(rows) > limit else None
+        return [Reservation.row_json(row) for row in rows[:limit]], next_key
+
+    # cancelled=True/False returns only cancelled/active reservations regardless of show_cancelled,
+    # start_date=None doesn't limit start of reservations
+    @staticmethod
+    def filter_listing(query, start_date, end_date, show_cancelled, pool_id=None, email=None,
+                       min_count=None, max_count=None, cancelled=None):
+        query = query.filter(Reservation.EndDate < end_date)
+        if start_date is not None:
+            query = query.filter(Reservation.StartDate > start_date)
+
+        if cancelled is not None:
+            query = query.filter(Reservation.Cancelled == cancelled)
+        elif show_cancelled is not True:
+            query = query.filter(Reservation.Cancelled != True)
+
+        if pool_id is not None:
+            query = query.filter(Reservation.PoolID == pool_id)
+        if email is not None:
+            query = query.filter(Reservation.User.has(User.Email == email))
+        if min_count is not None:
+            query = query.filter(Reservation.MachineCount >= min_count)
+        if max_count is not None:
+            query = query.filter(Reservation.MachineCount <= max_count)
+
+        return query
+
+    # query of all columns needed by row_json, with user and pool joined instead of lazily loaded
+    @staticmethod
+    def listing_query():
+        return db.session.query(
+            Reservation.ID,
+            Reservation.UserID,
+            Reservation.PoolID,
+            Reservation.StartDate,
+            Reservation.EndDate,
+            Reservation.MachineCount,
+            Reservation.Cancelled,
+            User.Name.label("UserName"),
+            User.Surname.label("UserSurname"),
+            User.Email.label("UserEmail"),
+            Pool.Name.label("PoolName"),
+        ).outerjoin(User, Reservation.UserID == User.ID).outerjoin(Pool, Reservation.PoolID == Pool.ID)
+
+    # same layout as Reservation.json, made of row returned by listing_query
+    @staticmethod
+    def row_json(row):
+        conversion_format = "%Y-%m-%dT%H:%M:%S.%f"
+        has_user = row.UserEmail is not None
+        return {
+            "ReservationID": row.ID,
+            "Name": row.UserName if has_user else '',
+            "Surname": row.UserSurname if has_user else '',
+            "UserID": row.UserID if row.UserID else '',
+            "UserEmail": row.UserEmail if has_user else '',
+            "PoolName": row.PoolName if row.PoolName is not None else '',
+            "PoolID": row.PoolID if row.PoolID else '',
+            "StartDate": (row.StartDate.strftime(conversion_format))[0:23]+'Z',
+            "EndDate": (row.EndDate.strftime(conversion_format))[0:23]+'Z',
+            "Count": row.MachineCount,
+            "Cancelled": "true" if row.Cancelled else "false"
+        }
 
+    @retry_on_lock
     def cancel(self):
         if self.Cancelled:
             print("Reservation " + str(self.ID) + " is already cancelled")
             raise AttributeError
 
+        pool_timeline = self.Pool.lock_timeline() if self.Pool else None
+        # reservation could be cancelled by another worker before the pool was locked
+        db.session.refresh(self)
+        if self.Cancelled:
+            db.session.rollback()
+            print("Reservation " + str(self.ID) + " is already cancelled")
+            raise AttributeError
+
         self.Cancelled = True
+        if pool_timeline is not None:
+            OccupancyDelta.record(self.PoolID, self.StartDate, self.EndDate, -self.MachineCount)
+            pool_timeline.add(self.StartDate, self.EndDate, -self.MachineCount)
+        WriteVersion.bump()
         db.session.commit()
 
+        if pool_timeline is not None:
+            timeline_cache.put(self.PoolID, pool_timeline)
+
+    # Cancels all given reservations with a single UPDATE. Returns IDs of reservations that were already
+    # cancelled, raises ValueError if any of them doesn't exist.
+    @staticmethod
+    @retry_on_lock
+    def cancel_reservations(reservation_ids):
+        # pools are locked first, so reservations read below can't be cancelled by another worker meanwhile
+        pool_timelines = Pool.lock_timelines(pool_id for pool_id, in db.session.query(Reservation.PoolID).filter(
+            Reservation.ID.in_(reservation_ids),
+            Reservation.Cancelled != True
+        ).distinct())
+
+        reservations_array = Reservation.query.filter(
+            Reservation.ID.in_(reservation_ids)
+        ).with_entities(
+            Reservation.ID, Reservation.PoolID, Reservation.Cancelled, Reservation.StartDate, Reservation.EndDate,
+            Reservation.MachineCount
+        ).all()
+
+        found_ids = {reservation_id for reservation_id, _, _, _, _, _ in reservations_array}
+        for reservation_id in reservation_ids:
+            if reservation_id not in found_ids:
+                db.session.rollback()
+                raise ValueError('Reservation of ID "{}" does not exist'.format(str(reservation_id)))
+
+        cancelled_ids = [reservation_id for reservation_id, _, cancelled, _, _, _ in reservations_array
+                         if cancelled]
+        for _, pool_id, cancelled, start_date, end_date, machine_count in reservations_array:
+            if pool_id in pool_timelines and not cancelled:
+                pool_timelines[pool_id].add(start_date, end_date, -machine_count)
+
+        # deltas are written before the UPDATE, so they describe exactly the reservations it cancels
+        OccupancyDelta.record_query(
+            Reservation.query.filter(
+                Reservation.ID.in_(reservation_ids),
+                Reservation.Cancelled != True,
+                Reservation.PoolID.in_(db.session.query(Pool.ID))
+            ), sign=-1
+        )
+        Reservation.query.filter(
+            Reservation.ID.in_(reservation_ids),
+            Reservation.Cancelled != True
+        ).update({Reservation.Cancelled: True}, synchronize_session=False)
+        WriteVersion.bump()
+        db.session.commit()
+
+        for pool_id, pool_timeline in pool_timelines.items():
+            timeline_cache.put(pool_id, pool_timeline)
+
+        return cancelled_ids
+
+    # returns [(PoolID, UserID, StartDate, EndDate, MachineCount)] of all active reservations overlapping
+    # given time frame
+    @staticmethod
+    def get_active(start_date, end_date):
+        return Reservation.query.filter(
+            Reservation.StartDate < end_date,
+            Reservation.EndDate > start_date,
+            Reservation.Cancelled != True
+        ).with_entities(
+            Reservation.PoolID, Reservation.UserID, Reservation.StartDate, Reservation.EndDate,
+            Reservation.MachineCount
+        ).all()
+
+    # SQL expression of machine seconds of reservation clipped to [start_date, end_date), rounded to whole
+    # seconds to get rid of julianday's precision. SQLite's min and max of two arguments are scalar functions.
+    @staticmethod
+    def clipped_machine_seconds(start_date, end_date):
+        return func.round((
+            func.julianday(func.min(Reservation.EndDate, end_date)) -
+            func.julianday(func.max(Reservation.StartDate, start_date))
+        ) * 86400) * Reservation.MachineCount
+
+    # SQLite keeps DateTime as 'YYYY-MM-DD HH:MM:SS.ffffff', result can be compared with '%w %H:%M:%S.%f'
+    @staticmethod
+    def weekday_and_time(column):
+        return func.strftime("%w", column) + " " + func.substr(column, 12)
+
     def get_series(self, start_date=date.now(), end_date=date(2099, 12, 31), series_type='series'):
         # series is defined by the same pool, same user and same weekday
-        reservation_list = []
-
         if User and Pool and series_type == 'series':
-            query_list = Reservation.query.filter(
+            reservation_list = Reservation.query.filter(
                 Reservation.StartDate > start_date,
                 Reservation.EndDate < end_date,
                 Reservation.PoolID == self.PoolID,
                 Reservation.UserID == self.UserID,
-                Reservation.Cancelled != True
+                Reservation.Cancelled != True,
+                Reservation.weekday_and_time(Reservation.StartDate) == self.StartDate.strftime("%w %H:%M:%S.%f"),
+                Reservation.weekday_and_time(Reservation.EndDate) == self.EndDate.strftime("%w %H:%M:%S.%f")
             ).all()
-
-            for reservation in query_list:
-                if reservation.StartDate.weekday() == self.StartDate.weekday() \
-                        and reservation.StartDate.time() == self.StartDate.time() \
-                        and reservation.EndDate.weekday() == self.EndDate.weekday() \
-                        and reservation.EndDate.time() == self.EndDate.time():
-                    reservation_list.append(reservation)
         elif User and Pool and series_type == 'all':
             reservation_list = Reservation.query.filter(
                 Reservation.StartDate > start_date,
@@ -588,6 +1277,7 @@ class Reservation(db.Model):
         if end_date < start_date:
             raise ValueError("StartDate must be before EndDate")
 
+    @retry_on_lock
     def edit(self, start_date=None, end_date=None, machine_count=None):
         start_date = start_date if start_date else self.StartDate
         end_date = end_date if end_date else self.EndDate
@@ -600,21 +1290,32 @@ class Reservation(db.Model):
         if start_date < date.now():
             raise ValueError('Reservation must take place in future')
 
-        available_machines = self.Pool.available_machines(start_date, end_date)
+        if self.Pool.Enabled is False:
+            raise AttributeError("Disabled Pool has no available machines")
 
-        if (start_date <= self.StartDate <= end_date) or (start_date <= self.EndDate <= end_date):
-            machines_to_reserve = machine_count - self.MachineCount
-        else:
-            machines_to_reserve = machine_count
+        pool_timeline = self.Pool.lock_timeline()
+        # reservation could be changed by another worker before the pool was locked
+        db.session.refresh(self)
+        if not self.Cancelled:
+            pool_timeline.add(self.StartDate, self.EndDate, -self.MachineCount)
 
-        if machines_to_reserve > available_machines:
+        if machine_count > self.Pool.MaximumCount - pool_timeline.maximum_taken(start_date, end_date):
+            db.session.rollback()
             raise ValueError("There are not enough available machines in given time frame")
 
+        if not self.Cancelled:
+            OccupancyDelta.record(self.PoolID, self.StartDate, self.EndDate, -self.MachineCount)
+            OccupancyDelta.record(self.PoolID, start_date, end_date, machine_count)
+            pool_timeline.add(start_date, end_date, machine_count)
+
         self.StartDate = start_date
         self.EndDate = end_date
         self.MachineCount = machine_count
+        WriteVersion.bump()
         db.session.commit()
 
+        timeline_cache.put(self.PoolID, pool_timeline)
+
     def json(self):
         conversion_format = "%Y-%m-%dT%H:%M:%S.%f"
         return {
@@ -644,11 +1345,168 @@ class Reservation(db.Model):
         return json.dumps(reservation_object)
 
 
+# Ledger of changes of pools' occupancy: reservation of pool adds MachineCount at StartDate and -MachineCount
+# at EndDate, its cancellation adds the opposite pair. It is written in the same transaction as reservations,
+# so occupancy at any moment is a sum of deltas up to it. Rows are appended, use rebuild() to compact them.
+class OccupancyDelta(db.Model):
+    __tablename__ = "OccupancyDelta"
+    __table_args__ = (
+        db.Index("ix_OccupancyDelta_PoolID_Date", "PoolID", "Date", "Delta"),
+    )
+
+    ID = db.Column(db.Integer, primary_key=True)
+    PoolID = db.Column(db.String(80), db.ForeignKey("Pool.ID"), nullable=False)
+    Date = db.Column(db.DateTime, nullable=False)
+    Delta = db.Column(db.Integer, nullable=False)
+
+    @staticmethod
+    def record(pool_id, start_date, end_date, machine_count):
+        db.session.add(OccupancyDelta(PoolID=pool_id, Date=start_date, Delta=machine_count))
+        db.session.add(OccupancyDelta(PoolID=pool_id, Date=end_date, Delta=-machine_count))
+
+    # records [(pool_id, start_date, end_date, machine_count)] with one executemany
+    @staticmethod
+    def record_many(reservations):
+        rows = []
+        for pool_id, start_date, end_date, machine_count in reservations:
+            rows.append({"PoolID": pool_id, "Date": start_date, "Delta": machine_count})
+            rows.append({"PoolID": pool_id, "Date": end_date, "Delta": -machine_count})
+
+        if rows:
+            db.session.execute(OccupancyDelta.__table__.insert(), rows)
+
+    # records reservations matching query with INSERT ... SELECT, sign=-1 records their cancellation
+    @staticmethod
+    def record_query(query, sign=1):
+        db.session.execute(OccupancyDelta.__table__.insert().from_select(
+            ["PoolID", "Date", "Delta"], OccupancyDelta.deltas_select(query, sign)
+        ))
+
+    @staticmethod
+    def deltas_select(query, sign=1):
+        starts = query.with_entities(
+            Reservation.PoolID.label("PoolID"),
+            Reservation.StartDate.label("Date"),
+            (sign * Reservation.MachineCount).label("Delta")
+        )
+        ends = query.with_entities(
+            Reservation.PoolID.label("PoolID"),
+            Reservation.EndDate.label("Date"),
+            (-sign * Reservation.MachineCount).label("Delta")
+        )
+        return starts.union_all(ends).subquery().select()
+
+    # returns (pool_id, date, delta) of all active reservations of existing pools, summed up by date
+    @staticmethod
+    def expected_deltas():
+        deltas = OccupancyDelta.deltas_select(Reservation.query.filter(
+            Reservation.Cancelled != True,
+            Reservation.PoolID.in_(db.session.query(Pool.ID))
+        )).alias()
+
+        return db.session.query(
+            deltas.c.PoolID, deltas.c.Date, func.sum(deltas.c.Delta)
+        ).group_by(deltas.c.PoolID, deltas.c.Date).having(func.sum(deltas.c.Delta) != 0)
+
+    @staticmethod
+    def recorded_deltas():
+        return db.session.query(
+            OccupancyDelta.PoolID, OccupancyDelta.Date, func.sum(OccupancyDelta.Delta)
+        ).group_by(OccupancyDelta.PoolID, OccupancyDelta.Date).having(func.sum(OccupancyDelta.Delta) != 0)
+
+    # replaces whole ledger with deltas computed from Reservation, with one row per pool and date
+    @staticmethod
+    def rebuild():
+        OccupancyDelta.query.delete()
+        OccupancyCheckpoint.query.delete()
+        db.session.execute(OccupancyDelta.__table__.insert().from_select(
+            ["PoolID", "Date", "Delta"], OccupancyDelta.expected_deltas().subquery().select()
+        ))
+        Pool.query.update({Pool.TimelineVersion: Pool.TimelineVersion + 1}, synchronize_session=False)
+        db.session.commit()
+        timeline_cache.invalidate()
+
+    # returns [(pool_id, date, expected_delta, recorded_delta)] of dates where ledger disagrees with Reservation,
+    # deltas before checkpoint of a pool are compared summed up at its date
+    @staticmethod
+    def find_inconsistencies():
+        checkpoints = {checkpoint.PoolID: checkpoint for checkpoint in OccupancyCheckpoint.query.all()}
+
+        def fold(deltas):
+            folded = {}
+            for pool_id, event_date, delta in deltas:
+                if pool_id in checkpoints:
+                    event_date = max(event_date, checkpoints[pool_id].Date)
+                folded[(pool_id, event_date)] = folded.get((pool_id, event_date), 0) + delta
+            return folded
+
+        expected = fold(OccupancyDelta.expected_deltas())
+        recorded = fold(list(OccupancyDelta.recorded_deltas()) + [
+            (pool_id, checkpoint.Date, checkpoint.Taken) for pool_id, checkpoint in checkpoints.items()
+        ])
+
+        return sorted(
+            (pool_id, date, expected.get((pool_id, date), 0), recorded.get((pool_id, date), 0))
+            for pool_id, date in set(expected) | set(recorded)
+            if expected.get((pool_id, date), 0) != recorded.get((pool_id, date), 0)
+        )
+
+    # Sums up deltas of the pool before given date into its checkpoint and deletes them, has to be called
+    # with the pool locked. Doesn't commit.
+    @staticmethod
+    def fold(pool_id, before):
+        checkpoint = OccupancyCheckpoint.query.get(pool_id)
+        if checkpoint is not None and checkpoint.Date >= before:
+            return
+
+        old_deltas = OccupancyDelta.query.filter(OccupancyDelta.PoolID == pool_id, OccupancyDelta.Date < before)
+        folded = old_deltas.with_entities(func.coalesce(func.sum(OccupancyDelta.Delta), 0)).scalar()
+        old_deltas.delete(synchronize_session=False)
+
+        if checkpoint is None:
+            db.session.add(OccupancyCheckpoint(PoolID=pool_id, Date=before, Taken=folded))
+        else:
+            checkpoint.Date = before
+            checkpoint.Taken += folded
+
+    # builds timeline of the pool with a single ordered scan of its deltas since its checkpoint
+    @staticmethod
+    def get_pool_timeline(pool_id, version):
+        deltas = db.session.query(OccupancyDelta.Date, func.sum(OccupancyDelta.Delta)).filter(
+            OccupancyDelta.PoolID == pool_id
+        )
+
+        checkpoint = OccupancyCheckpoint.query.get(pool_id)
+        if checkpoint is None:
+            deltas = deltas.group_by(OccupancyDelta.Date).order_by(OccupancyDelta.Date).all()
+            return timeline.PoolTimeline.from_deltas(deltas, version)
+
+        # deltas recorded before checkpoint after it was made, e.g. by cancellation of past reservation
+        taken = checkpoint.Taken + db.session.query(func.coalesce(func.sum(OccupancyDelta.Delta), 0)).filter(
+            OccupancyDelta.PoolID == pool_id,
+            OccupancyDelta.Date < checkpoint.Date
+        ).scalar()
+        deltas = deltas.filter(
+            OccupancyDelta.Date >= checkpoint.Date
+        ).group_by(OccupancyDelta.Date).order_by(OccupancyDelta.Date).all()
+
+        return timeline.PoolTimeline.from_deltas(deltas, version, checkpoint.Date, taken)
+
+
+# Ledger of a pool folded up to Date: Taken is the sum of all deltas before Date which were deleted
+class OccupancyCheckpoint(db.Model):
+    __tablename__ = "OccupancyCheckpoint"
+
+    PoolID = db.Column(db.String(80), db.ForeignKey("Pool.ID"), primary_key=True)
+    Date = db.Column(db.DateTime, nullable=False)
+    Taken = db.Column(db.Integer, nullable=False)
+
+
 class Software(db.Model):
     __tablename__ = "Software"
 
     ID = db.Column(db.Integer, primary_key=True)
-    Name = db.Column(db.String)
+    Name = db.Column(db.String, index=True)
 
     @staticmethod
     def get_software(software_id):
@@ -658,6 +1516,11 @@ class Software(db.Model):
     def get_software_by_name(name):
         return Software.query.filter(Software.Name == name).first()
 
+    # returns {name: ID} of given software names, missing ones are added without commit
+    @staticmethod
+    def get_or_add_ids(names):
+        return get_or_add_names(Software, names)
+
     @staticmethod
     def add_software(software_name):
         software = Software.query.filter(Software.Name == software_name).first()
@@ -675,13 +1538,18 @@ class Software(db.Model):
 class OperatingSystem(db.Model):
     __tablename__ = "OperatingSystem"
     ID = db.Column(db.Integer, primary_key=True)
-    Name = db.Column(db.String(80), nullable=False)
+    Name = db.Column(db.String(80), nullable=False, index=True)
     PoolList = db.relationship("Pool", backref="owner")
 
     @staticmethod
     def get_operating_system(os_id):
         return OperatingSystem.query.filter(OperatingSystem.ID == os_id).first()
 
+    # returns {name: ID} of given operating system names, missing ones are added without commit
+    @staticmethod
+    def get_or_add_ids(names):
+        return get_or_add_names(OperatingSystem, names)
+
     @staticmethod
     def add_operating_system(name):
         operating_system = OperatingSystem.query.filter(OperatingSystem.Name == name).first()
@@ -695,11 +1563,28 @@ class OperatingSystem(db.Model):
         return operating_system
 
 
+# returns {name: ID} of rows of model (Software or OperatingSystem) of given names, rows are added for names
+# which don't exist yet with a single insert
+def get_or_add_names(model, names):
+    if not names:
+        return {}
+
+    def select_ids():
+        return {name: row_id for name, row_id in db.session.query(model.Name, model.ID).filter(model.Name.in_(names))}
+
+    ids = select_ids()
+    missing_names = set(names) - set(ids)
+    if missing_names:
+        db.session.execute(model.__table__.insert(), [{"Name": name} for name in missing_names])
+        ids = select_ids()
+    return ids
+
+
 class Issue(db.Model):
     __tablename__ = "Issue"
     ID = db.Column(db.Integer, primary_key=True)
-    PoolID = db.Column(db.Integer, db.ForeignKey("Pool.ID"))
-    UserID = db.Column(db.Integer, db.ForeignKey("User.ID"))
+    PoolID = db.Column(db.String(80), db.ForeignKey("Pool.ID"), index=True)
+    UserID = db.Column(db.Integer, db.ForeignKey("User.ID"), index=True)
     Subject = db.Column(db.String(80))
     Message = db.Column(db.String(500))
     Resolved = db.Column(db.Boolean)
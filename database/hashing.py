@@ -0,0 +1,112 @@
+import multiprocessing
+import threading
+from functools import lru_cache
+
+from passlib.context import CryptContext
+
+# pbkdf2 blocks the process computing it for tens of milliseconds, so passwords are hashed and verified in
+# a bounded pool of processes. Functions run by workers get everything they need as arguments.
+
+
+class HashingBusyError(RuntimeError):
+    pass
+
+
+# hashes of any other number of rounds are outdated and replaced on successful verification
+@lru_cache(maxsize=4)
+def password_context(rounds):
+    return CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__default_rounds=rounds,
+                        pbkdf2_sha256__min_desired_rounds=rounds, pbkdf2_sha256__max_desired_rounds=rounds)
+
+
+def hash_password(password, rounds):
+    return password_context(rounds).hash(password)
+
+
+# returns (match, new_hash), new_hash is None unless pass_hash matched and is outdated
+def verify_password(password, pass_hash, rounds):
+    return password_context(rounds).verify_and_update(password, pass_hash)
+
+
+# Runs hashing in given number of worker processes, 0 hashes in the calling thread. At most queue_limit
+# calls may be hashed or wait for workers at once, more of them raise HashingBusyError at once instead of
+# queueing behind the others.
+class HashingService:
+    def __init__(self, workers, queue_limit, rounds):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.rounds = rounds
+        self.rejected = 0
+        self._pending = 0
+        self._processes = None
+        self._processes_workers = 0
+        self._lock = threading.Lock()
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.rounds)
+
+    def verify(self, password, pass_hash):
+        return self._run(verify_password, password, pass_hash, self.rounds)
+
+    # hashes passwords of bulk operations, spread over all workers, takes a single place in the queue
+    def hash_many(self, passwords):
+        passwords = list(passwords)
+        self._acquire()
+        try:
+            if self.workers < 1:
+                return [hash_password(password, self.rounds) for password in passwords]
+
+            return self._get_processes().starmap(hash_password, [(password, self.rounds) for password in passwords],
+                                                 chunksize=max(len(passwords) // (self.workers * 4), 1))
+        finally:
+            self._release()
+
+    def _run(self, function, *args):
+        self._acquire()
+        try:
+            if self.workers < 1:
+                return function(*args)
+
+            return self._get_processes().apply_async(function, args).get()
+        finally:
+            self._release()
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.queue_limit:
+                self.rejected += 1
+                raise HashingBusyError("Too many passwords are hashed at the moment, try again later")
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _get_processes(self):
+        with self._lock:
+            if self._processes is None or self._processes_workers != self.workers:
+                if self._processes is not None:
+                    # calls already sent to old workers are finished by them
+                    self._processes.close()
+                # spawned workers don't inherit connections and locks of the web server process
+                self._processes = multiprocessing.get_context("spawn").Pool(self.workers)
+                self._processes_workers = self.workers
+            return self._processes
+
+    def shutdown(self):
+        with self._lock:
+            if self._processes is not None:
+                self._processes.close()
+                self._processes.join()
+            self._processes = None
+            self._processes_workers = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self._pending,
+                "queue_limit": self.queue_limit,
+                "rejected": self.rejected,
+                "rounds": self.rounds,
+            }
@@ -4,7 +4,8 @@ import string
 import random
 import datetime
 
-from database.dbmodel import Pool, db, Software, OperatingSystem, User, SoftwareList, Reservation, Issue
+from database.dbmodel import Pool, db, Software, OperatingSystem, User, SoftwareList, Reservation, Issue, \
+    OccupancyDelta
 
 MOCK_DATA_PATH = './database/mock_data'
 
@@ -13,8 +14,8 @@ def gen_mock_users(filename):
     with open(os.path.join(MOCK_DATA_PATH, filename)) as json_file:
         data = json.load(json_file)
         for user_data in data['users']:
-            password = ''.join(random.choice(string.ascii_lowercase + string.digits) for _ in range(8))
-            User.add_user(user_data['Email'], password, user_data['Name'], user_data['Surname'], user_data['IsAdmin'])
+            user_data['Password'] = ''.join(random.choice(string.ascii_lowercase + string.digits) for _ in range(8))
+        User.add_users(data['users'])
 
 
 def gen_mock_pools(filename):
@@ -72,6 +73,9 @@ def gen_mock_reservations(filename):
             )
 
             db.session.add(reservation)
+            if not reservation.Cancelled:
+                OccupancyDelta.record(pool.ID, start_date, end_date, reservation.MachineCount)
+                pool.bump_timeline_version()
             db.session.commit()
 
 
@@ -0,0 +1,359 @@
+import bisect
+import heapq
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+# Occupancy of a pool is a step function: every reservation takes MachineCount machines at StartDate
+# and gives them back at EndDate. Functions below work on plain (start_date, end_date, machine_count)
+# tuples, so they can be fed by a single query instead of a query per split point.
+
+
+def overlapping(reservations, start_date, end_date):
+    return [
+        (_start_date, _end_date, machine_count)
+        for _start_date, _end_date, machine_count in reservations
+        if _start_date < end_date and _end_date > start_date
+    ]
+
+
+# returns list of (date, delta) sorted by date
+def build_events(reservations):
+    events = []
+
+    for start_date, end_date, machine_count in reservations:
+        events.append((start_date, machine_count))
+        events.append((end_date, -machine_count))
+
+    events.sort(key=lambda event: event[0])
+    return events
+
+
+# returns the highest number of machines taken at once in [start_date, end_date)
+def maximum_taken(reservations, start_date, end_date):
+    reservations = overlapping(reservations, start_date, end_date)
+
+    if end_date <= start_date:
+        # there is no room for a split point, so every overlapping reservation counts
+        return sum(machine_count for _, _, machine_count in reservations)
+
+    events = build_events(
+        (max(_start_date, start_date), min(_end_date, end_date), machine_count)
+        for _start_date, _end_date, machine_count in reservations
+    )
+
+    taken_machines = 0
+    max_taken = 0
+    for i, (event_date, delta) in enumerate(events):
+        taken_machines += delta
+
+        # reservation ending at the same moment another one starts doesn't overlap with it
+        if i + 1 < len(events) and events[i + 1][0] == event_date:
+            continue
+
+        if event_date < end_date:
+            max_taken = max(max_taken, taken_machines)
+
+    return max_taken
+
+
+# returns minimum number of free machines in [start_date, end_date)
+def minimum_free(maximum_count, reservations, start_date, end_date):
+    return maximum_count - maximum_taken(reservations, start_date, end_date)
+
+
+# Occupancy of a single pool prepared for repeated queries: dates of all events sorted, and number of
+# machines taken right after every one of them
+class PoolTimeline:
+    def __init__(self, reservations, version):
+        self.version = version
+        # events before start are unknown, None if timeline covers whole history of the pool
+        self.start = None
+        self.dates = []
+        self.taken = []
+
+        taken_machines = 0
+        for event_date, delta in build_events(reservations):
+            taken_machines += delta
+            if self.dates and self.dates[-1] == event_date:
+                self.taken[-1] = taken_machines
+            else:
+                self.dates.append(event_date)
+                self.taken.append(taken_machines)
+
+    # builds timeline from [(date, delta)] sorted by date, with at most one element per date, timeline with
+    # start begins with taken_at_start machines taken and all deltas at or after start
+    @staticmethod
+    def from_deltas(deltas, version, start=None, taken_at_start=0):
+        pool_timeline = PoolTimeline([], version)
+        pool_timeline.start = start
+        if start is not None:
+            pool_timeline.dates.append(start)
+            pool_timeline.taken.append(taken_at_start)
+
+        taken_machines = taken_at_start
+        for event_date, delta in deltas:
+            taken_machines += delta
+            if pool_timeline.dates and pool_timeline.dates[-1] == event_date:
+                pool_timeline.taken[-1] = taken_machines
+            else:
+                pool_timeline.dates.append(event_date)
+                pool_timeline.taken.append(taken_machines)
+
+        return pool_timeline
+
+    def __len__(self):
+        return len(self.dates)
+
+    def covers(self, start_date):
+        return self.start is None or start_date >= self.start
+
+    def count_before(self, event_date):
+        return bisect.bisect_left(self.dates, event_date)
+
+    # forgets events before start_date, like OccupancyDelta.fold does with the ledger
+    def truncate(self, start_date):
+        first = bisect.bisect_right(self.dates, start_date)
+        taken_at_start = self.taken[first - 1] if first > 0 else 0
+
+        self.dates = [start_date] + self.dates[first:]
+        self.taken = [taken_at_start] + self.taken[first:]
+        self.start = start_date
+
+    def maximum_taken(self, start_date, end_date):
+        first = bisect.bisect_right(self.dates, start_date)
+        last = bisect.bisect_left(self.dates, end_date)
+
+        taken_at_start = self.taken[first - 1] if first > 0 else 0
+        return max([taken_at_start] + self.taken[first:last])
+
+    # returns sum of machines taken multiplied by seconds they were taken for in [start_date, end_date)
+    def machine_seconds(self, start_date, end_date):
+        first = bisect.bisect_right(self.dates, start_date)
+        last = bisect.bisect_left(self.dates, end_date)
+
+        taken_machines = self.taken[first - 1] if first > 0 else 0
+        moment = start_date
+        seconds = 0
+        for i in range(first, last):
+            seconds += taken_machines * (self.dates[i] - moment).total_seconds()
+            taken_machines = self.taken[i]
+            moment = self.dates[i]
+
+        return seconds + taken_machines * max((end_date - moment).total_seconds(), 0)
+
+    def copy(self):
+        pool_timeline = PoolTimeline([], self.version)
+        pool_timeline.start = self.start
+        pool_timeline.dates = list(self.dates)
+        pool_timeline.taken = list(self.taken)
+        return pool_timeline
+
+    def add(self, start_date, end_date, machine_count):
+        if self.start is not None:
+            start_date = max(start_date, self.start)
+            if end_date <= start_date:
+                return
+
+        first = self._insert_date(start_date)
+        last = self._insert_date(end_date)
+
+        for i in range(first, last):
+            self.taken[i] += machine_count
+
+    def _insert_date(self, event_date):
+        i = bisect.bisect_left(self.dates, event_date)
+        if i == len(self.dates) or self.dates[i] != event_date:
+            self.dates.insert(i, event_date)
+            self.taken.insert(i, self.taken[i - 1] if i > 0 else 0)
+        return i
+
+
+# Process-local LRU cache of PoolTimeline objects. Every pool carries version number that is bumped
+# together with every change of its reservations, so timeline is never used when database moved on,
+# even if change was done by another worker.
+class TimelineCache:
+    def __init__(self, max_events):
+        self.max_events = max_events
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._events = 0
+        self._timelines = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pool_id, version):
+        with self._lock:
+            pool_timeline = self._timelines.get(pool_id)
+
+            if pool_timeline is None or pool_timeline.version != version:
+                self.misses += 1
+                return None
+
+            self._timelines.move_to_end(pool_id)
+            self.hits += 1
+            return pool_timeline
+
+    def put(self, pool_id, pool_timeline):
+        with self._lock:
+            self._remove(pool_id)
+            if len(pool_timeline) > self.max_events:
+                return
+
+            self._timelines[pool_id] = pool_timeline
+            self._events += len(pool_timeline)
+
+            while self._events > self.max_events:
+                self._remove(next(iter(self._timelines)))
+                self.evictions += 1
+
+    def invalidate(self, pool_id=None):
+        with self._lock:
+            if pool_id is None:
+                self._timelines.clear()
+                self._events = 0
+            else:
+                self._remove(pool_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "pools": len(self._timelines),
+                "events": self._events,
+                "max_events": self.max_events,
+            }
+
+    def _remove(self, pool_id):
+        pool_timeline = self._timelines.pop(pool_id, None)
+        if pool_timeline is not None:
+            self._events -= len(pool_timeline)
+
+
+# returns [(date, free_machines)] - number of free machines from given date until the next one,
+# first element describes start_date, consecutive elements always differ in number of free machines
+def free_machines_steps(maximum_count, reservations, start_date, end_date):
+    events = build_events(
+        (max(_start_date, start_date), min(_end_date, end_date), machine_count)
+        for _start_date, _end_date, machine_count in overlapping(reservations, start_date, end_date)
+    )
+
+    steps = [(start_date, maximum_count)]
+    taken_machines = 0
+    for i, (event_date, delta) in enumerate(events):
+        taken_machines += delta
+
+        if event_date >= end_date or (i + 1 < len(events) and events[i + 1][0] == event_date):
+            continue
+
+        free_machines = maximum_count - taken_machines
+        if event_date == start_date:
+            steps[0] = (start_date, free_machines)
+        elif steps[-1][1] != free_machines:
+            steps.append((event_date, free_machines))
+
+    return steps
+
+
+GRANULARITIES = ("hour", "day", "week", "month")
+
+
+# returns start of the calendar hour, day, week (starting on Monday) or month containing date
+def calendar_floor(date, granularity):
+    if granularity not in GRANULARITIES:
+        raise ValueError('Granularity must be one of: ' + ", ".join(GRANULARITIES))
+
+    if granularity == "hour":
+        return date.replace(minute=0, second=0, microsecond=0)
+
+    day = date.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def calendar_next(bucket_start, granularity):
+    if granularity == "hour":
+        return bucket_start + timedelta(hours=1)
+    if granularity == "day":
+        return bucket_start + timedelta(days=1)
+    if granularity == "week":
+        return bucket_start + timedelta(weeks=1)
+    if bucket_start.month == 12:
+        return bucket_start.replace(year=bucket_start.year + 1, month=1)
+    return bucket_start.replace(month=bucket_start.month + 1)
+
+
+# yields (date, delta) with deltas of the same moment summed up, reservations have to be sorted by start date,
+# only reservations in progress are kept in memory
+def sweep_events(reservations):
+    ends = []
+    event_date, event_delta = None, 0
+
+    def events():
+        for start_date, end_date, machine_count in reservations:
+            while ends and ends[0][0] <= start_date:
+                _end_date, _machine_count = heapq.heappop(ends)
+                yield _end_date, -_machine_count
+            yield start_date, machine_count
+            heapq.heappush(ends, (end_date, machine_count))
+
+        while ends:
+            _end_date, _machine_count = heapq.heappop(ends)
+            yield _end_date, -_machine_count
+
+    for _event_date, delta in events():
+        if _event_date != event_date and event_date is not None:
+            yield event_date, event_delta
+            event_delta = 0
+        event_date = _event_date
+        event_delta += delta
+
+    if event_date is not None:
+        yield event_date, event_delta
+
+
+# Yields (bucket_start, machine_seconds, maximum_taken) of every calendar bucket overlapping
+# [start_date, end_date) in a single pass over reservations sorted by start date
+def utilisation_series(reservations, start_date, end_date, granularity):
+    bucket_start = calendar_floor(start_date, granularity)
+    bucket_end = calendar_next(bucket_start, granularity)
+    moment = start_date
+    taken_machines = 0
+    peak = 0
+    seconds = 0
+
+    clipped = (
+        (max(_start_date, start_date), min(_end_date, end_date), machine_count)
+        for _start_date, _end_date, machine_count in reservations
+        if _start_date < end_date and _end_date > start_date
+    )
+    for event_date, delta in sweep_events(clipped):
+        while event_date >= bucket_end:
+            seconds += taken_machines * (bucket_end - moment).total_seconds()
+            yield bucket_start, seconds, peak
+            bucket_start, bucket_end = bucket_end, calendar_next(bucket_end, granularity)
+            moment = bucket_start
+            seconds = 0
+            peak = taken_machines
+
+        seconds += taken_machines * (event_date - moment).total_seconds()
+        moment = event_date
+        taken_machines += delta
+        if event_date == bucket_start:
+            # machines given back at the very start of the bucket were taken only in the previous one
+            peak = taken_machines
+        else:
+            peak = max(peak, taken_machines)
+
+    while bucket_start < end_date:
+        seconds += taken_machines * (min(bucket_end, end_date) - moment).total_seconds()
+        yield bucket_start, seconds, peak
+        bucket_start, bucket_end = bucket_end, calendar_next(bucket_end, granularity)
+        moment = bucket_start
+        seconds = 0
+        peak = taken_machines
@@ -0,0 +1,26 @@
+"""add pool timeline version
+
+Revision ID: 5c9a1e3b7f42
+Revises: 3f1c2a7d9b10
+Create Date: 2026-10-18 10:43:57.412093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c9a1e3b7f42'
+down_revision = '3f1c2a7d9b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Pool') as batch_op:
+        batch_op.add_column(sa.Column('TimelineVersion', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('Pool') as batch_op:
+        batch_op.drop_column('TimelineVersion')
@@ -0,0 +1,47 @@
+"""add reservation indexes
+
+Revision ID: 8b4e0f6c2d31
+Revises: 5c9a1e3b7f42
+Create Date: 2026-10-18 10:44:03.176674
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e0f6c2d31'
+down_revision = '5c9a1e3b7f42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Pool.ID is a string, integer PoolID columns kept SQLite from using its primary key in joins
+    for table_name in ('Issue', 'Reservation', 'SoftwareList'):
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.alter_column('PoolID', existing_type=sa.Integer(), type_=sa.String(length=80))
+
+    op.create_index(op.f('ix_Issue_PoolID'), 'Issue', ['PoolID'], unique=False)
+    op.create_index(op.f('ix_Issue_UserID'), 'Issue', ['UserID'], unique=False)
+    op.create_index(op.f('ix_OperatingSystem_Name'), 'OperatingSystem', ['Name'], unique=False)
+    op.create_index('ix_Reservation_PoolID_StartDate', 'Reservation', ['PoolID', 'StartDate', 'EndDate', 'Cancelled'], unique=False)
+    op.create_index('ix_Reservation_StartDate', 'Reservation', ['StartDate'], unique=False)
+    op.create_index('ix_Reservation_UserID_StartDate', 'Reservation', ['UserID', 'StartDate', 'EndDate', 'Cancelled'], unique=False)
+    op.create_index(op.f('ix_Software_Name'), 'Software', ['Name'], unique=False)
+    op.create_index(op.f('ix_SoftwareList_SoftwareID'), 'SoftwareList', ['SoftwareID'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_SoftwareList_SoftwareID'), table_name='SoftwareList')
+    op.drop_index(op.f('ix_Software_Name'), table_name='Software')
+    op.drop_index('ix_Reservation_UserID_StartDate', table_name='Reservation')
+    op.drop_index('ix_Reservation_StartDate', table_name='Reservation')
+    op.drop_index('ix_Reservation_PoolID_StartDate', table_name='Reservation')
+    op.drop_index(op.f('ix_OperatingSystem_Name'), table_name='OperatingSystem')
+    op.drop_index(op.f('ix_Issue_UserID'), table_name='Issue')
+    op.drop_index(op.f('ix_Issue_PoolID'), table_name='Issue')
+
+    for table_name in ('Issue', 'Reservation', 'SoftwareList'):
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.alter_column('PoolID', existing_type=sa.String(length=80), type_=sa.Integer())
@@ -0,0 +1,46 @@
+"""add occupancy delta ledger
+
+Revision ID: a2d7c4e91f05
+Revises: 8b4e0f6c2d31
+Create Date: 2026-10-18 14:02:31.560214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2d7c4e91f05'
+down_revision = '8b4e0f6c2d31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('OccupancyDelta',
+    sa.Column('ID', sa.Integer(), nullable=False),
+    sa.Column('PoolID', sa.String(length=80), nullable=False),
+    sa.Column('Date', sa.DateTime(), nullable=False),
+    sa.Column('Delta', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['PoolID'], ['Pool.ID'], ),
+    sa.PrimaryKeyConstraint('ID')
+    )
+    op.create_index('ix_OccupancyDelta_PoolID_Date', 'OccupancyDelta', ['PoolID', 'Date', 'Delta'], unique=False)
+
+    # ledger starts with one row per pool and date of active reservations
+    op.execute(
+        'INSERT INTO "OccupancyDelta" ("PoolID", "Date", "Delta") '
+        'SELECT "PoolID", "Date", SUM("Delta") FROM ('
+        'SELECT "PoolID", "StartDate" AS "Date", "MachineCount" AS "Delta" FROM "Reservation" '
+        'WHERE "Cancelled" != 1 AND "PoolID" IN (SELECT "ID" FROM "Pool") '
+        'UNION ALL '
+        'SELECT "PoolID", "EndDate" AS "Date", -"MachineCount" AS "Delta" FROM "Reservation" '
+        'WHERE "Cancelled" != 1 AND "PoolID" IN (SELECT "ID" FROM "Pool")'
+        ') GROUP BY "PoolID", "Date" HAVING SUM("Delta") != 0'
+    )
+    op.execute('UPDATE "Pool" SET "TimelineVersion" = "TimelineVersion" + 1')
+
+
+def downgrade():
+    op.drop_index('ix_OccupancyDelta_PoolID_Date', table_name='OccupancyDelta')
+    op.drop_table('OccupancyDelta')
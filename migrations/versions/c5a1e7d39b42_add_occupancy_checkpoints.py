@@ -0,0 +1,31 @@
+"""add occupancy checkpoints
+
+Revision ID: c5a1e7d39b42
+Revises: e6b2d9a4c175
+Create Date: 2026-10-18 19:41:12.306958
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a1e7d39b42'
+down_revision = 'e6b2d9a4c175'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('OccupancyCheckpoint',
+    sa.Column('PoolID', sa.String(length=80), nullable=False),
+    sa.Column('Date', sa.DateTime(), nullable=False),
+    sa.Column('Taken', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['PoolID'], ['Pool.ID'], ),
+    sa.PrimaryKeyConstraint('PoolID')
+    )
+
+
+# deltas folded into checkpoints are gone, run 'flask rebuild-ledger' after downgrade
+def downgrade():
+    op.drop_table('OccupancyCheckpoint')
@@ -0,0 +1,29 @@
+"""add write version
+
+Revision ID: e6b2d9a4c175
+Revises: a2d7c4e91f05
+Create Date: 2026-10-18 17:12:44.902651
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b2d9a4c175'
+down_revision = 'a2d7c4e91f05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('WriteVersion',
+    sa.Column('ID', sa.Integer(), nullable=False),
+    sa.Column('Version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('ID')
+    )
+    op.execute('INSERT INTO "WriteVersion" ("ID", "Version") VALUES (1, 0)')
+
+
+def downgrade():
+    op.drop_table('WriteVersion')
@@ -1,13 +1,15 @@
+import codecs
 import csv
+from itertools import islice
 
-from database.dbmodel import Pool, Software, OperatingSystem
+from settings import app
+from database.dbmodel import Pool
 
 
 class Parser:
     def __init__(self, file):
         self.file = file
-
-    error_list = []
+        self.error_list = []
 
     @staticmethod
     def extract_name(line):
@@ -78,112 +80,132 @@ class Parser:
     def add_warning(self, line_number, line, message):
         self.error_list.append(Parser.error_to_json(line_number, line, "warning", message))
 
+    # Checks a single row, returns (pool ID, pool data, [(type, message)]). Pool data is
+    # (ID, Name, MaximumCount, Description, Enabled, "os name" or None, [("software name", version)]),
+    # it is None if the row can't be added.
+    @staticmethod
+    def parse_row(row):
+        messages = []
+        valid = True
+
+        if len(row) < 5:
+            return None, None, [("error", "Row should have 5 columns")]
+
+        # ID
+        try:
+            pool_id = Parser.extract_name(row[0])
+        except (ValueError, NameError) as e:
+            print(str(e))
+            messages.append(("error", "Incorrect 'Pool ID' value!"))
+            pool_id = None
+            valid = False
+
+        # Name
+        try:
+            pool_name = Parser.extract_name(row[1])
+        except (ValueError, NameError):
+            messages.append(("warning", "Incorrect 'Pool Name' value"))
+            valid = False
+
+        # Maximum Count
+        try:
+            pool_maximum_count = int(row[2])
+        except ValueError:
+            messages.append(("warning", "Incorrect 'Maximum Count' value"))
+            pool_maximum_count = 0
+
+        if pool_maximum_count < 0:
+            messages.append(("warning", "Incorrect 'Maximum Count' value"))
+
+        # Enabled
+        if row[3].strip() == "true":
+            enabled = True
+        elif row[3].strip() == "false":
+            enabled = False
+        else:
+            messages.append(("warning", "Incorrect 'Enabled' value'"))
+            enabled = False
+
+        pool_description = ''
+
+        # Operating System
+        try:
+            pool_os = Parser.extract_version(row[1])
+        except (ValueError, NameError):
+            messages.append(("warning", "Incorrect 'Operating System' value"))
+            pool_os = None
+
+        # Software
+        software_list = []
+        for line in (row[4].split(",") if len(row[4]) > 0 else []):
+
+            # Software Name
+            try:
+                software_name = Parser.extract_name(line)
+            except (ValueError, NameError):
+                messages.append(("error", "Incorrect 'Software Name' value"))
+                valid = False
+                continue
+
+            # Software Version
+            try:
+                software_version = Parser.extract_version(line)
+
+                if line.find(')')+1 < len(line):
+                    messages.append(("warning",
+                                     "Unexpected content after software version (split software with ',')"))
+
+            except ValueError:
+                messages.append(("warning", "Incorrect 'Software Version' value"))
+                software_version = ''
+            except NameError:
+                software_version = ''
+
+            software_list.append((software_name, software_version))
+
+        if not valid:
+            return pool_id, None, messages
+        return pool_id, (pool_id, pool_name, pool_maximum_count, pool_description, enabled, pool_os,
+                         software_list), messages
+
+    # Yields lists of pool data of rows that can be added, at most IMPORT_CHUNK_SIZE rows are read at once.
+    # IDs of pools of every chunk are checked with a single query.
+    def parse_chunks(self):
+        csv_reader = csv.reader(codecs.iterdecode(self.file, "utf-8"), delimiter=",")
+        next(csv_reader, None)
+
+        pool_ids = set()
+        rows = ((row_number, row) for row_number, row in enumerate(csv_reader, 1) if len(row) > 0)
+        while True:
+            chunk = [(row_number, row) + Parser.parse_row(row)
+                     for row_number, row in islice(rows, app.config["IMPORT_CHUNK_SIZE"])]
+            if not chunk:
+                return
+
+            existing_ids = Pool.get_existing_ids([pool_id for _, _, pool_id, _, _ in chunk if pool_id])
+            pools_data = []
+            for row_number, row, pool_id, pool_data, messages in chunk:
+                if pool_id in existing_ids:
+                    messages.insert(0, ("error", "Pool with this ID already exists!"))
+                    pool_data = None
+                elif pool_id in pool_ids:
+                    messages.insert(0, ("error", "Pool with this ID is repeated in the file!"))
+                    pool_data = None
+                if pool_id:
+                    pool_ids.add(pool_id)
+
+                for error_type, message in messages:
+                    self.error_list.append(Parser.error_to_json(row_number, row, error_type, message))
+                if pool_data is not None:
+                    pools_data.append(pool_data)
+
+            yield pools_data
+
+    # Reads the file row by row and adds its pools in a single transaction if force is set, rows with
+    # errors are skipped. Without force the file is only checked.
     def parse_file(self, force=False):
-        csv_string = str(self.file.read(), "utf-8")
-        csv_reader = csv.reader(csv_string.split("\n"), delimiter=",")
-
-        next(csv_reader)
-
-        for row_number, row in enumerate(csv_reader, 1):
-            if len(row) > 0:
-
-                # ID
-                try:
-                    pool_id = Parser.extract_name(row[0])
-                    try:
-                        if Pool.get_pool(pool_id):
-                            self.add_error(row_number, row, "Pool with this ID already exists!")
-                            force = False
-                    except ValueError:
-                        pass
-
-                except (ValueError, NameError) as e:
-                    print(str(e))
-                    self.add_error(row_number, row, "Incorrect 'Pool ID' value!")
-                    force = False
-
-                # Name
-                try:
-                    pool_name = Parser.extract_name(row[1])
-                except (ValueError, NameError):
-                    self.add_warning(row_number, row, "Incorrect 'Pool Name' value")
-                    force = False
-
-                # Maximum Count
-                try:
-                    pool_maximum_count = int(row[2])
-                except ValueError:
-                    self.add_warning("Incorrect 'Maximum Count' value")
-                    pool_maximum_count = 0
-
-                if pool_maximum_count < 0:
-                    self.add_warning(row_number, row, "Incorrect 'Maximum Count' value")
-
-                # Enabled
-                if row[3].strip() == "true":
-                    enabled = True
-                elif row[3].strip() == "false":
-                    enabled = False
-                else:
-                    self.add_warning(row_number, row, "Incorrect 'Enabled' value'")
-                    enabled = False
-
-                pool_description = ''
-
-                # adding Pool to database
-                if force:
-                    pool = Pool.add_pool(
-                        pool_id,
-                        pool_name,
-                        pool_maximum_count,
-                        pool_description,
-                        enabled,
-                    )
-                else:
-                    pool = None
-
-                # Operating System
-                try:
-                    pool_os = Parser.extract_version(row[1])
-
-                    # adding Operating System to Pool in database
-                    if force and pool:
-                        operating_system = OperatingSystem.add_operating_system(pool_os)
-                        pool.set_operating_system(operating_system)
-
-                except (ValueError, NameError):
-                    self.add_warning(row_number, row, "Incorrect 'Operating System' value")
-
-                # Software
-                if len(row[4]) < 1:
-                    continue
-
-                software_list = row[4].split(",")
-
-                for line in software_list:
-
-                    # Software Name
-                    try:
-                        software_name = Parser.extract_name(line)
-                    except (ValueError, NameError):
-                        self.add_error(row_number, row, "Incorrect 'Software Name' value")
-                        force = False
-
-                    # Software Version
-                    try:
-                        software_version = Parser.extract_version(line)
-
-                        if line.find(')')+1 < len(line):
-                            self.add_warning(row_number, row,
-                                             "Unexpected content after software version (split software with ',')")
-
-                    except ValueError:
-                        self.add_warning(row_number, row, "Incorrect 'Software Version' value")
-                        software_version = ''
-                    except NameError:
-                        software_version = ''
-
-                    # adding Software to pool and database
-                    if force and pool:
-                        software = Software.add_software(software_name)
-                        pool.add_software(software, software_version)
+        if force:
+            Pool.add_pools(self.parse_chunks())
+        else:
+            for _ in self.parse_chunks():
+                pass
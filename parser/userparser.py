@@ -0,0 +1,11 @@
+import codecs
+import csv
+
+
+# Yields users {"Email", "Password", "Name", "Surname", "IsAdmin"} of uploaded CSV file with these columns in
+# the header, file is read line by line. IsAdmin of "true" or "false" is converted to bool, empty one is False.
+def read_users_csv(file):
+    for row in csv.DictReader(codecs.iterdecode(file, "utf-8")):
+        is_admin = (row.get("IsAdmin") or "").strip()
+        row["IsAdmin"] = {"true": True, "false": False, "": False}.get(is_admin.lower(), is_admin)
+        yield row
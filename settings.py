@@ -9,6 +9,38 @@ cors = CORS(app, resources={r"/*": {"origins": "*"}})
 
 app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///database/database.db"
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# total number of events kept in the in-memory pool timelines
+app.config["TIMELINE_CACHE_MAX_EVENTS"] = int(os.environ.get('TIMELINE_CACHE_MAX_EVENTS', 500000))
+# how many times reservation is retried when the database is locked, and the initial delay in seconds
+app.config["LOCK_RETRY_ATTEMPTS"] = 5
+app.config["LOCK_RETRY_BACKOFF"] = 0.05
+# maximum number of reservations returned in a single page of /reservations
+app.config["RESERVATIONS_PAGE_LIMIT"] = 500
+# number of rows fetched at once by streamed exports
+app.config["EXPORT_CHUNK_SIZE"] = 1000
+# maximum number of reservations cancelled by a single request, their IDs are bound twice in one statement and
+# have to fit into 999 variables of SQLite before 3.32
+app.config["CANCEL_IDS_LIMIT"] = 400
+# number of rows of imported pools file checked and inserted at once
+app.config["IMPORT_CHUNK_SIZE"] = 500
+# deltas of occupancy ledger older than given number of days are folded into a checkpoint of their pool,
+# once the pool has more than LEDGER_CHECKPOINT_EVENTS of them
+app.config["LEDGER_CHECKPOINT_DAYS"] = 30
+app.config["LEDGER_CHECKPOINT_EVENTS"] = 1000
+# statistics results kept per worker, they are dropped after any write or after given number of seconds
+app.config["STATISTICS_CACHE_MAX_ENTRIES"] = 256
+app.config["STATISTICS_CACHE_TTL"] = int(os.environ.get('STATISTICS_CACHE_TTL', 300))
+# number of processes computing statistics grids, 0 or 1 computes them in the worker handling the request
+app.config["STATISTICS_WORKERS"] = int(os.environ.get('STATISTICS_WORKERS', 0))
+# verified tokens kept per worker, changes of users made by other workers are noticed after given seconds
+app.config["AUTH_CACHE_MAX_ENTRIES"] = 1024
+app.config["AUTH_CACHE_TTL"] = int(os.environ.get('AUTH_CACHE_TTL', 30))
+# processes hashing passwords, 0 hashes in the worker handling the request, sign-ins above the queue limit
+# are answered with 503
+app.config["HASHING_WORKERS"] = int(os.environ.get('HASHING_WORKERS', 0))
+app.config["HASHING_QUEUE_LIMIT"] = int(os.environ.get('HASHING_QUEUE_LIMIT', 32))
+# pbkdf2_sha256 rounds of new hashes, hashes of other number of rounds are replaced at sign-in
+app.config["PASSWORD_HASH_ROUNDS"] = int(os.environ.get('PASSWORD_HASH_ROUNDS', 29000))
 SECRET_KEY = os.environ.get('SECRET',os.urandom(32))
 app.config['SECRET_KEY'] = SECRET_KEY
 
@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# Result of a computation other threads are waiting for
+class PendingResult:
+    def __init__(self):
+        self.value = None
+        self.error = None
+        self._done = threading.Event()
+
+    def set(self, value=None, error=None):
+        self.value = value
+        self.error = error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+# Process-local LRU cache of statistics results keyed by (name, parameters). Result is valid only for the
+# write version it was computed at and for at most ttl seconds. Identical requests arriving while result
+# is computed wait for it instead of computing it again.
+class StatisticsCache:
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.outdated = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    # returns cached result of given key and version, calls compute() if there is none
+    def get(self, key, version, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, expires, value = entry
+                if entry_version == version and expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+                if entry_version == version:
+                    self.expired += 1
+                else:
+                    self.outdated += 1
+                del self._entries[key]
+
+            pending = self._pending.get((key, version))
+            if pending is None:
+                pending = self._pending[(key, version)] = PendingResult()
+                self.misses += 1
+                computing = True
+            else:
+                self.coalesced += 1
+                computing = False
+
+        if not computing:
+            return pending.wait()
+
+        try:
+            value = compute()
+        except Exception as e:
+            with self._lock:
+                del self._pending[(key, version)]
+            pending.set(error=e)
+            raise
+
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            del self._pending[(key, version)]
+        pending.set(value)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "expired": self.expired,
+                "outdated": self.outdated,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }
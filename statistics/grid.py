@@ -0,0 +1,82 @@
+import numpy as np
+
+# Occupancy of many pools at once, rasterized into a pools x intervals matrix. Reservations are passed as
+# arrays, so a window of any length costs a sort of its reservations and a few whole-matrix operations.
+
+
+def to_microseconds(dates):
+    return np.array(dates, dtype="datetime64[us]").astype(np.int64)
+
+
+# returns (first, step, cells) of intervals starting at start_date and covering end_date, in microseconds
+def grid_bounds(start_date, end_date, interval):
+    first = int(to_microseconds([start_date])[0])
+    step = max(int(interval.total_seconds() * 10 ** 6), 1)
+    cells = max(-(-int(to_microseconds([end_date])[0] - first) // step), 1)
+    return first, step, cells
+
+
+# returns (pools, times, deltas) of reservations clipped to [first, last), sorted by pool and time
+def grid_events(pool_indices, starts, ends, counts, first, last):
+    pool_indices = np.asarray(pool_indices, dtype=np.int64)
+    starts = np.clip(np.asarray(starts, dtype=np.int64), first, last)
+    ends = np.clip(np.asarray(ends, dtype=np.int64), first, last)
+    counts = np.asarray(counts, dtype=np.int64)
+    inside = starts < ends
+    pool_indices, starts, ends, counts = pool_indices[inside], starts[inside], ends[inside], counts[inside]
+
+    pools = np.concatenate([pool_indices, pool_indices])
+    times = np.concatenate([starts, ends])
+    deltas = np.concatenate([counts, -counts])
+
+    order = np.lexsort((times, pools))
+    return pools[order], times[order], deltas[order]
+
+
+# returns matrix of machines taken at the start of every interval, after all events at that very moment
+def taken_at_start(pool_count, pools, times, deltas, first, step, cells):
+    boundary = -(-(times - first) // step)
+    return np.rint(np.bincount(
+        pools * (cells + 1) + boundary, weights=deltas, minlength=pool_count * (cells + 1)
+    ).reshape(pool_count, cells + 1).cumsum(axis=1)[:, :cells]).astype(np.int64)
+
+
+# Returns matrix of the highest number of machines taken at once in every interval [start, start + interval)
+# following start_date until end_date, row for every pool. Reservations are given as arrays of pool
+# indices, start and end dates in microseconds and machine counts.
+def peak_grid(pool_count, pool_indices, starts, ends, counts, start_date, end_date, interval):
+    first, step, cells = grid_bounds(start_date, end_date, interval)
+    pools, times, deltas = grid_events(pool_indices, starts, ends, counts, first, first + cells * step)
+
+    # every pool gives back all its machines, so running sum over events sorted by pool starts from 0
+    # for every pool
+    taken = np.cumsum(deltas)
+    grid = taken_at_start(pool_count, pools, times, deltas, first, step, cells)
+
+    # machines taken after the last event of every moment inside intervals
+    last_of_moment = np.ones(len(times), dtype=bool)
+    last_of_moment[:-1] = (pools[1:] != pools[:-1]) | (times[1:] != times[:-1])
+    cell = (times - first) // step
+    in_grid = last_of_moment & (cell < cells)
+    np.maximum.at(grid, (pools[in_grid], cell[in_grid]), taken[in_grid])
+
+    return grid
+
+
+# Returns matrix of machine-seconds in every interval, arguments are the same as of peak_grid
+def machine_seconds_grid(pool_count, pool_indices, starts, ends, counts, start_date, end_date, interval):
+    first, step, cells = grid_bounds(start_date, end_date, interval)
+    pools, times, deltas = grid_events(pool_indices, starts, ends, counts, first, first + cells * step)
+
+    grid = taken_at_start(pool_count, pools, times, deltas, first, step, cells) * float(step)
+
+    # event inside an interval changes number of taken machines for the rest of it
+    cell = (times - first) // step
+    inside = (times - first) % step != 0
+    grid += np.bincount(
+        pools[inside] * cells + cell[inside],
+        weights=deltas[inside] * (first + (cell[inside] + 1) * step - times[inside]).astype(float),
+        minlength=pool_count * cells
+    ).reshape(pool_count, cells)
+
+    return grid / 10 ** 6
@@ -0,0 +1,63 @@
+import multiprocessing
+import threading
+
+import numpy as np
+
+# Grids of many pools are independent row by row, so pools can be split into parts computed by separate
+# processes. Workers get plain arrays only, they never touch the database.
+
+_processes = None
+_processes_workers = 0
+_processes_lock = threading.Lock()
+
+
+def get_processes(workers):
+    global _processes, _processes_workers
+
+    with _processes_lock:
+        if _processes is None or _processes_workers != workers:
+            if _processes is not None:
+                _processes.close()
+                _processes.join()
+            # spawned workers don't inherit connections and locks of the web server process
+            _processes = multiprocessing.get_context("spawn").Pool(workers)
+            _processes_workers = workers
+        return _processes
+
+
+def shutdown():
+    global _processes, _processes_workers
+
+    with _processes_lock:
+        if _processes is not None:
+            _processes.close()
+            _processes.join()
+        _processes = None
+        _processes_workers = 0
+
+
+# returns bounds of parts of pools [0, pool_count) with similar number of reservations in each one
+def partition_pools(pool_count, pool_indices, parts):
+    reservations_before = np.concatenate([[0], np.cumsum(np.bincount(pool_indices, minlength=pool_count))])
+    bounds = np.searchsorted(reservations_before, np.linspace(0, reservations_before[-1], parts + 1))
+    bounds[0], bounds[-1] = 0, pool_count
+    return np.unique(bounds)
+
+
+# Computes grid_function (e.g. grid.peak_grid) in given number of worker processes, every one of them
+# gets reservations of its part of pools. Result is the same as of grid_function called directly.
+def partitioned_grid(grid_function, workers, pool_count, pool_indices, starts, ends, counts, *window):
+    pool_indices = np.asarray(pool_indices, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+
+    processes = get_processes(workers)
+    bounds = partition_pools(pool_count, pool_indices, min(workers, pool_count))
+    results = []
+    for low, high in zip(bounds, bounds[1:]):
+        part = (pool_indices >= low) & (pool_indices < high)
+        results.append(processes.apply_async(grid_function, (int(high - low), pool_indices[part] - low,
+                                                             starts[part], ends[part], counts[part]) + window))
+
+    return np.vstack([result.get() for result in results])
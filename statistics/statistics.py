@@ -1,61 +1,114 @@
-from database.dbmodel import Pool, User
+import numpy as np
+from itertools import groupby
+
+from settings import app
+from database.dbmodel import Pool, User, Reservation, WriteVersion
+from database import timeline
+from statistics import grid, parallel
+from statistics.cache import StatisticsCache
 
 from datetime import timedelta, datetime as dt
 
+statistics_cache = StatisticsCache(app.config["STATISTICS_CACHE_MAX_ENTRIES"], app.config["STATISTICS_CACHE_TTL"])
 
-# return list of most reserved pools with machine hours per pool: [("pool id", machine_hours)]
-def get_most_reserved_pools(start_date=dt(2019, 1, 1), end_date=dt(2099, 12, 31)):
-    pool_list = Pool.get_all_pools()
-    stat_list = []
 
-    for pool in pool_list:
-        machine_hours = pool.get_machines_hours(start_date, end_date)
-        stat_list.append((pool.ID, machine_hours))
+# returns result of compute() for given key, computed again only after reservations or pools change
+def cached(key, compute):
+    return statistics_cache.get(key, WriteVersion.get(), compute)
+
 
-    return stat_list
+# return list of most reserved pools with machine hours per pool: [("pool id", machine_hours, "pool name")]
+def get_most_reserved_pools(start_date=dt(2019, 1, 1), end_date=dt(2099, 12, 31)):
+    return [(pool_id, int(machine_hours), name)
+            for pool_id, name, machine_hours in Pool.get_all_machines_hours(start_date, end_date)]
 
 
+# return list of users with machine hours per user: [("email", machine_hours, "name", "surname")]
 def get_users_reservation_time(start_date=dt(2019, 1, 1), end_date=dt(2099, 12, 31)):
-    user_list = User.get_all_users()
-    stat_list = []
+    return [(email, int(machine_hours), name, surname)
+            for email, name, surname, machine_hours in User.get_all_machines_hours(start_date, end_date)]
 
-    for user in user_list:
-        machine_hours = user.get_machines_hours(start_date, end_date)
-        stat_list.append((user.Email, machine_hours))
 
-    return stat_list
+# intervals start at start_date, so the last one may reach past end_date
+def intervals_end(start_date, end_date, interval):
+    return start_date + max(-(-(end_date - start_date) // interval), 1) * interval
 
 
-# return amount of hours, when amount of available machines was below 10% of maximum count [("pool id", hours)]
-def get_pools_bottleneck(start_date=dt.now(), end_date=(dt.now()+timedelta(days=7)), interval=1800, bottleneck=0.9):
-    # interval in seconds
-    # bottleneck is percentage
+# returns matrix of the highest number of machines taken in every interval, row for every pool of pool_list,
+# reservations are [(PoolID, StartDate, EndDate, MachineCount)], these of other pools are skipped
+def get_peak_grid(pool_list, reservations, start_date, end_date, interval):
+    pool_indices = {pool.ID: i for i, pool in enumerate(pool_list)}
+    reservations = [reservation for reservation in reservations if reservation[0] in pool_indices]
 
-    if (end_date - start_date).days > 400:  # server would choke on this operation
-        raise ValueError("Too huge delta time. Maximum is 400 days.")
+    return compute_grid(
+        grid.peak_grid,
+        len(pool_list),
+        [pool_indices[pool_id] for pool_id, _, _, _ in reservations],
+        grid.to_microseconds([_start_date for _, _start_date, _, _ in reservations]),
+        grid.to_microseconds([_end_date for _, _, _end_date, _ in reservations]),
+        [machine_count for _, _, _, machine_count in reservations],
+        start_date, end_date, interval
+    )
 
-    pool_list = Pool.get_all_pools(only_enabled=True)
-    stat_list = []
 
-    for pool in pool_list:
-        date = start_date
-        bottleneck_time = 0
+# calls grid_function(pool_count, ...) directly or, with STATISTICS_WORKERS above 1, in worker processes
+# computing separate parts of pools
+def compute_grid(grid_function, pool_count, *arrays):
+    workers = app.config["STATISTICS_WORKERS"]
+    if workers > 1 and pool_count > 1:
+        return parallel.partitioned_grid(grid_function, workers, pool_count, *arrays)
+    return grid_function(pool_count, *arrays)
+
+
+# returns [("pool id", hours, "pool name")] of time in which more than bottleneck of machines were taken
+def bottleneck_hours(pool_list, reservations, start_date, end_date, interval, bottleneck):
+    peaks = get_peak_grid(pool_list, reservations, start_date, end_date, timedelta(seconds=interval))
+    maximum_counts = np.array([pool.MaximumCount for pool in pool_list], dtype=float).reshape(-1, 1)
+
+    machine_usage = 1 - (maximum_counts - peaks) / maximum_counts
+    bottleneck_time = (machine_usage > bottleneck).sum(axis=1) * interval / 3600
+
+    return [(pool.ID, int(hours), pool.Name) for pool, hours in zip(pool_list, bottleneck_time)]
+
 
-        while (end_date - date).total_seconds() > 0:
-            machine_usage = 1 - pool.available_machines(date, date+timedelta(seconds=(interval-1))) / pool.MaximumCount
-            if machine_usage > bottleneck:
-                bottleneck_time = bottleneck_time + interval/3600
+# returns [("pool id", maximum usage, "pool name")], the whole window is a single interval
+def usage_ratios(pool_list, reservations, start_date, end_date):
+    peaks = get_peak_grid(pool_list, reservations, start_date, end_date,
+                          max(end_date - start_date, timedelta(microseconds=1)))
 
-            date = date + timedelta(seconds=interval)
+    return [(pool.ID, int(peak) / pool.MaximumCount, pool.Name) for pool, peak in zip(pool_list, peaks.max(axis=1))]
 
-        stat_list.append((pool.ID, int(bottleneck_time)))
 
-    return stat_list
+# returns {key: machine_hours} of reservations [(key, StartDate, EndDate, MachineCount)] clipped to the window
+def machine_hours(keys, reservations, start_date, end_date):
+    machine_seconds = dict.fromkeys(keys, 0)
+
+    for key, _start_date, _end_date, machine_count in reservations:
+        if key in machine_seconds and _start_date < end_date and _end_date > start_date:
+            machine_seconds[key] += (min(_end_date, end_date) - max(_start_date, start_date)).total_seconds() * \
+                machine_count
+
+    return {key: int(seconds / 3600) for key, seconds in machine_seconds.items()}
+
+
+# return amount of hours, when amount of available machines was below 10% of maximum count
+# [("pool id", hours, "pool name")]
+def get_pools_bottleneck(start_date=dt.now(), end_date=(dt.now()+timedelta(days=7)), interval=1800, bottleneck=0.9):
+    # interval in seconds
+    # bottleneck is percentage
+
+    pool_list = Pool.get_all_pools(only_enabled=True)
+    reservations = Pool.get_timelines(Pool.ids_query(only_enabled=True), start_date,
+                                      intervals_end(start_date, end_date, timedelta(seconds=interval)))
+
+    return bottleneck_hours(pool_list, reservations, start_date, end_date, interval, bottleneck)
 
 
 def top_bottlenecked_pools(start_date=dt.now(), end_date=(dt.now()+timedelta(days=7)), bottleneck=0.9):
-    stat_list = get_pools_bottleneck(start_date, end_date, bottleneck=bottleneck)
+    return take_top_bottlenecked(get_pools_bottleneck(start_date, end_date, bottleneck=bottleneck))
+
 
+def take_top_bottlenecked(stat_list):
     i = 0
     while i < stat_list.__len__():
         if stat_list[i][1] == 0:
@@ -71,13 +124,131 @@ def take_second_element(elem):
     return elem[1]
 
 
-# returns maximum machine usage for pools in given time
+# returns maximum machine usage for pools in given time [("pool id", maximum usage, "pool name")]
 def maximum_usage(start_date=dt.now(), end_date=(dt.now()+timedelta(days=7))):
     pool_list = Pool.get_all_pools(only_enabled=True)
-    stat_list = []
+    reservations = Pool.get_timelines(Pool.ids_query(only_enabled=True), start_date, end_date)
 
-    for pool in pool_list:
-        max_usage = int(pool.MaximumCount - pool.available_machines(start_date, end_date)) / pool.MaximumCount
-        stat_list.append((pool.ID, max_usage))
+    return usage_ratios(pool_list, reservations, start_date, end_date)
 
-    return stat_list
+
+# Results of popular_pools, popular_users, bottlenecked_pools and unused_pools computed from a single read
+# of the window's reservations, lists are already sorted and cut to requested length
+def get_dashboard(start_date, end_date, pools_to_view, users_to_view, bottleneck=0.9, interval=1800):
+    pool_list = Pool.get_all_pools()
+    enabled_pools = [pool for pool in pool_list if pool.Enabled]
+    user_list = User.get_all_users()
+    reservations = Reservation.get_active(start_date, intervals_end(start_date, end_date,
+                                                                    timedelta(seconds=interval)))
+
+    pool_reservations = [(pool_id, _start_date, _end_date, machine_count)
+                         for pool_id, _, _start_date, _end_date, machine_count in reservations]
+    pool_hours = machine_hours([pool.ID for pool in pool_list], pool_reservations, start_date, end_date)
+    user_hours = machine_hours([user.ID for user in user_list], [
+        (user_id, _start_date, _end_date, machine_count)
+        for _, user_id, _start_date, _end_date, machine_count in reservations
+    ], start_date, end_date)
+
+    return {
+        "popular_pools": sorted([(pool.ID, pool_hours[pool.ID], pool.Name) for pool in pool_list],
+                                key=take_second_element, reverse=True)[:pools_to_view],
+        "popular_users": sorted([(user.Email, user_hours[user.ID], user.Name, user.Surname) for user in user_list],
+                                key=take_second_element, reverse=True)[:users_to_view],
+        "bottlenecked_pools": take_top_bottlenecked(bottleneck_hours(
+            enabled_pools, pool_reservations, start_date, end_date, interval, bottleneck
+        ))[:pools_to_view],
+        "unused_pools": sorted(usage_ratios(enabled_pools, pool_reservations, start_date, end_date),
+                               key=take_second_element)[:pools_to_view],
+    }
+
+
+# Yields {"PoolID", "BucketStart", "MachineHours", "PeakTaken"} for every given pool (every one if pool_ids is
+# None) and every hour, day, week or month of the window. Reservations are streamed once, ordered by pool and
+# start date.
+def utilisation_series(pool_ids, start_date, end_date, granularity, chunk_size=1000):
+    conversion_format = "%Y-%m-%dT%H:%M:%S.%f"
+
+    if pool_ids is None:
+        timelines = Pool.iter_timelines(Pool.ids_query(), start_date, end_date, chunk_size)
+        pool_ids = sorted(pool_id for pool_id, in Pool.ids_query())
+    else:
+        timelines = Pool.iter_timelines(pool_ids, start_date, end_date, chunk_size)
+        pool_ids = sorted(pool_ids)
+    groups = groupby(timelines, key=lambda row: row[0])
+    group = next(groups, None)
+
+    for pool_id in pool_ids:
+        reservations = []
+        if group is not None and group[0] == pool_id:
+            reservations = group[1]
+            group = None
+
+        for bucket_start, seconds, peak in timeline.utilisation_series(
+                ((_start_date, _end_date, machine_count) for _, _start_date, _end_date, machine_count in reservations),
+                start_date, end_date, granularity):
+            yield {
+                "PoolID": pool_id,
+                "BucketStart": (bucket_start.strftime(conversion_format))[0:23] + 'Z',
+                "MachineHours": seconds / 3600,
+                "PeakTaken": peak,
+            }
+
+        if group is None:
+            group = next(groups, None)
+
+
+# Returns [{"PoolID", "Name", "Average", "Peak"}] with 7 x 24 matrices of average and the highest number of
+# machines taken in every hour of every weekday (Monday first) of the window. Reservations are binned into
+# hours of the whole window at once and hours are folded into weeks. pool_ids may be a query of IDs of
+# pool_list, e.g. Pool.ids_query() when it holds every pool.
+def weekly_heatmap(pool_list, start_date, end_date, pool_ids=None):
+    week_hours = 7 * 24
+    hour = timedelta(hours=1)
+    first_hour = start_date.replace(minute=0, second=0, microsecond=0)
+    first_slot = first_hour.weekday() * 24 + first_hour.hour
+
+    pool_indices = {pool.ID: i for i, pool in enumerate(pool_list)}
+    reservations = [
+        reservation for reservation in
+        Pool.get_timelines(list(pool_indices) if pool_ids is None else pool_ids, start_date, end_date)
+        # pools added after pool_list was read are skipped
+        if reservation[0] in pool_indices
+    ]
+    arrays = (
+        len(pool_list),
+        [pool_indices[pool_id] for pool_id, _, _, _ in reservations],
+        np.maximum(grid.to_microseconds([_start_date for _, _start_date, _, _ in reservations]),
+                   grid.to_microseconds([start_date])),
+        np.minimum(grid.to_microseconds([_end_date for _, _, _end_date, _ in reservations]),
+                   grid.to_microseconds([end_date])),
+        [machine_count for _, _, _, machine_count in reservations],
+        first_hour, end_date, hour
+    )
+    peaks = compute_grid(grid.peak_grid, *arrays)
+    machine_seconds = compute_grid(grid.machine_seconds_grid, *arrays)
+
+    # seconds of every hour inside the window, only the first and the last one may be shorter
+    hour_starts = grid.to_microseconds([first_hour]) + np.arange(peaks.shape[1]) * 3600 * 10 ** 6
+    covered = np.clip(
+        np.minimum(hour_starts + 3600 * 10 ** 6, grid.to_microseconds([end_date])) -
+        np.maximum(hour_starts, grid.to_microseconds([start_date])), 0, None
+    ) / 10 ** 6
+
+    # hours are padded to whole weeks starting on Monday 0:00
+    padding = (first_slot, -(first_slot + peaks.shape[1]) % week_hours)
+
+    def fold(matrix):
+        padded = np.pad(matrix, ((0, 0), padding), mode="constant")
+        return padded.reshape(matrix.shape[0], -1, week_hours)
+
+    peak = fold(peaks).max(axis=1)
+    covered_seconds = fold(covered.reshape(1, -1)).sum(axis=1)
+    average = np.divide(fold(machine_seconds).sum(axis=1), covered_seconds,
+                        out=np.zeros((len(pool_list), week_hours)), where=covered_seconds > 0)
+
+    return [{
+        "PoolID": pool.ID,
+        "Name": pool.Name,
+        "Average": average[i].reshape(7, 24).round(3).tolist(),
+        "Peak": peak[i].reshape(7, 24).tolist(),
+    } for i, pool in enumerate(pool_list)]
@@ -0,0 +1,97 @@
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from settings import app
+
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+app.config["TESTING"] = True
+
+from database.dbmodel import db, User, timeline_cache, auth_cache, hashing_service  # noqa: E402
+import database.mock_db as mock_db  # noqa: E402
+from statistics.statistics import statistics_cache  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def application():
+    import app as application
+
+    # first request resets the database, it mustn't happen after test data is created
+    application.app.test_client().get("/")
+    db.session.remove()
+    db.drop_all()
+    return application
+
+
+@pytest.fixture
+def database():
+    db.create_all()
+    yield db
+    db.session.remove()
+    db.drop_all()
+    timeline_cache.invalidate()
+    statistics_cache.invalidate()
+    auth_cache.invalidate()
+
+
+@pytest.fixture
+def mock_database(database):
+    # same content as /init_db run in mock mode
+    User.add_user("admin@admin.example", "ala123456", "Admin", "Admin", True)
+    mock_db.gen_mock_data()
+    return database
+
+
+@pytest.fixture
+def client(application, mock_database):
+    return application.app.test_client()
+
+
+@pytest.fixture
+def admin_token(client):
+    response = client.post("/users/signin", json={"email": "admin@admin.example", "password": "ala123456"})
+    return response.get_json()["Token"]
+
+
+# returns context manager collecting statements executed inside it:
+#     with count_queries() as statements:
+@pytest.fixture
+def count_queries():
+    @contextmanager
+    def collect_statements():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    return collect_statements
+
+
+# cheap hashes for tests creating many users
+@pytest.fixture
+def hashing_rounds():
+    rounds = hashing_service.rounds
+    hashing_service.rounds = 1000
+    yield hashing_service
+    hashing_service.rounds = rounds
+
+
+@pytest.fixture
+def sqlite_variable_limit(database):
+    # limit of bound variables of SQLite before 3.32, Python before 3.11 can't lower it and keeps the default
+    connection = db.session.connection().connection.connection
+    if not hasattr(connection, "setlimit"):
+        yield None
+        return
+
+    limit = connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    yield 999
+    connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit)
@@ -0,0 +1,58 @@
+import multiprocessing
+import sqlite3
+from datetime import timedelta, datetime as dt
+
+import pytest
+
+from settings import app
+from database.dbmodel import Pool, User, db
+from benchmarks.bench_admission import book_every_window
+
+WORKERS = 4
+WINDOWS = 10
+MAXIMUM_COUNT = 3
+
+
+@pytest.fixture
+def file_database(tmp_path):
+    database_uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + str(tmp_path / "admission.db")
+    db.create_all()
+    yield tmp_path / "admission.db"
+    db.session.remove()
+    db.get_engine(app).dispose()
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_uri
+
+
+def test_concurrent_bookings_never_overbook(file_database):
+    pool = Pool.add_pool("stress", "Stress", MAXIMUM_COUNT, "", True)
+    user = User.add_user("stress@example.ex", "stress", "Stress", "Test")
+    start_date = dt.now().replace(microsecond=0) + timedelta(days=1)
+    windows = [(start_date + timedelta(hours=2 * i), start_date + timedelta(hours=2 * i + 1)) for i in range(WINDOWS)]
+    pool_id, user_id = pool.ID, user.ID
+    db.session.remove()
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    # workers start booking at the same moment, after all of them are up
+    start = context.Barrier(WORKERS + 1)
+    workers = [context.Process(target=book_every_window,
+                               args=(app.config["SQLALCHEMY_DATABASE_URI"], pool_id, user_id, windows, start, results))
+               for _ in range(WORKERS)]
+
+    for worker in workers:
+        worker.start()
+    start.wait()
+    added = sum(results.get(timeout=120) for _ in workers)
+    for worker in workers:
+        worker.join()
+
+    connection = sqlite3.connect(str(file_database))
+    counts = connection.execute(
+        'SELECT StartDate, SUM(MachineCount) FROM Reservation WHERE PoolID = ? GROUP BY StartDate', (pool_id,)
+    ).fetchall()
+    connection.close()
+
+    assert added == WINDOWS * MAXIMUM_COUNT
+    assert len(counts) == WINDOWS
+    assert all(count == MAXIMUM_COUNT for _, count in counts)
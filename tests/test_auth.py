@@ -0,0 +1,76 @@
+import datetime
+import time
+
+import jwt
+
+from settings import app
+from database import auth
+from database.dbmodel import User
+
+
+def sign_in(client, email, password):
+    return client.post("/users/signin", json={"email": email, "password": password}).get_json()["Token"]
+
+
+def user_queries(statements):
+    return [statement for statement in statements if 'FROM "User"' in statement]
+
+
+def test_token_is_verified_once(client, admin_token, count_queries):
+    headers = {"Auth-Token": admin_token}
+
+    with count_queries() as statements:
+        assert client.get("/export/pools", headers=headers).status_code == 200
+    assert len(user_queries(statements)) == 1
+
+    with count_queries() as statements:
+        assert client.get("/export/pools", headers=headers).status_code == 200
+    assert user_queries(statements) == []
+
+
+def test_user_changes_invalidate_cached_tokens(client):
+    User.add_user("student@student.example", "student123", "Student", "Student")
+    token = sign_in(client, "student@student.example", "student123")
+    headers = {"Auth-Token": token}
+    assert client.get("/export/pools", headers=headers).status_code == 403
+
+    User.get_user_by_email("student@student.example").set_admin_permissions(True)
+    assert client.get("/export/pools", headers=headers).status_code == 200
+
+    User.get_user_by_email("student@student.example").set_admin_permissions(False)
+    assert client.get("/export/pools", headers=headers).status_code == 403
+
+    User.get_user_by_email("student@student.example").set_email("graduate@student.example")
+    assert client.get("/export/pools", headers=headers).status_code == 401
+
+    token = sign_in(client, "graduate@student.example", "student123")
+    assert client.get("/pools", headers={"Auth-Token": token}).status_code == 200
+    User.get_user_by_email("graduate@student.example").remove()
+    assert client.get("/pools", headers={"Auth-Token": token}).status_code == 401
+
+
+def test_invalid_tokens_are_rejected(client):
+    expired_token = jwt.encode({"exp": datetime.datetime.utcnow() - datetime.timedelta(minutes=1),
+                                "email": "admin@admin.example"}, app.config["SECRET_KEY"], algorithm="HS256")
+
+    assert client.get("/pools", headers={"Auth-Token": expired_token.decode("utf-8")}).get_data(as_text=True) == \
+        "Token expired"
+    assert client.get("/pools", headers={"Auth-Token": "not a token"}).status_code == 401
+
+
+def test_token_cache_expires_and_evicts():
+    user = auth.AuthenticatedUser(1, "admin@admin.example", True)
+    token_expires = time.time() + 3600
+
+    cache = auth.TokenCache(2, 0)
+    cache.put("token", user, token_expires)
+    assert cache.get("token") is None
+
+    cache = auth.TokenCache(2, 60)
+    cache.put("expired", user, 0)
+    assert cache.get("expired") is None
+    for token in ("first", "second", "third"):
+        cache.put(token, user, token_expires)
+    assert cache.get("first") is None
+    assert cache.get("third") == user
+    assert cache.stats()["evictions"] == 1
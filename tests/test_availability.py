@@ -0,0 +1,76 @@
+import random
+from datetime import timedelta, datetime as dt
+
+from database.dbmodel import Pool, Reservation
+
+
+# previous, recursive implementation of Pool.available_machines used as a reference
+def recursive_available_machines(pool, start_date, end_date):
+    reservations_array = Reservation.query.filter(
+        Reservation.PoolID == pool.ID,
+        Reservation.StartDate < end_date,
+        Reservation.EndDate > start_date,
+        Reservation.Cancelled != True
+    ).all()
+
+    divide_date = None
+    taken_machines = 0
+    for reservation in reservations_array:
+        taken_machines += reservation.MachineCount
+        if start_date < reservation.StartDate < end_date:
+            divide_date = reservation.StartDate
+            break
+        elif start_date < reservation.EndDate < end_date:
+            divide_date = reservation.EndDate
+            break
+
+    if divide_date:
+        return min(recursive_available_machines(pool, start_date, divide_date),
+                   recursive_available_machines(pool, divide_date, end_date))
+    return pool.MaximumCount - taken_machines
+
+
+def test_available_machines_matches_recursive_version(mock_database):
+    rng = random.Random(2019)
+
+    for pool in Pool.get_all_pools(only_enabled=True):
+        points = sorted({date for reservation in pool.get_timeline() for date in reservation[:2]})
+        if not points:
+            continue
+
+        windows = [(start, end) for i, start in enumerate(points) for end in points[i:i + 10]]
+        for _ in range(100):
+            start = points[0] + timedelta(minutes=rng.randint(-120, 60 * 24 * 7))
+            windows.append((start, start + timedelta(minutes=rng.randint(0, 60 * 24))))
+
+        for start_date, end_date in windows:
+            assert pool.available_machines(start_date, end_date) == \
+                recursive_available_machines(pool, start_date, end_date), (pool.ID, start_date, end_date)
+
+
+def test_edit_does_not_count_reservation_twice(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    reservation = Reservation.query.filter(Reservation.PoolID == pool.ID).first()
+    start_date = max([dt.now()] + [r[1] for r in pool.get_timeline()]) + timedelta(days=1)
+    end_date = start_date + timedelta(hours=2)
+
+    reservation.edit(start_date, end_date, pool.MaximumCount)
+    reservation.edit(start_date + timedelta(hours=1), end_date + timedelta(hours=1), pool.MaximumCount)
+
+    assert pool.available_machines(start_date + timedelta(hours=1), end_date + timedelta(hours=1)) == 0
+
+
+def test_availability_steps_describe_every_segment(mock_database):
+    pools = Pool.get_all_pools(only_enabled=True)
+    start_date = dt.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=7)
+    end_date = start_date + timedelta(days=14)
+
+    steps = Pool.get_availability_steps([pool.ID for pool in pools], start_date, end_date)
+
+    for pool in pools:
+        pool_steps = steps[pool.ID]
+        assert pool_steps[0][0] == start_date
+        for (step_start, free_machines), (step_end, next_free_machines) in zip(pool_steps, pool_steps[1:]):
+            assert free_machines != next_free_machines
+            assert pool.available_machines(step_start, step_end) == free_machines
+        assert pool.available_machines(pool_steps[-1][0], end_date) == pool_steps[-1][1]
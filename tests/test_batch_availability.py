@@ -0,0 +1,34 @@
+from datetime import timedelta, datetime as dt
+
+from database.dbmodel import Pool
+
+date_conversion_format = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def test_batch_availability_matches_single_pool_queries(client, admin_token):
+    pools = Pool.get_all_pools()
+    start_date = dt.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=7)
+    windows = [(start_date + timedelta(hours=h), start_date + timedelta(hours=h + 2)) for h in range(0, 24 * 14, 2)]
+
+    response = client.post("/pool_availability/batch", headers={"Auth-Token": admin_token}, json={
+        "PoolIDs": [pool.ID for pool in pools],
+        "Windows": [{"StartDate": s.strftime(date_conversion_format), "EndDate": e.strftime(date_conversion_format)}
+                    for s, e in windows],
+    })
+    assert response.status_code == 200
+    matrix = response.get_json()["availability"]
+
+    for pool, row in zip(pools, matrix):
+        for (start, end), free_machines in zip(windows, row):
+            expected = pool.available_machines(start, end) if pool.Enabled else 0
+            assert free_machines == expected
+
+
+def test_batch_availability_rejects_unknown_pool(client, admin_token):
+    start_date = dt.now()
+    response = client.post("/pool_availability/batch", headers={"Auth-Token": admin_token}, json={
+        "PoolIDs": ["no-such-pool"],
+        "Windows": [{"StartDate": start_date.strftime(date_conversion_format),
+                     "EndDate": (start_date + timedelta(hours=1)).strftime(date_conversion_format)}],
+    })
+    assert response.status_code == 404
@@ -0,0 +1,35 @@
+import csv
+import io
+import json
+
+from database.dbmodel import Pool, Reservation
+
+
+def test_reservations_ndjson_export(client, admin_token):
+    response = client.get("/export/reservations", headers={"Auth-Token": admin_token}, query_string={
+        "startDate": "2019-01-01T00:00:00.000Z", "endDate": "2099-12-31T00:00:00.000Z", "showCancelled": "true"
+    })
+
+    assert response.status_code == 200
+    exported = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    expected = Reservation.get_reservations_json(show_cancelled=True)
+    assert sorted(exported, key=lambda r: r["ReservationID"]) == sorted(expected, key=lambda r: r["ReservationID"])
+
+
+def test_pools_export(client, admin_token):
+    response = client.get("/export/pools", headers={"Auth-Token": admin_token})
+    exported = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    expected = json.loads(json.dumps(Pool.get_table()))
+    for pool in exported + expected:
+        pool["InstalledSoftware"].sort()
+    assert sorted(exported, key=lambda p: p["ID"]) == sorted(expected, key=lambda p: p["ID"])
+
+    response = client.get("/export/pools", headers={"Auth-Token": admin_token}, query_string={"format": "csv"})
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row["ID"] for row in rows] == sorted(pool["ID"] for pool in expected)
+
+
+def test_chunks_do_not_lose_rows(mock_database):
+    assert [pool["ID"] for pool in Pool.iter_json(chunk_size=2)] == sorted(pool.ID for pool in Pool.get_all_pools())
+    assert len(list(Reservation.iter_json(show_cancelled=True, chunk_size=3))) == Reservation.query.count()
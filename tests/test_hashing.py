@@ -0,0 +1,61 @@
+import pytest
+
+from database import hashing
+from database.dbmodel import User, hashing_service
+
+
+def test_outdated_hash_is_replaced_at_sign_in(client, hashing_rounds):
+    User.add_user("student@student.example", "student123", "Student", "Student")
+    assert User.get_user_by_email("student@student.example").Password.startswith("$pbkdf2-sha256$1000$")
+
+    hashing_rounds.rounds = 2000
+    response = client.post("/users/signin", json={"email": "student@student.example", "password": "student123"})
+    assert response.status_code == 200
+
+    user = User.get_user_by_email("student@student.example")
+    assert user.Password.startswith("$pbkdf2-sha256$2000$")
+    assert user.check_password("student123")
+    assert not user.check_password("student124")
+
+
+def test_hashing_in_worker_processes():
+    service = hashing.HashingService(1, 4, 1000)
+    try:
+        pass_hash = service.hash("ala123456")
+        assert service.verify("ala123456", pass_hash) == (True, None)
+        assert service.verify("ala12345", pass_hash) == (False, None)
+        pass_hashes = service.hash_many(["first", "second", "third"])
+        assert [hashing.verify_password(password, pass_hash, 1000)[0]
+                for password, pass_hash in zip(["first", "second", "third"], pass_hashes)] == [True] * 3
+    finally:
+        service.shutdown()
+
+
+def test_queue_limit_applies_to_inline_hashing():
+    service = hashing.HashingService(0, 0, 1000)
+
+    with pytest.raises(hashing.HashingBusyError):
+        service.hash("ala123456")
+    with pytest.raises(hashing.HashingBusyError):
+        service.hash_many(["first", "second"])
+    assert service.stats()["rejected"] == 2
+
+    service.queue_limit = 1
+    assert service.verify("ala123456", service.hash("ala123456")) == (True, None)
+    assert service.stats()["pending"] == 0
+
+
+def test_saturated_hashing_answers_503(client, hashing_rounds):
+    workers, queue_limit = hashing_service.workers, hashing_service.queue_limit
+    hashing_service.workers, hashing_service.queue_limit = 1, 0
+    try:
+        response = client.post("/users/signin", json={"email": "admin@admin.example", "password": "ala123456"})
+        assert response.status_code == 503
+        response = client.post("/users/signup", json={"email": "student@student.example", "password": "student123",
+                                                      "firstname": "Student", "lastname": "Student"})
+        assert response.status_code == 503
+        assert hashing_service.stats()["rejected"] == 2
+    finally:
+        hashing_service.workers, hashing_service.queue_limit = workers, queue_limit
+        hashing_service.rejected = 0
+        hashing_service.shutdown()
@@ -0,0 +1,80 @@
+import random
+from datetime import timedelta, datetime as dt
+
+from database import timeline
+from database.dbmodel import Pool, User
+from statistics import grid
+from statistics.statistics import weekly_heatmap
+
+
+def test_machine_seconds_grid_matches_timeline():
+    rng = random.Random(2019)
+    start_date = dt(2020, 1, 1, 0, 10)
+    reservations = []
+    for _ in range(300):
+        _start_date = start_date + timedelta(minutes=rng.randrange(-600, 6000))
+        reservations.append((rng.randrange(3), _start_date, _start_date + timedelta(minutes=rng.randrange(1, 400)),
+                             rng.randrange(1, 4)))
+    end_date = start_date + timedelta(hours=90)
+    interval = timedelta(minutes=45)
+
+    machine_seconds = grid.machine_seconds_grid(
+        3,
+        [pool_index for pool_index, _, _, _ in reservations],
+        grid.to_microseconds([_start_date for _, _start_date, _, _ in reservations]),
+        grid.to_microseconds([_end_date for _, _, _end_date, _ in reservations]),
+        [machine_count for _, _, _, machine_count in reservations],
+        start_date, end_date, interval
+    )
+
+    for pool_index in range(3):
+        pool_timeline = timeline.PoolTimeline([reservation[1:] for reservation in reservations
+                                               if reservation[0] == pool_index], None)
+        for cell in range(120):
+            cell_start = start_date + cell * interval
+            assert round(machine_seconds[pool_index, cell]) == \
+                round(pool_timeline.machine_seconds(cell_start, cell_start + interval))
+
+
+def test_heatmap_matches_probing_of_every_hour(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    user = User.get_all_users()[0]
+    monday = dt.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=30)
+    monday -= timedelta(days=monday.weekday())
+    pool.add_reservations(user, 2, [(monday + timedelta(weeks=week, hours=9, minutes=30),
+                                     monday + timedelta(weeks=week, hours=11)) for week in range(4)])
+    pool.add_reservation(user, 1, monday + timedelta(weeks=1, hours=10), monday + timedelta(weeks=1, hours=10,
+                                                                                           minutes=30))
+    start_date = monday + timedelta(minutes=20)
+    end_date = monday + timedelta(weeks=4)
+
+    heatmap = {row["PoolID"]: row for row in weekly_heatmap(Pool.get_all_pools(), start_date, end_date)}
+
+    assert heatmap[pool.ID]["Peak"][0][9:12] == [2, 3, 0]
+    assert heatmap[pool.ID]["Average"][0][9:12] == [1.0, round((4 * 2 + 0.5) / 4, 3), 0]
+    for weekday in range(7):
+        for hour in range(24):
+            hours = []
+            for week in range(4):
+                hour_start = max(monday + timedelta(weeks=week, days=weekday, hours=hour), start_date)
+                hour_end = monday + timedelta(weeks=week, days=weekday, hours=hour + 1)
+                if hour_start < hour_end:
+                    hours.append(pool.get_cached_timeline().maximum_taken(hour_start, hour_end))
+            assert heatmap[pool.ID]["Peak"][weekday][hour] == max(hours)
+
+
+def test_heatmap_endpoint(client, admin_token):
+    date_format = "%Y-%m-%dT%H:%M:%S.%fZ"
+    url = "/statistics/heatmap?startDate={}&endDate={}".format(
+        (dt.now() - timedelta(days=7)).strftime(date_format), (dt.now() + timedelta(days=7)).strftime(date_format))
+    headers = {"Auth-Token": admin_token}
+
+    heatmap = client.get(url, headers=headers).get_json()["heatmap"]
+    assert len(heatmap) == len(Pool.get_all_pools())
+    assert all(len(row["Peak"]) == 7 and len(row["Average"][6]) == 24 for row in heatmap)
+    assert any(max(map(max, row["Peak"])) > 0 for row in heatmap)
+
+    pool = Pool.get_all_pools()[0]
+    assert [row["PoolID"] for row in client.get(url + "&id=" + pool.ID, headers=headers).get_json()["heatmap"]] == \
+        [pool.ID]
+    assert client.get(url + "&id=missing", headers=headers).status_code == 404
@@ -0,0 +1,23 @@
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import upgrade, downgrade
+
+from settings import app
+from database.dbmodel import db
+
+
+def test_migrations_match_models(tmp_path):
+    database_uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + str(tmp_path / "migrations.db")
+    engine = db.get_engine(app)
+
+    try:
+        with app.app_context():
+            upgrade()
+            with engine.connect() as connection:
+                context = MigrationContext.configure(connection, opts={"compare_type": True})
+                assert compare_metadata(context, db.metadata) == []
+            downgrade(revision="base")
+    finally:
+        engine.dispose()
+        app.config["SQLALCHEMY_DATABASE_URI"] = database_uri
@@ -0,0 +1,132 @@
+from datetime import timedelta, datetime as dt
+
+from database import timeline
+from database.dbmodel import Pool, User, Reservation, OccupancyDelta, OccupancyCheckpoint, db, timeline_cache
+from settings import app
+
+
+def future_start():
+    return dt.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=30)
+
+
+def assert_ledger_matches_reservations(pool):
+    assert OccupancyDelta.find_inconsistencies() == []
+
+    pool_timeline = OccupancyDelta.get_pool_timeline(pool.ID, pool.TimelineVersion)
+    reference = timeline.PoolTimeline(pool.get_timeline(), pool.TimelineVersion)
+    # ledger may keep dates with deltas summing up to zero, so step functions are compared at every date
+    for date in set(pool_timeline.dates) | set(reference.dates):
+        if pool_timeline.covers(date):
+            assert pool_timeline.maximum_taken(date, date) == reference.maximum_taken(date, date)
+
+
+def test_mock_data_is_consistent_with_ledger(mock_database):
+    assert OccupancyDelta.query.count() > 0
+    assert OccupancyDelta.find_inconsistencies() == []
+
+
+def test_ledger_follows_reservation_changes(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    user = User.get_all_users()[0]
+    start_date = future_start()
+
+    pool.add_reservation(user, 1, start_date, start_date + timedelta(hours=2))
+    assert_ledger_matches_reservations(pool)
+
+    pool.add_reservations(user, 1, [(start_date + timedelta(weeks=week), start_date + timedelta(weeks=week, hours=1))
+                                    for week in range(1, 5)])
+    assert_ledger_matches_reservations(pool)
+
+    reservation = Reservation.query.filter(Reservation.PoolID == pool.ID, Reservation.StartDate == start_date).first()
+    reservation.edit(start_date + timedelta(hours=1), start_date + timedelta(hours=4), 2)
+    assert_ledger_matches_reservations(pool)
+
+    reservation.cancel()
+    assert_ledger_matches_reservations(pool)
+
+    ids = [reservation.ID for reservation in Reservation.query.filter(
+        Reservation.PoolID == pool.ID, Reservation.StartDate > start_date + timedelta(days=1)
+    ).all()]
+    Reservation.cancel_reservations(ids)
+    assert_ledger_matches_reservations(pool)
+
+
+def test_timeline_is_built_from_ledger(mock_database):
+    for pool in Pool.get_all_pools():
+        timeline_cache.invalidate()
+        pool_timeline = pool.get_cached_timeline()
+        reference = timeline.PoolTimeline(pool.get_timeline(), pool.TimelineVersion)
+
+        for start_date, end_date in zip(reference.dates, reference.dates[1:]):
+            assert pool_timeline.maximum_taken(start_date, end_date) == reference.maximum_taken(start_date, end_date)
+
+
+def test_rebuild_repairs_and_compacts_ledger(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    user = User.get_all_users()[0]
+    start_date = future_start()
+    pool.add_reservation(user, 1, start_date, start_date + timedelta(hours=2))
+    Reservation.query.filter(Reservation.PoolID == pool.ID).first().cancel()
+
+    db.session.add(OccupancyDelta(PoolID=pool.ID, Date=start_date, Delta=5))
+    db.session.commit()
+    assert OccupancyDelta.find_inconsistencies() == [(pool.ID, start_date, 1, 6)]
+
+    OccupancyDelta.rebuild()
+
+    assert OccupancyDelta.find_inconsistencies() == []
+    assert OccupancyDelta.query.count() == OccupancyDelta.expected_deltas().count()
+
+
+def test_check_ledger_command(application, mock_database):
+    runner = application.app.test_cli_runner()
+    assert runner.invoke(args=["check-ledger"]).exit_code == 0
+
+    pool = Pool.get_all_pools()[0]
+    db.session.add(OccupancyDelta(PoolID=pool.ID, Date=future_start(), Delta=1))
+    db.session.commit()
+    assert runner.invoke(args=["check-ledger"]).exit_code == 1
+
+    assert runner.invoke(args=["rebuild-ledger"]).exit_code == 0
+    assert runner.invoke(args=["check-ledger"]).exit_code == 0
+
+
+def test_old_deltas_are_folded_into_checkpoint(mock_database, monkeypatch):
+    monkeypatch.setitem(app.config, "LEDGER_CHECKPOINT_DAYS", 0)
+    monkeypatch.setitem(app.config, "LEDGER_CHECKPOINT_EVENTS", 0)
+    pool = max(Pool.get_all_pools(only_enabled=True), key=lambda pool: len(pool.get_timeline()))
+    user = User.get_all_users()[0]
+    start_date = future_start()
+
+    pool.add_reservation(user, 1, start_date, start_date + timedelta(hours=2))
+    checkpoint = OccupancyCheckpoint.query.get(pool.ID)
+    assert checkpoint is not None
+    assert OccupancyDelta.query.filter(OccupancyDelta.PoolID == pool.ID,
+                                       OccupancyDelta.Date < checkpoint.Date).count() == 0
+    assert_ledger_matches_reservations(pool)
+
+    # timeline kept in cache after the write is the same as the one built from folded ledger
+    cached_timeline = pool.get_cached_timeline()
+    pool_timeline = OccupancyDelta.get_pool_timeline(pool.ID, pool.TimelineVersion)
+    assert (cached_timeline.start, cached_timeline.dates, cached_timeline.taken) == \
+           (pool_timeline.start, pool_timeline.dates, pool_timeline.taken)
+
+    # cancellation of a reservation which started before checkpoint is recorded before it
+    past_reservation = Reservation.query.filter(Reservation.PoolID == pool.ID, Reservation.Cancelled != True,
+                                                Reservation.StartDate < checkpoint.Date).first()
+    past_reservation.cancel()
+    assert_ledger_matches_reservations(pool)
+
+    # time frames before checkpoint are computed from reservations
+    reference = timeline.PoolTimeline(pool.get_timeline(), None)
+    for start_date, end_date in zip(reference.dates, reference.dates[1:]):
+        assert pool.available_machines(start_date, end_date) == \
+               pool.MaximumCount - reference.maximum_taken(start_date, end_date)
+    assert Pool.get_availability_matrix([pool.ID], list(zip(reference.dates, reference.dates[1:]))) == [[
+        pool.MaximumCount - reference.maximum_taken(start_date, end_date)
+        for start_date, end_date in zip(reference.dates, reference.dates[1:])
+    ]]
+
+    OccupancyDelta.rebuild()
+    assert OccupancyCheckpoint.query.count() == 0
+    assert_ledger_matches_reservations(pool)
@@ -0,0 +1,67 @@
+import random
+from datetime import timedelta, datetime as dt
+
+import pytest
+
+from settings import app
+from statistics import grid, parallel
+from statistics.statistics import get_pools_bottleneck, maximum_usage, weekly_heatmap
+from database.dbmodel import Pool
+
+
+@pytest.fixture
+def statistics_workers():
+    app.config["STATISTICS_WORKERS"] = 2
+    yield 2
+    app.config["STATISTICS_WORKERS"] = 0
+    parallel.shutdown()
+
+
+def test_partition_pools_balances_reservations():
+    pool_indices = [0] * 50 + [1] * 10 + [2] * 10 + [3] * 30 + [5] * 100
+
+    bounds = parallel.partition_pools(7, pool_indices, 3)
+
+    assert bounds[0] == 0 and bounds[-1] == 7
+    assert list(bounds) == sorted(set(bounds))
+    assert list(parallel.partition_pools(3, [], 4)) == [0, 3]
+    assert list(parallel.partition_pools(2, [1] * 10, 4)) == [0, 2]
+
+
+def test_partitioned_grid_matches_serial(statistics_workers):
+    rng = random.Random(2020)
+    start_date = dt(2020, 1, 1)
+    reservations = []
+    for _ in range(500):
+        _start_date = start_date + timedelta(minutes=15 * rng.randrange(-20, 400))
+        reservations.append((rng.randrange(5), _start_date,
+                             _start_date + timedelta(minutes=15 * rng.randrange(1, 12)), rng.randrange(1, 4)))
+    arrays = (
+        [pool_index for pool_index, _, _, _ in reservations],
+        grid.to_microseconds([_start_date for _, _start_date, _, _ in reservations]),
+        grid.to_microseconds([_end_date for _, _, _end_date, _ in reservations]),
+        [machine_count for _, _, _, machine_count in reservations],
+        start_date, start_date + timedelta(hours=90), timedelta(minutes=45)
+    )
+
+    for grid_function in (grid.peak_grid, grid.machine_seconds_grid):
+        expected = grid_function(6, *arrays)
+        result = parallel.partitioned_grid(grid_function, statistics_workers, 6, *arrays)
+        assert result.shape == expected.shape
+        assert (result == expected).all()
+
+
+def test_statistics_are_the_same_with_workers(mock_database, statistics_workers):
+    start_date = dt.now() - timedelta(days=7)
+    end_date = dt.now() + timedelta(days=7)
+    pool_list = Pool.get_all_pools()
+
+    def compute():
+        return (get_pools_bottleneck(start_date, end_date, bottleneck=0.2), maximum_usage(start_date, end_date),
+                weekly_heatmap(pool_list, start_date, end_date))
+
+    app.config["STATISTICS_WORKERS"] = 0
+    expected = compute()
+    app.config["STATISTICS_WORKERS"] = statistics_workers
+
+    assert compute() == expected
@@ -0,0 +1,82 @@
+import io
+
+from settings import app
+from database.dbmodel import Pool
+from parser.csvparser import Parser
+
+HEADER = "ID,Name,MaximumCount,Enabled,Software\n"
+
+
+def pools_csv(rows):
+    return io.BytesIO((HEADER + "".join(rows)).encode("utf-8"))
+
+
+def import_pools(client, admin_token, rows, force):
+    return client.post("/import", headers={"Auth-Token": admin_token}, query_string={"force": force},
+                       data={"pools_csv": (pools_csv(rows), "pools.csv")})
+
+
+def test_import_adds_pools_with_software(client, admin_token):
+    rows = ['import-1,First (Ubuntu 18.04),10,true,"Python (3.7),GCC (8.3)"\n',
+            '\n',
+            'import-2,Second (Windows 10),5,false,"Python (3.7),Matlab (2019a)"\n']
+
+    response = import_pools(client, admin_token, rows, "false")
+    assert response.status_code == 200
+    assert Pool.get_existing_ids(["import-1", "import-2"]) == set()
+
+    response = import_pools(client, admin_token, rows, "true")
+    assert response.status_code == 200
+
+    pool = Pool.get_pool("import-2")
+    assert (pool.Name, pool.MaximumCount, pool.Enabled, pool.owner.Name) == ("Second", 5, False, "Windows 10")
+    assert sorted((name, version) for _, name, version in pool.get_software_list()) == \
+        [("Matlab", "2019a"), ("Python", "3.7")]
+    python_ids = {software_id for pool_id in ("import-1", "import-2")
+                  for software_id, name, _ in Pool.get_pool(pool_id).get_software_list() if name == "Python"}
+    assert len(python_ids) == 1
+
+
+def test_import_reports_and_skips_wrong_rows(client, admin_token):
+    existing_id = Pool.get_all_pools()[0].ID
+    rows = ['{},Existing (Ubuntu),10,true,\n'.format(existing_id),
+            'import-1,First (Ubuntu),10,true,\n',
+            'import-1,Repeated (Ubuntu),10,true,\n',
+            '(broken),Broken (Ubuntu),10,true,\n',
+            'import-2,Second,many,yes,\n']
+
+    response = import_pools(client, admin_token, rows, "false")
+
+    assert response.status_code == 422
+    assert [(error["line"], error["info"]) for error in response.get_json()["errors"][0]] == [
+        (1, "Pool with this ID already exists!"),
+        (3, "Pool with this ID is repeated in the file!"),
+        (4, "Incorrect 'Pool ID' value!"),
+        (5, "Incorrect 'Maximum Count' value"),
+        (5, "Incorrect 'Enabled' value'"),
+        (5, "Incorrect 'Operating System' value"),
+    ]
+
+    response = import_pools(client, admin_token, rows, "true")
+    assert response.status_code == 202
+    assert Pool.get_pool("import-1").Name == "First"
+    assert Pool.get_pool("import-2").MaximumCount == 0
+
+
+def test_import_query_count_does_not_depend_on_rows(mock_database, count_queries):
+    def count_import(first, count):
+        rows = ['import-{},Pool (OS {}),10,true,"Python (3.{}),GCC (8.{})"\n'.format(i, i % 3, i % 5, i)
+                for i in range(first, first + count)]
+        with count_queries() as statements:
+            Parser(pools_csv(rows)).parse_file(True)
+        return len(statements)
+
+    chunk_size = app.config["IMPORT_CHUNK_SIZE"]
+    app.config["IMPORT_CHUNK_SIZE"] = 1000
+    try:
+        # operating systems and software are added by the first import
+        count_import(0, 10)
+        assert count_import(10, 10) == count_import(20, 190)
+    finally:
+        app.config["IMPORT_CHUNK_SIZE"] = chunk_size
+    assert len(Pool.get_existing_ids(["import-{}".format(i) for i in range(210)])) == 210
@@ -0,0 +1,76 @@
+import re
+from datetime import timedelta, datetime as dt
+
+from sqlalchemy import event
+
+from database.dbmodel import Pool, User, Reservation, Issue, Software, OperatingSystem, OccupancyDelta, db
+
+INDEXED_TABLES = ("Reservation", "Pool", "User", "SoftwareList", "Software", "OperatingSystem", "Issue",
+                  "OccupancyDelta")
+
+
+# returns plans of all SELECT statements issued by function
+def query_plans(function, *args, **kwargs):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        function(*args, **kwargs)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    connection = db.session.connection()
+    return [(statement, [row[-1] for row in connection.execute("EXPLAIN QUERY PLAN " + statement, parameters)])
+            for statement, parameters in statements]
+
+
+# SQLite before 3.36 prints "SCAN TABLE <name>" instead of "SCAN <name>"
+def is_full_scan(detail):
+    full_scan = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+    return bool(full_scan and full_scan.group(1) in INDEXED_TABLES and "INDEX" not in detail)
+
+
+def assert_no_full_scan(function, *args, **kwargs):
+    plans = query_plans(function, *args, **kwargs)
+    assert plans
+    assert any(plan for _, plan in plans)
+
+    for statement, plan in plans:
+        for detail in plan:
+            assert not is_full_scan(detail), "{}\n{}".format(statement, "\n".join(plan))
+
+
+def test_full_scan_is_detected_in_every_plan_format():
+    assert is_full_scan("SCAN Reservation")
+    assert is_full_scan("SCAN TABLE Reservation")
+    assert not is_full_scan("SCAN TABLE Reservation USING INDEX ix_Reservation_StartDate")
+    assert not is_full_scan("SEARCH TABLE Reservation USING INDEX ix_Reservation_StartDate (StartDate>?)")
+
+
+def test_hot_queries_use_indexes(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    user = User.get_all_users()[1]
+    start_date = dt.now()
+    end_date = start_date + timedelta(days=7)
+
+    assert_no_full_scan(pool.get_timeline, start_date, end_date)
+    assert_no_full_scan(pool.get_timeline, start_date, end_date, excluded_id=1)
+    assert_no_full_scan(pool.get_reservations, start_date, end_date)
+    assert_no_full_scan(pool.get_machines_hours, start_date, end_date)
+    assert_no_full_scan(user.get_reservations, start_date, end_date)
+    assert_no_full_scan(user.get_machines_hours, start_date, end_date)
+    assert_no_full_scan(Pool.get_availability_matrix, [pool.ID], [(start_date, end_date)])
+    assert_no_full_scan(Pool.get_availability_steps, [pool.ID], start_date, end_date)
+    assert_no_full_scan(OccupancyDelta.get_pool_timeline, pool.ID, pool.TimelineVersion)
+    assert_no_full_scan(Pool.get_timelines, [pool.ID], start_date, end_date)
+    assert_no_full_scan(Reservation.get_reservations_json, start_date, end_date)
+    assert_no_full_scan(Reservation.get_reservations_page, 10, (start_date, 1), start_date, end_date)
+    assert_no_full_scan(Reservation.query.first().get_series, start_date, end_date)
+    assert_no_full_scan(user.get_issues)
+    assert_no_full_scan(pool.get_issues)
+    assert_no_full_scan(Software.get_software_by_name, "Chrome")
+    assert_no_full_scan(OperatingSystem.add_operating_system, "Win7")
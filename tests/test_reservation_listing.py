@@ -0,0 +1,97 @@
+from datetime import timedelta, datetime as dt
+
+from database.dbmodel import Pool, User, Reservation, db
+
+
+def test_listing_matches_reservation_json(mock_database):
+    expected = [reservation.json() for reservation in Reservation.get_reservations(show_cancelled=True)]
+
+    assert sorted(Reservation.get_reservations_json(show_cancelled=True), key=lambda r: r["ReservationID"]) == \
+        sorted(expected, key=lambda r: r["ReservationID"])
+
+
+def test_listing_query_count_does_not_depend_on_size(mock_database, count_queries):
+    db.session.expire_all()
+    with count_queries() as statements:
+        Reservation.get_reservations_json()
+    queries_before = len(statements)
+
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    start_date = dt.now() + timedelta(days=1)
+    for user in User.get_all_users():
+        pool.add_reservations(user, 1, [(start_date + timedelta(weeks=week), start_date + timedelta(weeks=week, hours=1))
+                                        for week in range(10)], force=True)
+
+    db.session.expire_all()
+    with count_queries() as statements:
+        reservations = Reservation.get_reservations_json()
+
+    assert len(reservations) > 50
+    assert len(statements) == queries_before == 1
+
+
+def list_reservations(client, token, **params):
+    params.setdefault("startDate", "2019-01-01T00:00:00.000Z")
+    params.setdefault("endDate", "2099-12-31T00:00:00.000Z")
+    params.setdefault("showCancelled", "true")
+    response = client.get("/reservations", headers={"Auth-Token": token}, query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_pages_cover_whole_listing_in_order(client, admin_token):
+    expected = list_reservations(client, admin_token)["reservation"]
+    expected.sort(key=lambda r: (r["StartDate"], r["ReservationID"]))
+
+    pages = []
+    page = list_reservations(client, admin_token, limit=4)
+    while True:
+        assert len(page["reservation"]) <= 4
+        pages.extend(page["reservation"])
+        if page["cursor"] is None:
+            break
+        page = list_reservations(client, admin_token, limit=4, cursor=page["cursor"])
+
+    assert pages == expected
+
+
+def test_listing_filters(client, admin_token):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+
+    reservations = list_reservations(client, admin_token, poolId=pool.ID, minCount=5, cancelled="false",
+                                     limit=100)["reservation"]
+
+    assert reservations
+    assert all(r["PoolID"] == pool.ID and r["Count"] >= 5 and r["Cancelled"] == "false" for r in reservations)
+    assert len(reservations) == len([r for r in list_reservations(client, admin_token)["reservation"]
+                                     if r["PoolID"] == pool.ID and r["Count"] >= 5 and r["Cancelled"] == "false"])
+
+
+# returns number of SQLite virtual machine steps, in hundreds, taken by function
+def count_steps(function, *args, **kwargs):
+    steps = []
+    connection = db.session.connection().connection.connection
+    connection.set_progress_handler(lambda: steps.append(1), 100)
+    try:
+        function(*args, **kwargs)
+    finally:
+        connection.set_progress_handler(None, 100)
+    return len(steps)
+
+
+def test_deep_page_costs_the_same_as_the_first_one(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    user = User.get_all_users()[0]
+    start_date = dt(2030, 1, 1)
+    db.session.execute(Reservation.__table__.insert(), [{
+        "PoolID": pool.ID, "UserID": user.ID, "StartDate": start_date + timedelta(minutes=i),
+        "EndDate": start_date + timedelta(minutes=i, hours=1), "MachineCount": 1, "Cancelled": False
+    } for i in range(5000)])
+    db.session.commit()
+
+    _, first_key = Reservation.get_reservations_page(10, None, start_date)
+    deep_key = (start_date + timedelta(minutes=4900), 0)
+
+    first_page_steps = count_steps(Reservation.get_reservations_page, 10, first_key, start_date)
+    deep_page_steps = count_steps(Reservation.get_reservations_page, 10, deep_key, start_date)
+    assert deep_page_steps <= first_page_steps + 5
@@ -0,0 +1,144 @@
+from datetime import timedelta, datetime as dt
+
+from settings import app
+from database.dbmodel import Pool, User, Reservation
+
+
+def weekly_dates(start_date, weeks, duration=timedelta(hours=2)):
+    return [(start_date + timedelta(weeks=week), start_date + timedelta(weeks=week) + duration)
+            for week in range(weeks)]
+
+
+def future_start():
+    return dt.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=30)
+
+
+def test_series_is_not_added_when_any_occurrence_fails(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    user = User.get_all_users()[0]
+    dates = weekly_dates(future_start(), 10)
+    pool.add_reservation(user, pool.MaximumCount, *dates[4])
+    reservation_count = Reservation.query.count()
+
+    results = pool.add_reservations(user, 1, dates)
+
+    assert [error is not None for _, _, error in results] == [i == 4 for i in range(10)]
+    assert Reservation.query.count() == reservation_count
+
+
+def test_forced_series_adds_every_fitting_occurrence(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    user = User.get_all_users()[0]
+    dates = weekly_dates(future_start(), 10)
+    pool.add_reservation(user, pool.MaximumCount, *dates[4])
+    reservation_count = Reservation.query.count()
+
+    results = pool.add_reservations(user, 1, dates, force=True)
+
+    assert len([error for _, _, error in results if error]) == 1
+    assert Reservation.query.count() == reservation_count + 9
+    for start_date, end_date in dates[:4] + dates[5:]:
+        assert pool.available_machines(start_date, end_date) == pool.MaximumCount - 1
+
+
+def test_series_occurrences_are_checked_against_each_other(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    user = User.get_all_users()[0]
+    machine_count = pool.MaximumCount // 2 + 1
+    # every occurrence lasts 8 days, so it overlaps with the next one
+    dates = weekly_dates(future_start(), 3, duration=timedelta(days=8))
+
+    results = pool.add_reservations(user, machine_count, dates, force=True)
+
+    assert [error is None for _, _, error in results] == [True, False, True]
+
+
+def test_cancel_reservations_reports_already_cancelled(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    user = User.get_all_users()[0]
+    dates = weekly_dates(future_start(), 4)
+    pool.add_reservations(user, 2, dates)
+    reservation_ids = [reservation.ID for reservation in pool.get_reservations(start_date=future_start())]
+    Reservation.get_reservation(reservation_ids[0]).cancel()
+
+    assert Reservation.cancel_reservations(reservation_ids) == reservation_ids[:1]
+    assert Reservation.query.filter(Reservation.ID.in_(reservation_ids), Reservation.Cancelled != True).count() == 0
+    for start_date, end_date in dates:
+        assert pool.available_machines(start_date, end_date) == pool.MaximumCount
+
+
+def test_series_matches_weekday_and_time(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    user = User.get_all_users()[0]
+    start_date = future_start()
+    pool.add_reservations(user, 1, weekly_dates(start_date, 5))
+    pool.add_reservations(user, 1, weekly_dates(start_date + timedelta(days=1), 5))
+    pool.add_reservations(user, 1, weekly_dates(start_date + timedelta(minutes=30), 5))
+    reservation = pool.get_reservations(start_date=start_date)[0]
+
+    series = reservation.get_series(start_date=dt.now())
+
+    assert len(series) == 5
+    assert all(r.StartDate.weekday() == start_date.weekday() and r.StartDate.time() == start_date.time()
+               for r in series)
+
+
+def test_series_endpoint_reports_every_occurrence(client, admin_token):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    start_date = future_start()
+    pool.add_reservation(User.get_all_users()[0], pool.MaximumCount, start_date + timedelta(weeks=1),
+                         start_date + timedelta(weeks=1, hours=2))
+    conversion_format = "%Y-%m-%dT%H:%M:%S.%fZ"
+    series = {
+        "PoolID": pool.ID,
+        "Email": "admin@admin.example",
+        "StartDate": start_date.strftime(conversion_format),
+        "EndDate": (start_date + timedelta(hours=2)).strftime(conversion_format),
+        "Count": 1,
+        "CycleEndDate": (start_date + timedelta(weeks=3)).strftime(conversion_format),
+        "Step": 1,
+        "Force": False,
+    }
+
+    response = client.post("/reservations/create", headers={"Auth-Token": admin_token}, json=series)
+    assert response.status_code == 409
+    occurrences = response.get_json()["Occurrences"]
+    assert [occurrence["Status"] for occurrence in occurrences] == ["NotAdded", "Failed", "NotAdded"]
+    assert occurrences[1]["Error"] == "There are not enough available machines in given time frame"
+    assert occurrences[0]["StartDate"] == start_date.strftime(conversion_format)[0:23] + "Z"
+
+    series["Force"] = True
+    response = client.post("/reservations/create", headers={"Auth-Token": admin_token}, json=series)
+    assert [occurrence["Status"] for occurrence in response.get_json()["Occurrences"]] == \
+        ["Added", "Failed", "Added"]
+
+
+def test_cancel_endpoint_accepts_string_ids(client, admin_token):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    pool.add_reservations(User.get_all_users()[0], 1, weekly_dates(future_start(), 2))
+    reservation_ids = [str(reservation.ID) for reservation in pool.get_reservations(start_date=future_start())]
+
+    response = client.post("/reservations/cancel", headers={"Auth-Token": admin_token},
+                           json={"ReservationID": reservation_ids, "Type": "all"})
+    assert response.status_code == 200
+    assert all(Reservation.get_reservation(int(reservation_id)).Cancelled for reservation_id in reservation_ids)
+
+    response = client.post("/reservations/cancel", headers={"Auth-Token": admin_token},
+                           json={"ReservationID": ["first"], "Type": "all"})
+    assert response.status_code == 400
+
+
+def test_cancel_endpoint_limits_number_of_ids(client, admin_token, sqlite_variable_limit):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    limit = app.config["CANCEL_IDS_LIMIT"]
+    pool.add_reservations(User.get_all_users()[0], 1, weekly_dates(future_start(), limit + 1))
+    reservation_ids = [reservation.ID for reservation in pool.get_reservations(start_date=future_start())]
+
+    response = client.post("/reservations/cancel", headers={"Auth-Token": admin_token},
+                           json={"ReservationID": reservation_ids, "Type": "all"})
+    assert response.status_code == 400
+
+    response = client.post("/reservations/cancel", headers={"Auth-Token": admin_token},
+                           json={"ReservationID": reservation_ids[:limit], "Type": "all"})
+    assert response.status_code == 200
+    assert Reservation.query.filter(Reservation.ID.in_(reservation_ids[:limit]), Reservation.Cancelled).count() == limit
@@ -0,0 +1,97 @@
+from datetime import timedelta, datetime as dt
+
+from database.dbmodel import Pool, User, Reservation, db
+from statistics.statistics import get_most_reserved_pools, get_users_reservation_time, get_dashboard, \
+    get_pools_bottleneck, maximum_usage, utilisation_series, weekly_heatmap
+
+
+def clipped_machine_hours(reservations, start_date, end_date):
+    return sum(
+        (min(reservation.EndDate, end_date) - max(reservation.StartDate, start_date)).total_seconds() / 3600 *
+        reservation.MachineCount
+        for reservation in reservations
+        if not reservation.Cancelled and reservation.StartDate < end_date and reservation.EndDate > start_date
+    )
+
+
+def test_popular_pools_sum_clipped_machine_hours(mock_database):
+    start_date = dt.now() - timedelta(days=7, minutes=7)
+    end_date = dt.now() + timedelta(days=7)
+
+    stat_list = get_most_reserved_pools(start_date, end_date)
+
+    assert len(stat_list) == len(Pool.get_all_pools())
+    for pool_id, hours, name in stat_list:
+        reservations = Reservation.query.filter(Reservation.PoolID == pool_id).all()
+        assert hours == int(clipped_machine_hours(reservations, start_date, end_date))
+        assert name == Pool.get_pool(pool_id).Name
+
+
+def test_popular_users_count_whole_days(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    user = User.get_all_users()[0]
+    start_date = dt.now().replace(microsecond=0) + timedelta(days=60)
+    pool.add_reservation(user, 2, start_date, start_date + timedelta(days=3, hours=1))
+
+    stat_list = {email: (hours, name, surname) for email, hours, name, surname in
+                 get_users_reservation_time(start_date - timedelta(days=1), start_date + timedelta(days=2))}
+
+    assert stat_list[user.Email] == (2 * 48, user.Name, user.Surname)
+    assert len(stat_list) == len(User.get_all_users())
+    assert user.get_machines_hours(start_date, start_date + timedelta(days=5)) == 2 * 73
+
+
+def test_dashboard_matches_separate_endpoints(client, admin_token):
+    date_format = "%Y-%m-%dT%H:%M:%S.%fZ"
+    headers = {"Auth-Token": admin_token}
+    dates = "startDate={}&endDate={}".format((dt.now() - timedelta(days=7)).strftime(date_format),
+                                             (dt.now() + timedelta(days=7)).strftime(date_format))
+
+    dashboard = client.get("/statistics/dashboard?{}&poolsToView=3&usersToView=4&threshold=0.2".format(dates),
+                           headers=headers).get_json()
+
+    for name, arguments in (("popular_pools", "poolsToView=3"), ("popular_users", "usersToView=4"),
+                            ("bottlenecked_pools", "poolsToView=3&threshold=0.2"),
+                            ("unused_pools", "poolsToView=3")):
+        separate = client.get("/statistics/{}?{}&{}".format(name, dates, arguments), headers=headers).get_json()
+        assert dashboard[name]["data"] == separate["data"]
+        if name == "bottlenecked_pools":
+            assert dashboard[name]["labels"] == separate["labels"]
+    assert len(dashboard["popular_users"]["data"]) == 4
+
+
+def test_dashboard_reads_reservations_once(mock_database, count_queries):
+    start_date = dt.now() - timedelta(days=7)
+    end_date = dt.now() + timedelta(days=7)
+
+    with count_queries() as statements:
+        dashboard = get_dashboard(start_date, end_date, 3, 3, 0.2)
+
+    assert len([statement for statement in statements if 'FROM "Reservation"' in statement]) == 1
+    assert len(statements) == 3
+    assert dashboard["bottlenecked_pools"]
+
+
+def test_statistics_of_more_pools_than_sql_variables(client, admin_token, sqlite_variable_limit):
+    start_date = dt.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    end_date = start_date + timedelta(days=1)
+    db.session.execute(Pool.__table__.insert(), [{
+        "ID": "many-{}".format(i), "Name": "Many {}".format(i), "MaximumCount": 2, "Enabled": True,
+        "TimelineVersion": 0
+    } for i in range(1200)])
+    db.session.execute(Reservation.__table__.insert(), [{
+        "PoolID": "many-{}".format(i), "UserID": User.get_all_users()[0].ID, "StartDate": start_date,
+        "EndDate": end_date, "MachineCount": 2, "Cancelled": False
+    } for i in range(0, 1200, 100)])
+    db.session.commit()
+    pool_count = len(Pool.get_all_pools())
+
+    assert ("many-100", 24, "Many 100") in get_pools_bottleneck(start_date, end_date, bottleneck=0.9)
+    assert ("many-100", 1.0, "Many 100") in maximum_usage(start_date, end_date)
+    assert len(list(utilisation_series(None, start_date, end_date, "day"))) == pool_count
+    assert len(weekly_heatmap(Pool.get_all_pools(), start_date, end_date, Pool.ids_query())) == pool_count
+
+    date_format = "%Y-%m-%dT%H:%M:%S.%fZ"
+    query_string = {"startDate": start_date.strftime(date_format), "endDate": end_date.strftime(date_format)}
+    for url in ("/statistics/utilisation", "/statistics/heatmap"):
+        assert client.get(url, headers={"Auth-Token": admin_token}, query_string=query_string).status_code == 200
@@ -0,0 +1,108 @@
+import threading
+import time
+from datetime import timedelta, datetime as dt
+
+import pytest
+
+from database.dbmodel import Pool, User, WriteVersion
+from statistics.cache import StatisticsCache
+from statistics.statistics import statistics_cache
+
+
+def test_identical_requests_are_computed_once():
+    cache = StatisticsCache(10, 60)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return [1, 2, 3]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("key", 1, compute))) for _ in range(8)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    while cache.stats()["coalesced"] < 7:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [[1, 2, 3]] * 8
+    assert cache.get("key", 1, compute) == [1, 2, 3]
+    assert cache.stats()["hits"] == 1
+
+
+def test_error_is_passed_to_waiting_requests_and_not_cached():
+    cache = StatisticsCache(10, 60)
+
+    def fail():
+        raise ValueError("Too huge delta time")
+
+    with pytest.raises(ValueError):
+        cache.get("key", 1, fail)
+    assert cache.get("key", 1, lambda: 5) == 5
+
+
+def test_entries_follow_version_ttl_and_size():
+    cache = StatisticsCache(2, 0.05)
+
+    assert cache.get("a", 1, lambda: "a1") == "a1"
+    assert cache.get("a", 1, lambda: "other") == "a1"
+    assert cache.get("a", 2, lambda: "a2") == "a2"
+    time.sleep(0.06)
+    assert cache.get("a", 2, lambda: "a2 again") == "a2 again"
+    cache.get("b", 2, lambda: "b")
+    cache.get("c", 2, lambda: "c")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["outdated"], stats["expired"], stats["evictions"]) == (1, 1, 1, 1)
+    assert cache.get("a", 2, lambda: "a3") == "a3"
+
+
+def test_statistics_are_recomputed_after_reservation(client, admin_token):
+    date_format = "%Y-%m-%dT%H:%M:%S.%fZ"
+    start_date = dt.now().replace(microsecond=0) + timedelta(days=40)
+    url = "/statistics/popular_pools?startDate={}&endDate={}&poolsToView=3".format(
+        start_date.strftime(date_format), (start_date + timedelta(days=1)).strftime(date_format)
+    )
+    headers = {"Auth-Token": admin_token}
+
+    first = client.get(url, headers=headers).get_json()
+    version = WriteVersion.get()
+    assert client.get(url, headers=headers).get_json() == first
+    hits = statistics_cache.stats()["hits"]
+    assert hits >= 1
+
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    pool.add_reservation(User.get_all_users()[0], 1, start_date, start_date + timedelta(hours=5))
+
+    assert WriteVersion.get() == version + 1
+    second = client.get(url, headers=headers).get_json()
+    assert max(second["data"]) == 5
+    assert statistics_cache.stats()["hits"] == hits
+
+    stats = client.get("/statistics/cache", headers=headers).get_json()
+    assert stats["statistics"]["outdated"] >= 1
+
+
+def test_statistics_are_recomputed_after_change_of_users(client, admin_token):
+    date_format = "%Y-%m-%dT%H:%M:%S.%fZ"
+    start_date = dt(2019, 1, 1)
+    url = "/statistics/popular_users?startDate={}&endDate={}&usersToView=100".format(
+        start_date.strftime(date_format), dt(2099, 1, 1).strftime(date_format)
+    )
+    headers = {"Auth-Token": admin_token}
+    client.get(url, headers=headers)
+
+    User.get_all_users()[0].update(name="Renamed", surname="Student")
+    assert "Renamed Student" in client.get(url, headers=headers).get_data(as_text=True)
+
+    User.add_users([{"Email": "new@student.example", "Password": "student123", "Name": "Newly", "Surname": "Added"}])
+    assert "Newly Added" in client.get(url, headers=headers).get_data(as_text=True)
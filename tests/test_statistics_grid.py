@@ -0,0 +1,70 @@
+import random
+from datetime import timedelta, datetime as dt
+
+from database import timeline
+from database.dbmodel import Pool, User
+from statistics import grid
+from statistics.statistics import get_pools_bottleneck, maximum_usage
+
+
+def test_peak_grid_matches_timeline():
+    rng = random.Random(2019)
+    start_date = dt(2020, 1, 1)
+    reservations = []
+    for _ in range(300):
+        _start_date = start_date + timedelta(minutes=15 * rng.randrange(-20, 400))
+        reservations.append((rng.randrange(3), _start_date,
+                             _start_date + timedelta(minutes=15 * rng.randrange(1, 12)), rng.randrange(1, 4)))
+    end_date = start_date + timedelta(hours=90)
+    interval = timedelta(minutes=45)
+
+    peaks = grid.peak_grid(
+        4,
+        [pool_index for pool_index, _, _, _ in reservations],
+        grid.to_microseconds([_start_date for _, _start_date, _, _ in reservations]),
+        grid.to_microseconds([_end_date for _, _, _end_date, _ in reservations]),
+        [machine_count for _, _, _, machine_count in reservations],
+        start_date, end_date, interval
+    )
+
+    assert peaks.shape == (4, 120)
+    for pool_index in range(4):
+        pool_timeline = timeline.PoolTimeline([reservation[1:] for reservation in reservations
+                                               if reservation[0] == pool_index], None)
+        for cell in range(120):
+            cell_start = start_date + cell * interval
+            assert peaks[pool_index, cell] == pool_timeline.maximum_taken(cell_start, cell_start + interval)
+
+
+def test_statistics_match_probing_of_every_interval(mock_database):
+    start_date = dt.now() - timedelta(days=7, minutes=7)
+    end_date = dt.now() + timedelta(days=7)
+
+    for pool_id, hours, _ in get_pools_bottleneck(start_date, end_date, bottleneck=0.2):
+        pool = Pool.get_pool(pool_id)
+        date = start_date
+        expected = 0
+        while date < end_date:
+            if 1 - pool.available_machines(date, date + timedelta(seconds=1800)) / pool.MaximumCount > 0.2:
+                expected += 0.5
+            date += timedelta(seconds=1800)
+        assert hours == int(expected)
+
+    for pool_id, usage, name in maximum_usage(start_date, end_date):
+        pool = Pool.get_pool(pool_id)
+        assert usage == (pool.MaximumCount - pool.available_machines(start_date, end_date)) / pool.MaximumCount
+        assert name == pool.Name
+
+
+def test_multi_year_report_has_no_limit(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    user = User.get_all_users()[0]
+    start_date = dt.now().replace(microsecond=0) + timedelta(days=1)
+    pool.add_reservations(user, pool.MaximumCount, [
+        (start_date + timedelta(weeks=week), start_date + timedelta(weeks=week, hours=2)) for week in range(150)
+    ])
+
+    stat_list = {pool_id: hours for pool_id, hours, _ in get_pools_bottleneck(start_date,
+                                                                               start_date + timedelta(days=3 * 365))}
+
+    assert stat_list[pool.ID] == 300
@@ -0,0 +1,88 @@
+from datetime import timedelta, datetime as dt
+
+import pytest
+from sqlalchemy.orm.attributes import set_committed_value
+
+from database import timeline
+from database.dbmodel import Pool, User, Reservation, OccupancyDelta, db, timeline_cache
+
+
+def assert_cache_matches_database(pool, start_date, days=14):
+    for hour in range(0, days * 24, 3):
+        window_start = start_date + timedelta(hours=hour)
+        window_end = window_start + timedelta(hours=5)
+        reservations = pool.get_timeline(window_start, window_end)
+        assert pool.available_machines(window_start, window_end) == \
+            timeline.minimum_free(pool.MaximumCount, reservations, window_start, window_end)
+
+
+def test_cache_follows_reservation_changes(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    user = User.get_all_users()[0]
+    start_date = dt.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    first = pool.add_reservation(user, 3, start_date, start_date + timedelta(hours=4))
+    second = pool.add_reservation(user, 2, start_date + timedelta(hours=2), start_date + timedelta(hours=6))
+    assert_cache_matches_database(pool, start_date)
+
+    first.edit(start_date + timedelta(days=1), start_date + timedelta(days=1, hours=3), 5)
+    assert_cache_matches_database(pool, start_date)
+
+    second.cancel()
+    assert_cache_matches_database(pool, start_date)
+    assert timeline_cache.stats()["hits"] > 0
+
+
+def test_cache_is_dropped_when_other_process_changes_pool(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    user = User.get_all_users()[0]
+    start_date = dt.now() + timedelta(days=1)
+    end_date = start_date + timedelta(hours=2)
+
+    free_machines = pool.available_machines(start_date, end_date)
+
+    # reservation added behind cache's back, as another gunicorn worker would do
+    db.session.add(Reservation(PoolID=pool.ID, UserID=user.ID, StartDate=start_date, EndDate=end_date,
+                               MachineCount=1, Cancelled=False))
+    OccupancyDelta.record(pool.ID, start_date, end_date, 1)
+    pool.bump_timeline_version()
+    db.session.commit()
+
+    assert pool.available_machines(start_date, end_date) == free_machines - 1
+
+
+def test_cache_evicts_least_recently_used_pools():
+    start_date = dt(2019, 1, 1)
+    cache = timeline.TimelineCache(max_events=4)
+
+    cache.put("a", timeline.PoolTimeline([(start_date, start_date + timedelta(hours=1), 1)], 0))
+    cache.put("b", timeline.PoolTimeline([(start_date, start_date + timedelta(hours=2), 1)], 0))
+    assert cache.get("a", 0) is not None
+    cache.put("c", timeline.PoolTimeline([(start_date, start_date + timedelta(hours=3), 1)], 0))
+
+    assert cache.get("b", 0) is None
+    assert cache.get("a", 0) is not None
+    assert cache.get("c", 1) is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["events"] <= 4
+
+
+def test_cancel_of_reservation_cancelled_by_other_worker(mock_database):
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    user = User.get_all_users()[0]
+    start_date = dt.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    reservation = pool.add_reservation(user, 2, start_date, start_date + timedelta(hours=4))
+    reservation_id = reservation.ID
+
+    # cancelled behind this session's back, as another gunicorn worker would do
+    Reservation.cancel_reservations([reservation_id])
+    db.session.expire_all()
+    reservation = Reservation.get_reservation(reservation_id)
+    # state this worker read before the other one cancelled the reservation
+    set_committed_value(reservation, "Cancelled", False)
+
+    with pytest.raises(AttributeError):
+        reservation.cancel()
+
+    assert timeline_cache.get(pool.ID, Pool.get_pool(pool.ID).TimelineVersion) is not None
+    assert_cache_matches_database(pool, start_date)
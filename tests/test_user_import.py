@@ -0,0 +1,68 @@
+import io
+
+from database.dbmodel import User
+
+
+def test_add_users_reports_every_row(mock_database, count_queries):
+    users_data = [
+        {"Email": "first@student.example", "Password": "student123", "Name": "First", "Surname": "Student"},
+        {"Email": "admin@admin.example", "Password": "student123", "Name": "Admin", "Surname": "Admin"},
+        {"Email": "first@student.example", "Password": "student123", "Name": "Again", "Surname": "Student"},
+        {"Email": "second@student.example", "Name": "Second", "Surname": "Student"},
+        {"Email": "third@student.example", "Password": "student123", "IsAdmin": "yes"},
+        {"Email": "fourth@student.example", "Password": "student123", "IsAdmin": True},
+    ]
+
+    with count_queries() as statements:
+        report = User.add_users(users_data)
+
+    assert [(row["line"], row["status"]) for row in report] == [
+        (1, "created"), (2, "error"), (3, "error"), (4, "error"), (5, "error"), (6, "created")
+    ]
+    # the last statement bumps WriteVersion
+    assert [statement.split()[0] for statement in statements] == ["SELECT", "INSERT", "UPDATE"]
+    assert User.get_user_by_email("first@student.example").check_password("student123")
+    assert User.get_user_by_email("fourth@student.example").IsAdmin
+
+
+def test_import_users_from_csv(client, admin_token):
+    users_csv = "Email,Password,Name,Surname,IsAdmin\n" \
+                "first@student.example,student123,First,Student,false\n" \
+                "second@student.example,student456,Second,Student,true\n"
+
+    response = client.post("/users/import", headers={"Auth-Token": admin_token},
+                           data={"users_csv": (io.BytesIO(users_csv.encode("utf-8")), "users.csv")})
+
+    assert response.status_code == 200
+    assert [row["email"] for row in response.get_json()["users"]] == ["first@student.example",
+                                                                      "second@student.example"]
+    response = client.post("/users/signin", json={"email": "second@student.example", "password": "student456"})
+    assert response.get_json()["UserData"]["IsAdmin"] is True
+
+    response = client.post("/users/import", headers={"Auth-Token": admin_token}, json={"users": [
+        {"Email": "first@student.example", "Password": "student123"}
+    ]})
+    assert response.status_code == 207
+    assert response.get_json()["users"][0]["info"] == "User with this email already exists"
+
+
+def test_import_users_rejects_malformed_input(client, admin_token):
+    response = client.post("/users/import", headers={"Auth-Token": admin_token},
+                           json=[{"Email": "first@student.example", "Password": "student123"}])
+    assert response.status_code == 400
+
+    users_csv = "Email,Password\nfirst@student.example,stud\xe9nt123\n".encode("latin-1")
+    response = client.post("/users/import", headers={"Auth-Token": admin_token},
+                           data={"users_csv": (io.BytesIO(users_csv), "users.csv")})
+    assert response.status_code == 400
+    assert User.query.filter(User.Email == "first@student.example").first() is None
+
+
+def test_import_more_users_than_sql_variables(mock_database, hashing_rounds, sqlite_variable_limit):
+    users_data = [{"Email": "student{}@student.example".format(i), "Password": "student123"} for i in range(1200)]
+    users_data.append({"Email": "admin@admin.example", "Password": "student123"})
+
+    report = User.add_users(users_data)
+
+    assert [row["status"] for row in report] == ["created"] * 1200 + ["error"]
+    assert User.query.filter(User.Email.like("student%@student.example")).count() == 1200
@@ -0,0 +1,48 @@
+import pytest
+
+from database.dbmodel import User
+
+
+@pytest.fixture
+def student(mock_database):
+    return User.add_user("student@student.example", "student123", "Student", "Student")
+
+
+def test_update_commits_changed_fields_once(student, count_queries):
+    pass_hash = student.Password
+
+    with count_queries() as statements:
+        assert student.update(name="Pupil", surname="Student", password="", is_admin=None) == {"name"}
+    assert len([statement for statement in statements if statement.startswith('UPDATE "User"')]) == 1
+    assert student.Password == pass_hash
+
+    assert student.update(password="student124", is_admin=True) == {"password", "is_admin"}
+    user = User.get_user_by_email("student@student.example")
+    assert (user.Name, user.IsAdmin) == ("Pupil", True)
+    assert user.check_password("student124")
+
+    assert student.update(name="Pupil") == set()
+    with pytest.raises(TypeError):
+        student.update(Password="student125")
+
+
+def test_update_to_existing_email_changes_nothing(student):
+    with pytest.raises(ValueError):
+        student.update(name="Pupil", email="admin@admin.example")
+
+    user = User.get_user_by_email("student@student.example")
+    assert user.Name == "Student"
+
+
+def test_edit_without_password_keeps_credentials(client, admin_token, student):
+    response = client.post("/users/edit_user", headers={"Auth-Token": admin_token},
+                           query_string={"email": "student@student.example"}, json={"new_name": "Pupil"})
+    assert response.status_code == 200
+
+    response = client.post("/users/signin", json={"email": "student@student.example", "password": "student123"})
+    assert response.status_code == 200
+    assert response.get_json()["UserData"]["Name"] == "Pupil"
+
+    response = client.post("/users/edit_user", headers={"Auth-Token": admin_token},
+                           query_string={"email": "student@student.example"}, json={"new_email": "admin@admin.example"})
+    assert response.status_code == 422
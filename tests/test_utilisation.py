@@ -0,0 +1,73 @@
+import json
+import random
+from datetime import timedelta, datetime as dt
+
+import pytest
+
+from database import timeline
+from database.dbmodel import Pool, User
+
+
+# series computed by probing every bucket separately
+def probed_series(reservations, start_date, end_date, granularity):
+    pool_timeline = timeline.PoolTimeline(reservations, None)
+    bucket_start = timeline.calendar_floor(start_date, granularity)
+    series = []
+    while bucket_start < end_date:
+        bucket_end = timeline.calendar_next(bucket_start, granularity)
+        window_start, window_end = max(bucket_start, start_date), min(bucket_end, end_date)
+        series.append((bucket_start, pool_timeline.machine_seconds(window_start, window_end),
+                       pool_timeline.maximum_taken(window_start, window_end)))
+        bucket_start = bucket_end
+    return series
+
+
+@pytest.mark.parametrize("granularity", timeline.GRANULARITIES)
+def test_series_matches_probing_of_every_bucket(granularity):
+    rng = random.Random(2019)
+    start_date = dt(2019, 11, 20, 7, 30)
+    reservations = []
+    for _ in range(200):
+        _start_date = start_date + timedelta(minutes=30 * rng.randrange(-50, 5000))
+        reservations.append((_start_date, _start_date + timedelta(minutes=30 * rng.randrange(0, 300)),
+                             rng.randrange(1, 4)))
+    reservations.sort()
+    end_date = start_date + timedelta(days=80, hours=3)
+
+    series = list(timeline.utilisation_series(reservations, start_date, end_date, granularity))
+
+    assert [(bucket_start, round(seconds), peak) for bucket_start, seconds, peak in series] == \
+        [(bucket_start, round(seconds), peak)
+         for bucket_start, seconds, peak in probed_series(reservations, start_date, end_date, granularity)]
+
+
+def test_calendar_buckets():
+    date = dt(2019, 12, 18, 13, 45)
+
+    assert timeline.calendar_floor(date, "week") == dt(2019, 12, 16)
+    assert timeline.calendar_next(timeline.calendar_floor(date, "month"), "month") == dt(2020, 1, 1)
+    with pytest.raises(ValueError):
+        timeline.calendar_floor(date, "minute")
+
+
+def test_utilisation_endpoint_streams_every_pool(client, admin_token):
+    date_format = "%Y-%m-%dT%H:%M:%S.%fZ"
+    pool = Pool.get_all_pools(only_enabled=True)[0]
+    start_date = (dt.now() + timedelta(days=40)).replace(hour=0, minute=0, second=0, microsecond=0)
+    pool.add_reservation(User.get_all_users()[0], 2, start_date + timedelta(hours=10),
+                         start_date + timedelta(days=1, hours=12))
+    url = "/statistics/utilisation?startDate={}&endDate={}".format(
+        start_date.strftime(date_format), (start_date + timedelta(days=3)).strftime(date_format))
+
+    response = client.get(url + "&granularity=day&id=" + pool.ID, headers={"Auth-Token": admin_token})
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert [(row["MachineHours"], row["PeakTaken"]) for row in rows] == [(28, 2), (24, 2), (0, 0)]
+
+    response = client.get(url, headers={"Auth-Token": admin_token})
+    assert len(response.get_data(as_text=True).splitlines()) == 3 * len(Pool.get_all_pools())
+
+    response = client.get(url + "&id=missing", headers={"Auth-Token": admin_token})
+    assert response.status_code == 404
+    response = client.get(url + "&granularity=minute", headers={"Auth-Token": admin_token})
+    assert response.status_code == 400